@@ -0,0 +1,152 @@
+"""Готовые документы деталей аниме для /api/anime/<mal_id> (модалка).
+
+Ответ /anime/{id}/full большой, а из него модалке нужны десяток полей и
+список ссылок. Документ собирается один раз и лежит в общем кэше под ключом
+detail:v<версия>:<mal_id> в семействе 'detail_docs' с долгим TTL (неделя)
+и ещё более долгим stale-окном: устаревший документ отдаётся сразу и
+пересобирается в фоне. Поменялась форма документа — увеличиваем
+DOC_VERSION, старые записи просто доживают свой TTL.
+
+prefetch() вызывается для карточек ответов поиска и рейтингов: недостающие
+документы собираются в фоне заранее, поэтому открытие модалки почти
+никогда не ждёт Jikan. В Jikan предзагрузка ходит фоновыми запросами: только
+по свободному слоту лимитера и с запасом токенов для пользователей, — а что
+не поместилось, догрузится при открытии модалки.
+"""
+from urllib.parse import quote_plus
+
+from cards import image_of
+from image_proxy import proxy_url
+
+DOC_VERSION = 3  # 2: постер через прокси /img; 3: без документов из незагруженных записей каталога
+FAMILY = 'detail_docs'
+
+
+def _links(mal_id, title_main, title_en, is_hentai):
+    """Ссылки на сайты в порядке показа"""
+    # Поисковая строка для сайтов
+    q = quote_plus(title_main)
+
+    # 1. MyAnimeList — всегда первая
+    links_list = [{
+        "url": f"https://myanimelist.net/anime/{mal_id}",
+        "label": "MyAnimeList"
+    }]
+
+    # 2-4. AnimeGo, AnimeLIB, HDRezka — если не хентай
+    if not is_hentai:
+        links_list.append({
+            "url": f"https://animego.org/search/anime?q={q}",
+            "label": "AnimeGo (поиск)"
+        })
+        links_list.append({
+            "url": f"https://anilib.me/ru/catalog?q={q}",
+            "label": "AnimeLIB (поиск)"
+        })
+        links_list.append({
+            "url": f"https://hdrezka.ag/search/?do=search&subaction=search&q={q}",
+            "label": "HDRezka (поиск)"
+        })
+
+    # 5. Shikimori — всегда после них
+    shiki_label = "Shikimori (поиск)" if not is_hentai else "Shikimori (поиск, требуется регистрация)"
+    links_list.append({
+        "url": f"https://shikimori.one/animes?search={q}",
+        "label": shiki_label
+    })
+
+    # 6. watchhentai.net — ТОЛЬКО для хентая
+    if is_hentai:
+        # Поиск по основному названию (title_main)
+        links_list.append({
+            "url": f"https://watchhentai.net/?s={q}",
+            "label": "WatchHentai (поиск)"
+        })
+
+        # Дополнительная ссылка — поиск по английскому названию (title_en)
+        if title_en and title_en != title_main:
+            links_list.append({
+                "url": f"https://watchhentai.net/?s={quote_plus(title_en)}",
+                "label": "WatchHentai (поиск EN)"
+            })
+    return links_list
+
+
+def build_document(mal_id, data):
+    """Документ модалки из элемента в форме Jikan"""
+    # Основные поля
+    title_ru   = data.get("title_russian") or data["title"]
+    title_en   = data.get("title_english") or data["title"]
+    title_jp   = data.get("title_japanese") or data["title"]
+    title_main = title_ru or title_en or title_jp
+
+    synopsis = (data.get("synopsis") or "Описание отсутствует").replace("[Written by MAL Rewrite]", "").strip()
+
+    image = proxy_url(mal_id, 'large') if image_of(data) else ""
+
+    year = data.get("year") or (
+        data.get("aired", {}).get("from", "")[:4] if data.get("aired", {}).get("from") else "—"
+    )
+
+    # Проверяем, хентай ли это
+    genres = [g['name'].lower() for g in (data.get('genres') or []) + (data.get('explicit_genres') or [])]
+    is_hentai = 'hentai' in genres or 'erotica' in genres
+
+    return {
+        "mal_id":     mal_id,
+        "title":      title_main,
+        "title_en":   title_en,
+        "title_jp":   title_jp,
+        "title_ru":   title_ru,
+        "image":      image,
+        "score":      data.get("score") or "—",
+        "year":       year,
+        "episodes":   data.get("episodes") or "—",
+        "type":       data.get("type", "—"),
+        "status":     data.get("status", "—"),
+        "synopsis":   synopsis,
+        "links":      _links(mal_id, title_main, title_en, is_hentai)   # ← именно список!
+    }
+
+
+class DetailStore:
+    """Документы деталей в общем кэше с пересборкой в фоне и предзагрузкой"""
+
+    def __init__(self, cache, load, refresher, prefetcher, version=DOC_VERSION):
+        self.cache = cache              # JikanCache: общий для воркеров и переживает перезапуск
+        self.load = load                # callable(mal_id, background=False) -> элемент в форме Jikan или None
+        self.refresher = refresher      # BackgroundRefresher для устаревших документов
+        self.prefetcher = prefetcher    # BackgroundRefresher с ограниченной очередью для предзагрузки
+        self.version = version
+
+    def key(self, mal_id):
+        return f"detail:v{self.version}:{mal_id}"
+
+    def build(self, mal_id, background=False):
+        """Собрать документ заново и положить в кэш (None — источник недоступен)"""
+        data = self.load(mal_id, background=background)
+        if not data:
+            return None
+        doc = build_document(mal_id, data)
+        self.cache.set(self.key(mal_id), doc, FAMILY)
+        return doc
+
+    def get(self, mal_id):
+        key = self.key(mal_id)
+        cached = self.cache.get(key, FAMILY)
+        if cached is None:
+            return self.build(mal_id)
+        doc, fresh = cached
+        if not fresh:
+            self.refresher.submit(key, lambda: self.build(mal_id))
+        return doc
+
+    def prefetch(self, mal_ids):
+        """Заранее собрать в фоне документы, которых ещё нет; сколько заявок принято"""
+        return sum(self.prefetcher.submit(self.key(mal_id), lambda mal_id=mal_id: self._prefetch_one(mal_id))
+                   for mal_id in mal_ids)
+
+    def _prefetch_one(self, mal_id):
+        if self.cache.fresh_for(self.key(mal_id)) is None:
+            # Jikan — фоновым запросом, не тесня запросы пользователей
+            self.build(mal_id, background=True)
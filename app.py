@@ -1,40 +1,92 @@
 import datetime
-import requests
+import hashlib
+import math
+import os
 import time
+import uuid
+import requests
 import random
+import click
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
+from flask import (Flask, Response, render_template, request, redirect, url_for, flash, jsonify,
+                   stream_with_context, make_response, has_app_context, send_file)
+from werkzeug.exceptions import NotFound, ServiceUnavailable, TooManyRequests
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from flask_migrate import Migrate
+from flask_migrate.cli import db as db_cli
 from config import Config
-from models import db, User, UserAnime
-
-from flask_caching import Cache
-import json
+from models import db, User, UserAnime, Anime
+import catalog
+import cards
+import fastjson
+import search_index
+import db_profiles
+import query_plans
+import user_list
+import list_import
+import list_export
+from sampler import RandomSampler, parse_filters
+from jikan_cache import JikanCache, endpoint_family, make_key
+from rate_limiter import TokenBucketLimiter, RateLimitExceeded, parse_retry_after
+from singleflight import SingleFlight
+from refresher import BackgroundRefresher, CacheWarmer, PeriodicTask
+from anime_details import DetailStore
+from image_proxy import ImageProxy, ImageUnavailable
+from circuit_breaker import CircuitBreaker, CircuitOpen, STATE_VALUES
+from metrics import Metrics, internal_only
+from response_cache import ResponseCache
+from jikan_client import JikanClient, AsyncJikanClient
+from user_list import ListVersions, MembershipSets
+from list_import import ImportJobs
+from user_cache import UserCache
+from passwords import PasswordHasher, LoginThrottle, HasherBusy
 
 app = Flask(__name__)
 
-cache = Cache(app, config={
-    "CACHE_TYPE": "SimpleCache",
-    "CACHE_DEFAULT_TIMEOUT": 1800  # 30 минут
-})
-
 app.config.from_object(Config)
+# jsonify через orjson, если он установлен (форма ответов та же)
+app.json = fastjson.JSONProvider(app)
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', db_profiles.engine_options(app.config))
+# /metrics для Prometheus (хуки запроса регистрируются первыми — время считается от начала)
+metrics = Metrics(app)
 
 db.init_app(app)
-bcrypt = Bcrypt(app)
+with app.app_context():
+    db_profiles.init_engine(db.engine, app.config)
+    metrics.instrument_engine(db.engine)
+
+def include_schema_object(obj, name, type_, reflected, compare_to):
+    # FTS-таблицы поиска создаются в миграции сырым SQL — autogenerate их не трогает
+    return not (type_ == 'table' and name.startswith('anime_fts'))
+
+# Схема базы — миграциями: `flask db upgrade` (batch-режим нужен SQLite для ALTER TABLE)
+migrate = Migrate(app, db, render_as_batch=True, include_object=include_schema_object)
+jikan_cache = JikanCache(app)
+# Кэш готовых JSON-ответов /api (общий для воркеров, с ETag/Last-Modified)
+response_cache = ResponseCache(jikan_cache)
+rate_limiter = TokenBucketLimiter(app)
+# Пул keep-alive соединений к Jikan
+jikan_client = JikanClient(app)
+# Jikan лежит или тормозит — быстрый отказ вместо таймаутов на каждом запросе
+upstream_breaker = CircuitBreaker(jikan_cache, app)
+metrics.gauge('circuit_breaker_state', 'Состояние breaker: 0 — замкнут, 1 — полуоткрыт, 2 — разомкнут', ['name'],
+              lambda: {(upstream_breaker.name,): STATE_VALUES[upstream_breaker.state()]})
+single_flight = SingleFlight(jikan_cache)
+# Постеры карточек: уменьшенные копии на диске, отдаются с immutable-кэшированием
+image_proxy = ImageProxy(app, single_flight)
+list_versions = ListVersions(jikan_cache)
+catalog_version = catalog.CatalogVersion(jikan_cache)
+membership = MembershipSets(jikan_cache)
+password_hasher = PasswordHasher(app)
+login_throttle = LoginThrottle(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
+user_cache = UserCache(jikan_cache, ttl=app.config['USER_CACHE_TTL'])
 
 # --- User loader для Flask-Login ---
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-# Создаем таблицы при старте
-with app.app_context():
-    db.create_all()
+    return user_cache.load(int(user_id))
 
 # --- Регистрация ---
 @app.route('/register', methods=['GET', 'POST'])
@@ -47,7 +99,10 @@ def register():
             flash("Имя уже занято", "danger")
             return redirect(url_for('register'))
 
-        hashed_pw = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            hashed_pw = password_hasher.generate(password)
+        except HasherBusy:
+            raise ServiceUnavailable(retry_after=1)
         user = User(username=username, password=hashed_pw)
         db.session.add(user)
         db.session.commit()
@@ -65,11 +120,30 @@ def login():
         username = request.form['username']
         password = request.form['password']
 
+        # Отказ до bcrypt: подбор не тратит CPU воркеров
+        retry_after = login_throttle.retry_after(request.remote_addr, username)
+        if retry_after:
+            raise TooManyRequests(retry_after=math.ceil(retry_after))
+
         user = User.query.filter_by(username=username).first()
-        if user and bcrypt.check_password_hash(user.password, password):
+        try:
+            valid = user is not None and password_hasher.check(user.password, password)
+        except HasherBusy:
+            raise ServiceUnavailable(retry_after=1)
+
+        if valid:
+            login_throttle.success(username)
+            if password_hasher.needs_rehash(user.password):
+                # Сменилось BCRYPT_LOG_ROUNDS — пересчитываем хэш, пока знаем пароль
+                try:
+                    user.password = password_hasher.generate(password)
+                    db.session.commit()
+                except HasherBusy:
+                    pass  # пересчитаем при следующем входе
             login_user(user)
             flash("Вход успешен!", "success")
             return redirect(url_for('index'))
+        login_throttle.failure(request.remote_addr, username)
         flash("Неверное имя или пароль", "danger")
 
     return render_template('login.html')
@@ -82,50 +156,133 @@ def logout():
     flash("Вы вышли", "info")
     return redirect(url_for('index'))
 
-JIKAN_BASE = "https://api.jikan.moe/v4"
+JIKAN_BASE = app.config['JIKAN_BASE']
 
-def cached_jikan_get(url, params=None, timeout=1800):
-    key = f"jikan:{url}:{json.dumps(params, sort_keys=True)}"
+def cached_jikan_get(url, params=None, timeout=None, family=None, background=False):
+    """Декодированный JSON ответа Jikan из общего кэша (None, если Jikan недоступен).
 
-    cached = cache.get(key)
-    if cached:
-        return cached
+    background — промах идёт в Jikan с фоновым приоритетом (см. rate_limited_get).
+    """
+    key = make_key(url, params)
+    family = family or endpoint_family(url)
 
-    resp = rate_limited_get(url, params)
-    if resp and resp.status_code == 200:
-        cache.set(key, resp, timeout=timeout)
-    return resp
+    # Пока Jikan недоступен, годится и последняя известная версия за пределами stale-окна
+    cached = jikan_cache.get(key, family, last_known=upstream_breaker.is_open())
+    if cached is not None:
+        data, fresh = cached
+        if not fresh:
+            # Отдаём устаревшее сразу, а обновляем в фоне (stale-while-revalidate);
+            # при разомкнутом breaker такое обновление и становится пробным запросом
+            refresher.submit(key, lambda: refresh_jikan(url, params, timeout, family))
+        return data
 
-def rate_limited_get(url, params=None, retries=3):
-    key = "jikan_last_request_time"
-    last_time = cache.get(key) or 0
+    return refresh_jikan(url, params, timeout, family, background=background)
 
-    elapsed = time.time() - last_time
-    if elapsed < 0.34:
-        time.sleep(0.34 - elapsed)
+def refresh_jikan(url, params=None, timeout=None, family=None, background=False):
+    """Сходить в Jikan и положить ответ в общий кэш (background — см. rate_limited_get)"""
+    key = make_key(url, params)
+    family = family or endpoint_family(url)
 
+    def fetch():
+        resp = rate_limited_get(url, params, background=background)
+        if resp is None or resp.status_code != 200:
+            return None
+        data = resp.json()
+        jikan_cache.set(key, data, family, timeout=timeout)
+        return data
+
+    # Одинаковые одновременные промахи (в т.ч. из разных воркеров) идут в Jikan один раз;
+    # фоновый запрос может получить отказ лимитера — пользовательские к нему не присоединяются
+    flight_key = f"background:{key}" if background else key
+    return single_flight.do(flight_key, fetch, lookup=lambda: jikan_cache.peek(key))
+
+def cached_jikan_cards(url, params=None, kind='search', family=None):
+    """Страница Jikan, уже спроецированная в карточки: {'data': [...], 'pagination': {...}} или None"""
+    source_key = make_key(url, params)
+    key = f"cards:{kind}:{source_key}"
+    page = jikan_cache.peek(key)
+    if page is not None:
+        jikan_cache.count('cards', 'hits')
+        return page
+
+    data = cached_jikan_get(url, params, family=family)
+    if data is None:
+        return None
+    page = cards.project_page(data, kind)
+    # Карточки живут не дольше свежести исходного ответа: обновился он — пересоберутся и они
+    ttl = jikan_cache.fresh_for(source_key)
+    if ttl and ttl > 0:
+        jikan_cache.set(key, page, 'cards', timeout=ttl)
+    jikan_cache.count('cards', 'misses')
+    return page
+
+refresher = BackgroundRefresher(logger=app.logger)
+
+def rate_limited_get(url, params=None, retries=3, background=False):
+    """GET к Jikan через общий для всех воркеров лимитер.
+
+    background — фоновый запрос низкого приоритета (предзагрузка): не встаёт в
+    очередь лимитера, а ждёт слот, после которого в корзинах останется
+    JIKAN_RATE_BACKGROUND_HEADROOM токенов для пользователей (не дольше
+    JIKAN_RATE_BACKGROUND_MAX_WAIT, иначе None).
+    Сетевые ошибки повторяются с паузой JIKAN_RETRY_BACKOFF, удваивающейся с
+    каждой попыткой; после последней — тоже None (вызывающий отдаёт 503).
+    """
+    if background and upstream_breaker.is_open():
+        return None  # пробный запрос к лежащему Jikan — дело пользовательских запросов
     for attempt in range(retries):
         try:
-            resp = requests.get(url, params=params, timeout=10)
-            cache.set(key, time.time(), timeout=5)
+            probe = upstream_breaker.before_call()
+        except CircuitOpen:
+            return None
 
-            if resp.status_code == 429:
-                time.sleep(2 ** attempt)
-                continue
+        try:
+            if background:
+                rate_limiter.acquire_spare(app.config['JIKAN_RATE_BACKGROUND_HEADROOM'],
+                                           app.config['JIKAN_RATE_BACKGROUND_MAX_WAIT'])
+            else:
+                rate_limiter.acquire()
+        except RateLimitExceeded:
+            upstream_breaker.cancel(probe)
+            if not background:
+                app.logger.warning(f"Очередь к Jikan переполнена, пропускаем {url}")
+            return None
 
-            return resp
-        except requests.exceptions.RequestException:
+        try:
+            resp = jikan_client.get(url, params)
+        except requests.exceptions.RequestException as e:
+            upstream_breaker.failure(probe)
             if attempt == retries - 1:
-                raise
-            time.sleep(1)
+                # Вызывающий отдаст upstream_unavailable (503), а не HTML-страницу 500
+                app.logger.warning(f"Jikan недоступен ({e.__class__.__name__}), сдаёмся: {url}")
+                return None
+            # Короткая пауза: сразу повторять упавшее соединение бессмысленно
+            time.sleep(app.config['JIKAN_RETRY_BACKOFF'] * 2 ** attempt)
+            continue
+
+        if resp.status_code >= 500:
+            upstream_breaker.failure(probe)
+        else:
+            upstream_breaker.success(probe)
+
+        if resp.status_code == 429:
+            # Пауза общая для всех воркеров; следующий слот выдаст лимитер
+            rate_limiter.penalize(parse_retry_after(resp.headers.get('Retry-After'), default=2 ** attempt))
+            continue
+
+        return resp
     return None
 
+# Для async-view / ASGI: тот же rate_limited_get в потоке — общий лимитер, breaker и метрики
+async_jikan_client = AsyncJikanClient(rate_limited_get)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@cache.cached(timeout=300, query_string=True)
 @app.route('/api/search_anime')
+@response_cache.cached(timeout=300, defaults={'page': 1, 'limit': 12, 'order_by': 'score', 'sort': 'desc', 'sfw': 'true'},
+                        names=('q',))
 def search_anime():
     # ПАРАМЕТРЫ
     query = request.args.get('q', '').strip()
@@ -139,6 +296,12 @@ def search_anime():
         return jsonify({'data': [], 'pagination': {'has_next_page': False}})
     
     try:
+        # Сначала локальный индекс; в Jikan — только если в каталоге ничего не нашлось
+        if app.config['CATALOG_SERVE'] and catalog.catalog_ready():
+            data = search_index.search(query, page, limit, order_by, sort, sfw_param == 'true')
+            if data is not None:
+                return process_search_response(cards.project_page(data, 'search'))
+
         params = {
             'q': query,
             'page': page,
@@ -152,56 +315,51 @@ def search_anime():
         if sfw_param == 'true':
             params['sfw'] = 'true'
             
-        resp = cached_jikan_get(f"{JIKAN_BASE}/anime", params)
-        return process_search_response(resp)
+        results = cached_jikan_cards(f"{JIKAN_BASE}/anime", params, 'search')
+        if results is None and degraded_catalog():
+            data = search_index.search(query, page, limit, order_by, sort, sfw_param == 'true')
+            results = cards.project_page(data, 'search') if data is not None else None
+        return process_search_response(results)
     except Exception as e:
         app.logger.error(f"Error in search_anime: {str(e)}")
         return jsonify({'error': 'Произошла ошибка, попробуй ещё раз'}), 500
 
-def process_search_response(resp):
-    """Обработка ответа от Jikan API"""
-    if resp is None or resp.status_code != 200:
-        return jsonify({'error': 'Сервис временно недоступен, попробуй позже'}), 503
-
-    json_data = resp.json()
-    anime_list = json_data.get('data', [])
-    
-    results = []
-    for a in anime_list:
-        # Получаем жанры
-        genres = []
-        if 'genres' in a:
-            genres = [genre['name'] for genre in a['genres']]
-        if 'explicit_genres' in a:
-            genres.extend([genre['name'] for genre in a['explicit_genres']])
-            
-        results.append({
-            'mal_id': a['mal_id'],
-            'title': a.get('title_english') or a['title'],
-            'image': a['images']['jpg']['large_image_url'],
-            'score': a.get('score'),
-            'popularity': a.get('popularity') or 0,
-            'members': a.get('members') or 0,
-            'favorites': a.get('favorites') or 0,
-            'start_date': a.get('aired', {}).get('from'),
-            'year': a.get('year') or 'N/A',
-            'type': a.get('type', 'TV'),
-            'episodes': a.get('episodes') or '?',
-            'synopsis': (a.get('synopsis') or 'Нет описания')[:200] + '...',
-            'genres': genres[:3]
-        })
-
-    return jsonify({
-        'data': results,
-        'pagination': json_data.get('pagination', {})
-    })
+def upstream_unavailable(message='Сервис временно недоступен, попробуй позже'):
+    """Быстрый 503 для API; при разомкнутом breaker — с Retry-After"""
+    response = jsonify({'error': message})
+    response.status_code = 503
+    retry_after = upstream_breaker.retry_after()
+    if retry_after:
+        response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+def degraded_catalog():
+    """Jikan недоступен: отдаём из каталога, даже если он синхронизирован не полностью"""
+    return app.config['CATALOG_SERVE'] and upstream_breaker.is_open()
+
+def process_search_response(page):
+    """Ответ поиска и рейтингов из страницы карточек (None — источник недоступен)"""
+    if page is None:
+        return upstream_unavailable()
+    prefetch_details(page['data'])
+    return jsonify(page)
+
+# Индексы под фильтры строятся по каталогу и живут в памяти воркера
+sampler = RandomSampler(ttl=app.config['SAMPLER_INDEX_TTL'])
 
 @app.route('/api/random_anime_filtered')
 def random_anime_filtered():
     try:
-        # Параметры запроса
-        params = {}
-        
+        limit = int(request.args.get('limit', 20))
+
+        # Из каталога: равномерная выборка без повторений и точный total
+        if app.config['CATALOG_SERVE'] and (catalog.catalog_ready() or upstream_breaker.is_open()):
+            items, total = sampler.sample(parse_filters(request.args), min(limit, 25))
+            return jsonify({
+                'total': total,
+                'data': [cards.random_card(a) for a in items]
+            })
+
         # Собираем параметры из запроса
         type_filter = request.args.get('type')
         status_filter = request.args.get('status')
@@ -209,7 +367,6 @@ def random_anime_filtered():
         genres_filter = request.args.get('genres')
         min_year = request.args.get('min_year')
         max_year = request.args.get('max_year')
-        limit = int(request.args.get('limit', 20))
         
         # SFW/NSFW обработка
         sfw_param = request.args.get('sfw', 'true')
@@ -260,58 +417,19 @@ def random_anime_filtered():
         
         app.logger.debug(f"Запрос к Jikan: {url}")  # Для отладки
         
-        resp = cached_jikan_get(url)
+        page = cached_jikan_cards(url, kind='random')
         
-        if resp is None or resp.status_code != 200:
-            return jsonify({'error': 'Jikan API временно недоступен'}), 503
+        if page is None:
+            return upstream_unavailable('Jikan API временно недоступен')
             
-        json_data = resp.json()
-        anime_list = json_data.get('data', [])
-        
-        if not anime_list:
+        if not page['data']:
             return jsonify({'total': 0, 'data': []})
         
-        # Перемешиваем и ограничиваем количество
-        random.shuffle(anime_list)
-        selected = anime_list[:limit]
-        
-        # Форматируем результат
-        result = []
-        for a in selected:
-            # Получаем жанры
-            genres = []
-            if 'genres' in a:
-                genres = [genre['name'] for genre in a['genres']]
-            if 'explicit_genres' in a:
-                genres.extend([genre['name'] for genre in a['explicit_genres']])
-            
-            # Дата выхода
-            start_date = a.get('aired', {}).get('from')
-            year = None
-            if start_date:
-                try:
-                    year = int(start_date[:4]) if start_date else None
-                except:
-                    year = None
-            
-            result.append({
-                'mal_id': a['mal_id'],
-                'title': a.get('title_english') or a['title'] or 'Без названия',
-                'image': a['images']['jpg'].get('large_image_url') or a['images']['jpg'].get('image_url') or '',
-                'score': a.get('score') or 0,
-                'popularity': a.get('popularity') or 0,
-                'members': a.get('members') or 0,
-                'favorites': a.get('favorites') or 0,
-                'start_date': start_date,
-                'year': year or a.get('year') or '—',
-                'type': a.get('type', 'TV'),
-                'episodes': a.get('episodes') or '?',
-                'synopsis': (a.get('synopsis') or 'Нет описания')[:250] + '...',
-                'genres': genres[:5]
-            })
+        # Перемешиваем и ограничиваем количество (карточки уже готовые)
+        result = random.sample(page['data'], min(limit, len(page['data'])))
         
         # Получаем общее количество (делаем упрощенный запрос)
-        pagination = json_data.get('pagination', {})
+        pagination = page['pagination']
 
         total = pagination.get('items', {}).get('total')
 
@@ -338,6 +456,7 @@ def set_nsfw():
     data = request.get_json()
     current_user.nsfw_allowed = data.get('nsfw') is True
     db.session.commit()
+    user_cache.invalidate(current_user.id)
     return jsonify({'success': True})
 
 @app.route('/settings', methods=['GET', 'POST'])
@@ -350,6 +469,7 @@ def settings():
         current_user.tag = request.form.get('tag', '')
         
         db.session.commit()
+        user_cache.invalidate(current_user.id)
         flash("Настройки сохранены!", "success")
         return redirect(url_for('settings'))
 
@@ -358,26 +478,79 @@ def settings():
 @app.route('/my-list')
 @login_required
 def my_list():
-    items = UserAnime.query.filter_by(user_id=current_user.id).all()
-
-    anime_list = []
-    for item in items:
-        anime_list.append({
-            'id': item.id,
-            'mal_id': item.mal_id,
-            'title': item.title,
-            'image': item.image,
-            'type': item.type,
-            'episodes': item.episodes,
-            'year': item.year,
-            'synopsis': item.synopsis,
-            'status': item.status,
-            'score': item.score,
-            'comment': item.comment,
-            'is_private': item.is_private
-        })
+    filters = user_list.parse_list_args(request.args)
+    cursor = request.args.get('cursor')
+    anime_list, next_cursor = user_list.list_page(current_user.id, filters, cursor)
+
+    # Текущие фильтры без курсора — для ссылок «В начало» и «Дальше»
+    filter_args = {name: request.args[name] for name in ('status', 'type', 'year', 'min_score', 'sort', 'order')
+                   if request.args.get(name)}
+    return render_template(
+        'my_list.html',
+        anime_list=anime_list,
+        filters=filters,
+        filter_args=filter_args,
+        cursor=cursor,
+        next_cursor=next_cursor
+    )
+
+@app.route('/api/my_list')
+@login_required
+def my_list_api():
+    """Страница списка в JSON: ?cursor=...&status=&type=&year=&min_score=&sort=&order=&limit="""
+    # ETag из версий списка и каталога: пока не меняли ни то, ни другое, 304 отдаётся без запроса к БД
+    version = list_versions.get(current_user.id)
+    query = '&'.join(f"{name}={value}" for name, value in sorted(request.args.items()))
+    etag = hashlib.sha1(f"{current_user.id}:{version}:{catalog_version.get()}:{query}".encode('utf-8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        filters = user_list.parse_list_args(request.args)
+        items, next_cursor = user_list.list_page(current_user.id, filters, request.args.get('cursor'))
+        response = jsonify({'data': items, 'next_cursor': next_cursor, 'limit': filters['limit']})
+
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/list_item/<int:anime_id>')
+@login_required
+def list_item_details(anime_id):
+    """Полные synopsis и comment записи — карточки списка их не загружают"""
+    row = db.session.query(UserAnime.id, UserAnime.comment, Anime.synopsis).join(UserAnime.anime).filter(
+        UserAnime.id == anime_id, UserAnime.user_id == current_user.id
+    ).first_or_404()
+    return jsonify({'id': row.id, 'synopsis': row.synopsis, 'comment': row.comment})
+
+def fetch_anime_items(mal_ids, background=False):
+    """Тайтлы для каталога через кэшированный Jikan, порциями по IMPORT_ENRICH_BATCH параллельных запросов"""
+    def load(mal_id):
+        try:
+            with app.app_context():
+                data = cached_jikan_get(f"{JIKAN_BASE}/anime/{mal_id}/full", background=background)
+        except requests.exceptions.RequestException:
+            return None
+        return (data or {}).get('data')
+
+    items = []
+    step = app.config['IMPORT_ENRICH_BATCH']
+    for start in range(0, len(mal_ids), step):
+        items.extend(item for item in jikan_client.map(load, mal_ids[start:start + step]) if item)
+    return items
+
+def enrich_anime_items(mal_ids):
+    """fetch_anime_items для пакетных операций (импорт, bulk, fill-missing).
 
-    return render_template('my_list.html', anime_list=anime_list)
+    Фоновый приоритет: запрос ждёт слот, после которого пользователям остаётся
+    JIKAN_RATE_BACKGROUND_HEADROOM токенов, — пакет не выбирает бюджет лимитера
+    до дна. Не дождавшиеся слота тайтлы не возвращаются (импорт считает их unknown, bulk — not_found).
+    """
+    return fetch_anime_items(mal_ids, background=True)
+
+def ensure_in_catalog(mal_id):
+    """Есть ли тайтл в каталоге (недостающий подтягивается из Jikan); записи списка ссылаются на каталог"""
+    return mal_id in catalog.ensure_items([mal_id], fetch_anime_items)
 
 @app.route('/api/add_to_list', methods=['POST'])
 @login_required
@@ -385,7 +558,7 @@ def add_to_list():
     data = request.get_json()
     mal_id = data.get('mal_id')
 
-    if not mal_id:
+    if not isinstance(mal_id, int) or mal_id <= 0:
         return jsonify({'error': 'mal_id is required'}), 400
 
     # Проверка — уже есть в списке?
@@ -396,6 +569,8 @@ def add_to_list():
 
     if exists:
         return jsonify({'message': 'already_added'}), 200
+    if not ensure_in_catalog(mal_id):
+        return jsonify({'error': 'Аниме не найдено'}), 404
 
     anime = UserAnime(
         user_id=current_user.id,
@@ -405,6 +580,8 @@ def add_to_list():
 
     db.session.add(anime)
     db.session.commit()
+    list_versions.bump(current_user.id)
+    membership.changed(current_user.id, added=[anime.mal_id])
 
     return jsonify({'success': True})
 
@@ -419,8 +596,11 @@ def delete_from_list():
         user_id=current_user.id
     ).first_or_404()
 
+    removed_id = anime.mal_id
     db.session.delete(anime)
     db.session.commit()
+    list_versions.bump(current_user.id)
+    membership.changed(current_user.id, removed=[removed_id])
 
     return jsonify({'success': True})
 
@@ -436,6 +616,7 @@ def update_status():
         return jsonify({'success': False, 'error': 'Anime not found'}), 404
     anime.status = status
     db.session.commit()
+    list_versions.bump(current_user.id)
     return jsonify({'success': True})
 
 @app.route('/api/update_score', methods=['POST'])
@@ -460,6 +641,7 @@ def update_score():
         anime.score = None
 
     db.session.commit()
+    list_versions.bump(current_user.id)
 
     return jsonify({'success': True})
 
@@ -469,32 +651,132 @@ def toggle_list():
     data = request.get_json()
     mal_id = data.get('mal_id')
 
+    if not isinstance(mal_id, int) or mal_id <= 0:
+        return jsonify({'error': 'mal_id is required'}), 400
+
     anime = UserAnime.query.filter_by(
         user_id=current_user.id,
         mal_id=mal_id
     ).first()
 
     if anime:
+        removed_id = anime.mal_id
         db.session.delete(anime)
         db.session.commit()
+        list_versions.bump(current_user.id)
+        membership.changed(current_user.id, removed=[removed_id])
         return jsonify({'status': 'removed'})
 
+    # Метаданные от клиента не принимаем: карточка берёт их из общего каталога
+    if not ensure_in_catalog(mal_id):
+        return jsonify({'error': 'Аниме не найдено'}), 404
+
     anime = UserAnime(
         user_id=current_user.id,
         mal_id=mal_id,
-        title=data.get('title'),
-        image=data.get('image'),
-        type=data.get('type'),
-        episodes=data.get('episodes'),
-        year=data.get('year'),
-        synopsis=data.get('synopsis'),
         status='planned'
     )
 
     db.session.add(anime)
     db.session.commit()
+    list_versions.bump(current_user.id)
+    membership.changed(current_user.id, added=[anime.mal_id])
     return jsonify({'status': 'added'})
 
+@app.route('/api/list/bulk', methods=['POST'])
+@login_required
+def list_bulk():
+    """Пачка add/patch/delete одной транзакцией: {"operations": [...]} -> {"results": [...]}"""
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations is required'}), 400
+    if len(operations) > user_list.MAX_BULK_OPERATIONS:
+        return jsonify({'error': f'too many operations (max {user_list.MAX_BULK_OPERATIONS})'}), 400
+
+    results, added, removed = user_list.apply_bulk(current_user.id, operations, enrich_anime_items)
+    if any(result['status'] in ('added', 'updated', 'deleted') for result in results):
+        list_versions.bump(current_user.id)
+    if added or removed:
+        membership.changed(current_user.id, added=added, removed=removed)
+    return jsonify({'success': True, 'results': results})
+
+# --- Импорт списка с MyAnimeList ---
+import_jobs = ImportJobs(jikan_cache, BackgroundRefresher(max_workers=1, logger=app.logger))
+
+@app.route('/api/list/import', methods=['POST'])
+@login_required
+def import_list():
+    """Загрузить XML-выгрузку MAL (в т.ч. .xml.gz) или JSON-список; импорт идёт в фоне"""
+    # До request.files: иначе multipart уже прочитан целиком
+    if request.content_length and request.content_length > app.config['IMPORT_MAX_BYTES']:
+        return jsonify({'error': 'Файл слишком большой'}), 413
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'error': 'file is required'}), 400
+    if import_jobs.active_for(current_user.id):
+        return jsonify({'error': 'Импорт уже идёт'}), 409
+
+    folder = app.config['IMPORT_PATH'] or os.path.join(app.instance_path, 'imports')
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{uuid.uuid4().hex}.upload")
+    upload.save(path)
+
+    user_id = current_user.id
+    def committed(added):
+        # После каждой пачки: импорт, оборвавшийся на середине, не оставит список со старым ETag
+        list_versions.bump(user_id)
+        if added:
+            membership.changed(user_id, added=added)
+
+    def work(job_id, progress):
+        with app.app_context():
+            state, _ = list_import.run_import(
+                user_id, path, enrich_anime_items, app.config['IMPORT_BATCH_SIZE'], progress, committed
+            )
+        return state
+
+    job_id = import_jobs.start(user_id, path, work)
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('import_status', job_id=job_id)
+    }), 202
+
+@app.route('/api/list/import/<job_id>')
+@login_required
+def import_status(job_id):
+    job = import_jobs.get(job_id)
+    if job is None or job.get('user_id') != current_user.id:
+        return jsonify({'error': 'Задание не найдено'}), 404
+    total = job.get('bytes_total')
+    job['percent'] = 100 if job['state'] == 'done' else (
+        round(100 * job.get('bytes_read', 0) / total, 1) if total else 0
+    )
+    return jsonify(job)
+
+@app.route('/api/list/export')
+@login_required
+def export_list():
+    """Скачать свой список: ?format=jsonl|csv|malxml; потоком, gzip — если клиент его принимает"""
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in list_export.FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(list_export.FORMATS)}"}), 400
+
+    mimetype, extension = list_export.FORMATS[fmt]
+    compress = 'gzip' in request.accept_encodings
+    chunks = list_export.export_chunks(fmt, list_export.export_rows(current_user.id), username=current_user.username)
+
+    # Без Content-Length: сервер отдаёт ответ chunked по мере чтения курсора
+    response = Response(stream_with_context(list_export.encode(chunks, compress)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="anime_list.{extension}"'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
+
 @app.route('/api/update_private', methods=['POST'])
 @login_required
 def update_private():
@@ -505,6 +787,7 @@ def update_private():
     anime = UserAnime.query.filter_by(id=anime_id, user_id=current_user.id).first_or_404()
     anime.is_private = is_private
     db.session.commit()
+    list_versions.bump(current_user.id)
 
     return jsonify({'success': True})
 
@@ -522,6 +805,7 @@ def update_comment():
 
     anime.comment = comment
     db.session.commit()
+    list_versions.bump(current_user.id)
 
     return jsonify({'success': True})
 
@@ -542,9 +826,16 @@ def forbidden(error):
 def not_found(error):
     return render_template('404.html'), 404
 
+def with_retry_after(response, error):
+    # render_template теряет заголовки исключения — переносим Retry-After сами
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    return response
+
 @app.errorhandler(429)
 def too_many_requests(error):
-    return render_template('429.html'), 429
+    return with_retry_after(make_response(render_template('429.html'), 429), error)
 
 @app.errorhandler(500)
 def internal_server_error(error):
@@ -556,7 +847,7 @@ def bad_gateway(error):
 
 @app.errorhandler(503)
 def service_unavailable(error):
-    return render_template('503.html'), 503
+    return with_retry_after(make_response(render_template('503.html'), 503), error)
 
 @app.errorhandler(504)
 def gateway_timeout(error):
@@ -633,94 +924,175 @@ def random_page():
 
 # ===== НОВЫЕ ЭНДПОИНТЫ ДЛЯ РЕЙТИНГОВ =====
 
-@cache.cached(timeout=600, query_string=True)
-@app.route('/api/top_anime')
-def top_anime():
-    """Строго по рейтингу (MAL score)"""
+# Рейтинги: путь Jikan и фиксированные параметры
+RANKINGS = {
+    'top': ('/top/anime', {}),
+    'popular': ('/top/anime', {'filter': 'bypopularity'}),
+    'airing': ('/top/anime', {'filter': 'airing'}),
+    # Классика: до 2000 года с высоким рейтингом
+    'classic': ('/anime', {
+        'order_by': 'score',
+        'sort': 'desc',
+        'end_date': '2000-12-31',
+        'min_score': 7.0
+    }),
+}
+
+# Значения по умолчанию для нормализации ключа кэша ответов
+RANKING_DEFAULTS = {'page': 1, 'limit': 12, 'sfw': 'true'}
+
+def ranking_request(name, page, limit, sfw):
+    """URL и параметры запроса к Jikan для рейтинга"""
+    path, extra = RANKINGS[name]
+    params = {'page': page, 'limit': limit, **extra}
+    if sfw:
+        params['sfw'] = 'true'
+    return f"{JIKAN_BASE}{path}", params
+
+def catalog_serves_ranking(name):
+    """Рейтинг отдаётся из каталога: первый sync прошёл, а top/popular/airing перечитаны недавно"""
+    if not (app.config['CATALOG_SERVE'] and catalog.catalog_ready()):
+        return False
+    return name not in catalog.REFRESHED_RANKINGS or catalog.rankings_fresh(app.config['CATALOG_RANKINGS_MAX_AGE'])
+
+def ranking_data(name, page, limit, sfw):
+    """Страница карточек рейтинга: из каталога, кэша или Jikan (None — недоступно)"""
+    if catalog_serves_ranking(name):
+        return cards.project_page(catalog.ranking_page(name, page, limit, sfw), 'search')
+
+    url, params = ranking_request(name, page, limit, sfw)
+    # Рейтинги меняются медленно: семейство 'top' с долгим stale-окном
+    data = cached_jikan_cards(url, params, 'search', family='top')
+    if data is None and degraded_catalog():
+        return cards.project_page(catalog.ranking_page(name, page, limit, sfw), 'search')
+    return data
+
+def ranking_response(name):
     page = int(request.args.get('page', 1))
     limit = min(int(request.args.get('limit', 12)), 25)
     sfw_param = request.args.get('sfw', 'true')
-    
-    params = {
-        'page': page,
-        'limit': limit
-    }
-    if sfw_param == 'true':
-        params['sfw'] = 'true'
-    
-    resp = cached_jikan_get(f"{JIKAN_BASE}/top/anime", params)
-    return process_search_response(resp)
+    return process_search_response(ranking_data(name, page, limit, sfw_param == 'true'))
+
+@app.route('/api/top_anime')
+@response_cache.cached(timeout=600, defaults=RANKING_DEFAULTS)
+def top_anime():
+    """Строго по рейтингу (MAL score)"""
+    return ranking_response('top')
 
-@cache.cached(timeout=600, query_string=True)
 @app.route('/api/popular_anime')
+@response_cache.cached(timeout=600, defaults=RANKING_DEFAULTS)
 def popular_anime():
     """Строго по популярности (MAL ranking)"""
-    page = int(request.args.get('page', 1))
-    limit = min(int(request.args.get('limit', 12)), 25)
-    sfw_param = request.args.get('sfw', 'true')
-    
-    params = {
-        'page': page,
-        'limit': limit,
-        'filter': 'bypopularity'
-    }
-    if sfw_param == 'true':
-        params['sfw'] = 'true'
-    
-    resp = cached_jikan_get(f"{JIKAN_BASE}/top/anime", params)
-    return process_search_response(resp)
+    return ranking_response('popular')
 
-@cache.cached(timeout=600, query_string=True)
 @app.route('/api/airing_anime')
+@response_cache.cached(timeout=600, defaults=RANKING_DEFAULTS)
 def airing_anime():
     """Строго новинки (выходящие сейчас)"""
-    page = int(request.args.get('page', 1))
-    limit = min(int(request.args.get('limit', 12)), 25)
-    sfw_param = request.args.get('sfw', 'true')
-    
-    params = {
-        'page': page,
-        'limit': limit,
-        'filter': 'airing'
-    }
-    if sfw_param == 'true':
-        params['sfw'] = 'true'
-    
-    resp = cached_jikan_get(f"{JIKAN_BASE}/top/anime", params)
-    return process_search_response(resp)
+    return ranking_response('airing')
 
-@cache.cached(timeout=600, query_string=True)
 @app.route('/api/classic_anime')
+@response_cache.cached(timeout=600, defaults=RANKING_DEFAULTS)
 def classic_anime():
     """Классика (до 2000 года с высоким рейтингом)"""
-    page = int(request.args.get('page', 1))
+    return ranking_response('classic')
+
+# Секции главной страницы, которые /api/home_feed отдаёт одним ответом
+HOME_SECTIONS = ('popular', 'top', 'airing')
+
+@app.route('/api/home_feed')
+@response_cache.cached(timeout=600, defaults={'limit': 12, 'sfw': 'true', 'sections': ','.join(HOME_SECTIONS)})
+def home_feed():
+    """Все рейтинги главной страницы одним запросом вместо трёх"""
     limit = min(int(request.args.get('limit', 12)), 25)
-    sfw_param = request.args.get('sfw', 'true')
-    
-    # Фильтруем по дате и сортируем по рейтингу
-    params = {
-        'page': page,
-        'limit': limit,
-        'order_by': 'score',
-        'sort': 'desc',
-        'end_date': '2000-12-31',
-        'min_score': 7.0
-    }
-    if sfw_param == 'true':
-        params['sfw'] = 'true'
-    
-    resp = cached_jikan_get(f"{JIKAN_BASE}/anime", params)
-    return process_search_response(resp)
+    sfw = request.args.get('sfw', 'true') == 'true'
+    names = [name for name in request.args.get('sections', ','.join(HOME_SECTIONS)).split(',') if name in RANKINGS]
+
+    def load(name):
+        # Промахи кэша уходят в Jikan параллельно; темп по-прежнему держит общий лимитер
+        with app.app_context():
+            return ranking_data(name, 1, limit, sfw)
+
+    sections = {}
+    for name, data in zip(names, jikan_client.map(load, names)):
+        if data is None:
+            sections[name] = {'error': 'Сервис временно недоступен, попробуй позже'}
+        else:
+            sections[name] = {'data': data['data']}
+            prefetch_details(data['data'])
+
+    response = jsonify({'sections': sections})
+    if any('error' in section for section in sections.values()):
+        # Остальные секции отдаём, но такой ответ не кэшируем
+        response.cache_control.no_store = True
+    return response
+
+# --- Прогрев рейтингов ---
+def ranking_warm_targets():
+    """Первые N страниц каждого рейтинга в том виде, как их запрашивает фронтенд"""
+    limit = app.config['JIKAN_WARM_LIMIT']
+    # Рейтинги, которые сейчас отдаёт каталог, греть в кэше Jikan незачем
+    with app.app_context():
+        names = [name for name in RANKINGS if not catalog_serves_ranking(name)]
+    for name in names:
+        for page in range(1, app.config['JIKAN_WARM_PAGES'] + 1):
+            for sfw in (True, False):
+                url, params = ranking_request(name, page, limit, sfw)
+                yield make_key(url, params), url, params, 'top'
+
+warmer = CacheWarmer(
+    jikan_cache,
+    ranking_warm_targets,
+    lambda url, params, family: refresh_jikan(url, params, family=family),
+    interval=app.config['JIKAN_WARM_INTERVAL'],
+    lead=app.config['JIKAN_WARM_LEAD'],
+    logger=app.logger
+)
+
+# --- Перечитывание рейтингов каталога ---
+def refresh_ranking_page(name, page, background=True):
+    url, params = ranking_request(name, page, catalog.PAGE_SIZE, sfw=False)
+    resp = rate_limited_get(url, params, background=background)
+    return resp.json() if resp is not None and resp.status_code == 200 else None
+
+def refresh_catalog_rankings():
+    """Перечитать top/popular/airing, если каталог отдаёт рейтинги и прошлый проход устарел"""
+    with app.app_context():
+        if not (app.config['CATALOG_SERVE'] and catalog.catalog_ready()):
+            return
+        age = catalog.rankings_age()
+        if age is not None and age < app.config['CATALOG_REFRESH_INTERVAL']:
+            return
+        try:
+            catalog.refresh_rankings(refresh_ranking_page, app.config['CATALOG_REFRESH_PAGES'],
+                                     app.config['CATALOG_REFRESH_AIRING_PAGES'])
+        finally:
+            catalog_version.bump()
+
+catalog_refresher = PeriodicTask(
+    jikan_cache,
+    'catalog-rankings',
+    refresh_catalog_rankings,
+    interval=app.config['CATALOG_REFRESH_CHECK'],
+    logger=app.logger
+)
+
+@app.before_request
+def start_cache_warmer():
+    # Поток стартует в каждом воркере после fork, но работает за цикл только один
+    if app.config['JIKAN_WARM_ENABLED']:
+        warmer.start()
+    if app.config['CATALOG_REFRESH_ENABLED']:
+        catalog_refresher.start()
 
-@cache.cached(timeout=86400)
 @app.route('/api/genres')
+@response_cache.cached(timeout=86400, max_age=3600)
 def get_genres():
     """Получить список всех жанров"""
     try:
         # Получаем жанры из Jikan API
-        resp = cached_jikan_get(f"{JIKAN_BASE}/genres/anime")
-        if resp and resp.status_code == 200:
-            data = resp.json()
+        data = cached_jikan_get(f"{JIKAN_BASE}/genres/anime")
+        if data is not None:
             genres = data.get('data', [])
             return jsonify({'genres': genres})
         else:
@@ -787,137 +1159,268 @@ def get_genres():
         ]
         return jsonify({'genres': genres})
 
+# Внутренняя телеметрия: только с токеном или разрешённого адреса (см. metrics.internal_only)
+if app.config['INTERNAL_STATS_ENABLED']:
+    @app.route('/api/cache_stats')
+    @internal_only
+    def cache_stats():
+        """Счётчики общего кэша Jikan (hit/miss/eviction по семействам)"""
+        return jsonify(jikan_cache.stats())
+
+    @app.route('/api/upstream_status')
+    @internal_only
+    def upstream_status():
+        """Состояние breaker к Jikan и счётчики лимитера (свои у каждого воркера)"""
+        response = jsonify({
+            'circuit': upstream_breaker.stats(),
+            'rate_limiter': rate_limiter.stats(),
+        })
+        response.cache_control.no_store = True
+        return response
+
 @app.route('/api/my_anime_ids')
 @login_required
 def my_anime_ids():
-    """Получить список anime_id, которые уже есть у пользователя"""
+    """Получить список anime_id, которые уже есть у пользователя.
+
+    ?since=<version> — только изменения с этой версии (added/removed),
+    если журнал её ещё помнит; иначе полный список.
+    """
     try:
-        # Получаем все записи пользователя из UserAnime
-        user_anime = UserAnime.query.filter_by(user_id=current_user.id).all()
-        
-        # Собираем только mal_id
-        ids = [anime.mal_id for anime in user_anime]
-        
-        return jsonify({
-            'success': True,
-            'ids': ids
-        })
+        entry = membership.get(current_user.id)
+        since = request.args.get('since', type=int)
+        etag = f"ids-{entry['version']}" + (f"-since-{since}" if since else '')
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            if not since:
+                delta = None
+            elif since == entry['version']:
+                delta = [], []
+            else:
+                delta = MembershipSets.delta(entry, since)
+
+            if delta is not None:
+                added, removed = delta
+                response = jsonify({
+                    'success': True,
+                    'version': entry['version'],
+                    'delta': True,
+                    'added': added,
+                    'removed': removed,
+                    # Клиент сверяет размер и сумму id с тем, что получилось после применения
+                    'count': len(entry['ids']),
+                    'checksum': sum(entry['ids'])
+                })
+            else:
+                response = jsonify({
+                    'success': True,
+                    'version': entry['version'],
+                    'ids': entry['ids']
+                })
+
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
     except Exception as e:
         app.logger.error(f"Error in my_anime_ids: {str(e)}")
         return jsonify({'error': 'Ошибка получения списка аниме'}), 500
     
-from urllib.parse import quote_plus
+# --- Детали аниме (модалка) ---
+def detail_source(mal_id, background=False):
+    """Элемент в форме Jikan для документа деталей: из каталога, иначе /anime/{id}/full"""
+    item = catalog.get_item(mal_id) if app.config['CATALOG_SERVE'] else None
+    if item is not None:
+        return item
+    url = f"{JIKAN_BASE}/anime/{mal_id}/full"
+    if not background:
+        payload = cached_jikan_get(url)
+    else:
+        payload = jikan_cache.peek(make_key(url)) or refresh_jikan(url, background=True)
+    return payload.get('data') if payload else None
+
+def load_detail_source(mal_id, background=False):
+    if has_app_context():
+        return detail_source(mal_id, background)
+    # Документы пересобираются и в фоновых потоках — там своего контекста приложения нет
+    with app.app_context():
+        return detail_source(mal_id, background)
+
+detail_store = DetailStore(
+    jikan_cache,
+    load_detail_source,
+    refresher,
+    BackgroundRefresher(max_workers=2, logger=app.logger, max_pending=app.config['DETAIL_PREFETCH_QUEUE'])
+)
+
+def prefetch_details(items):
+    """Прогреть документы деталей для карточек, которые сейчас увидит пользователь"""
+    if app.config['DETAIL_PREFETCH']:
+        detail_store.prefetch(item['mal_id'] for item in items)
 
 @app.route('/api/anime/<int:mal_id>')
-@cache.cached(timeout=3600)
+@response_cache.cached(timeout=3600, max_age=3600)
 def get_anime_details(mal_id):
     try:
-        url = f"{JIKAN_BASE}/anime/{mal_id}/full"
-        resp = cached_jikan_get(url)
-        
-        if resp is None or resp.status_code != 200:
-            return jsonify({"error": "Не удалось загрузить данные"}), 503
-            
-        data = resp.json()["data"]
-        
-        # Основные поля
-        title_ru   = data.get("title_russian") or data["title"]
-        title_en   = data.get("title_english") or data["title"]
-        title_jp   = data["title_japanese"] or data["title"]
-        title_main = title_ru or title_en or title_jp
-        
-        synopsis = (data.get("synopsis") or "Описание отсутствует").replace("[Written by MAL Rewrite]", "").strip()
-        
-        image = (
-            data["images"]["jpg"].get("large_image_url") or
-            data["images"]["jpg"].get("image_url") or
-            ""
-        )
-        
-        year = data.get("year") or (
-            data.get("aired", {}).get("from", "")[:4] if data.get("aired", {}).get("from") else "—"
-        )
-        
-        # Проверяем, хентай ли это
-        genres = [g['name'].lower() for g in data.get('genres', []) + data.get('explicit_genres', [])]
-        is_hentai = 'hentai' in genres or 'erotica' in genres
-        
-        # Поисковая строка для сайтов
-        q = quote_plus(title_main)
-        
-        # Формируем СПИСОК ссылок в нужном порядке
-        links_list = []
-        
-        # 1. MyAnimeList — всегда первая
-        links_list.append({
-            "url": f"https://myanimelist.net/anime/{mal_id}",
-            "label": "MyAnimeList"
-        })
-        
-        # 2. AnimeGo — если не хентай
-        if not is_hentai:
-            links_list.append({
-                "url": f"https://animego.org/search/anime?q={q}",
-                "label": "AnimeGo (поиск)"
-            })
-        
-        # 3. AnimeLIB — если не хентай
-        if not is_hentai:
-            links_list.append({
-                "url": f"https://anilib.me/ru/catalog?q={q}",
-                "label": "AnimeLIB (поиск)"
-            })
-        
-        # 4. HDRezka — если не хентай
-        if not is_hentai:
-            links_list.append({
-                "url": f"https://hdrezka.ag/search/?do=search&subaction=search&q={q}",
-                "label": "HDRezka (поиск)"
-            })
-        
-        # 5. Shikimori — всегда последняя
-        shiki_label = "Shikimori (поиск)" if not is_hentai else "Shikimori (поиск, требуется регистрация)"
-        links_list.append({
-            "url": f"https://shikimori.one/animes?search={q}",
-            "label": shiki_label
-        })
-
-        # 6. watchhentai.net — ТОЛЬКО для хентая
-        # 6. watchhentai.net — ТОЛЬКО для хентая
-        if is_hentai:
-            # Поиск по основному названию (title_main)
-            links_list.append({
-                "url": f"https://watchhentai.net/?s={q}",
-                "label": "WatchHentai (поиск)"
-            })
-
-            # Дополнительная ссылка — поиск по английскому названию (title_en)
-            if title_en and title_en != title_main:
-                q_en = quote_plus(title_en)
-                links_list.append({
-                    "url": f"https://watchhentai.net/?s={q_en}",
-                    "label": "WatchHentai (поиск EN)"
-                })
-        
-        return jsonify({
-            "mal_id":     mal_id,
-            "title":      title_main,
-            "title_en":   title_en,
-            "title_jp":   title_jp,
-            "title_ru":   title_ru,
-            "image":      image,
-            "score":      data.get("score") or "—",
-            "year":       year,
-            "episodes":   data.get("episodes") or "—",
-            "type":       data.get("type", "—"),
-            "status":     data.get("status", "—"),
-            "synopsis":   synopsis,
-            "links":      links_list   # ← возвращаем именно список!
-        })
-        
+        doc = detail_store.get(mal_id)
+        if doc is None:
+            return upstream_unavailable("Не удалось загрузить данные")
+        return jsonify(doc)
     except Exception as e:
         app.logger.error(f"Error in /api/anime/{mal_id}: {str(e)}")
         return jsonify({"error": "Внутренняя ошибка сервера"}), 500
 
+# --- Прокси постеров ---
+def image_source(mal_id):
+    """Исходная ссылка на постер на CDN MyAnimeList (None — постера нет)"""
+    item = detail_source(mal_id)
+    return cards.image_of(item) if item else None
+
+@app.route('/img/<int:mal_id>/<size>')
+def anime_image(mal_id, size):
+    if size not in image_proxy.sizes:
+        raise NotFound()
+    try:
+        found = image_proxy.get(mal_id, size, image_source, request.accept_mimetypes['image/webp'] > 0)
+    except ImageUnavailable as e:
+        app.logger.warning(f"Постер {mal_id} не получен: {e}")
+        # Пусть браузер возьмёт картинку с CDN сам; редирект не кэшируем
+        source = image_source(mal_id)
+        if not source:
+            raise NotFound()
+        response = redirect(source)
+        response.cache_control.no_store = True
+        return response
+    if found is None:
+        raise NotFound()
+
+    path, mimetype = found
+    accel = image_proxy.accel_path(path)
+    if accel:
+        # nginx отдаёт файл сам из internal-локации
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = accel
+        response.cache_control.max_age = image_proxy.max_age
+    else:
+        # USE_X_SENDFILE=1 — отдаст Apache/lighttpd; иначе gunicorn шлёт файл через sendfile
+        response = send_file(path, mimetype=mimetype, max_age=image_proxy.max_age)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
+
+# --- CLI: локальный каталог ---
+@app.cli.group('catalog')
+def catalog_cli():
+    """Локальное зеркало каталога Jikan"""
+
+@catalog_cli.command('sync')
+@click.option('--full', is_flag=True, help='Начать с первой страницы (обновить все записи)')
+@click.option('--max-pages', type=int, default=None, help='Остановиться после N страниц')
+def catalog_sync(full, max_pages):
+    """Постранично скачать каталог из Jikan, продолжая с последнего checkpoint"""
+    def get_page(page):
+        # Мимо кэша: страницы синхронизации никому больше не нужны
+        resp = rate_limited_get(f"{JIKAN_BASE}/anime", catalog.sync_page_params(page))
+        return resp.json() if resp is not None and resp.status_code == 200 else None
+
+    try:
+        result = catalog.sync_catalog(get_page, full=full, max_pages=max_pages, log=click.echo)
+    except catalog.SyncError as e:
+        raise click.ClickException(f"{e}; повторный запуск продолжит с этой страницы")
+    finally:
+        # Закоммиченные страницы могли переписать тайтлы из списков — их ETag должен смениться
+        catalog_version.bump()
+    click.echo(f"Готово: {result}")
+
+@catalog_cli.command('refresh-rankings')
+def catalog_refresh_rankings():
+    """Перечитать top/popular/airing: обновить рейтинги и флаг airing у уже загруженных тайтлов"""
+    try:
+        result = catalog.refresh_rankings(
+            lambda name, page: refresh_ranking_page(name, page, background=False),
+            app.config['CATALOG_REFRESH_PAGES'], app.config['CATALOG_REFRESH_AIRING_PAGES'], log=click.echo
+        )
+    except catalog.SyncError as e:
+        raise click.ClickException(str(e))
+    finally:
+        catalog_version.bump()
+    click.echo(f"Готово: {result}")
+
+@catalog_cli.command('fill-missing')
+@click.option('--batch', type=int, default=50, help='Тайтлов за проход')
+def catalog_fill_missing(batch):
+    """Дозагрузить из Jikan записи каталога, перенесённые из старых строк списка"""
+    # Такие записи создала миграция нормализации: synced_at пуст, данные — из строк списка
+    updated = last = 0
+    while True:
+        mal_ids = [mal_id for mal_id, in db.session.query(Anime.mal_id).filter(
+            Anime.synced_at.is_(None), Anime.mal_id > last
+        ).order_by(Anime.mal_id).limit(batch)]
+        if not mal_ids:
+            break
+        updated += catalog.upsert_items(enrich_anime_items(mal_ids))
+        db.session.commit()
+        catalog_version.bump()
+        last = mal_ids[-1]
+        click.echo(f"До mal_id {last}: обновлено {updated}")
+    click.echo(f"Готово: обновлено {updated}")
+
+@catalog_cli.command('reindex')
+def catalog_reindex():
+    """Перестроить полнотекстовый индекс поиска по каталогу"""
+    if not search_index.available():
+        raise click.ClickException("Полнотекстовый индекс поддерживается только на SQLite")
+    search_index.ensure_index()
+    search_index.rebuild()
+    click.echo("Индекс перестроен")
+
+@db_cli.command('check-plans')
+def db_check_plans():
+    """Проверить, что горячие запросы идут по индексам (EXPLAIN)"""
+    failed = 0
+    for name, plan, problems in query_plans.check_plans():
+        click.echo(f"{'FAIL' if problems else 'ok  '}  {name}")
+        for line in plan:
+            click.echo(f"        {line}")
+        for problem in problems:
+            click.echo(f"      ! {problem}")
+        failed += bool(problems)
+    if failed:
+        raise click.ClickException(f"Запросов без индекса: {failed}")
+
+@app.cli.command('db-profile')
+def db_profile():
+    """Показать профиль и фактические настройки соединения с базой"""
+    click.echo(f"Профиль: {app.config['DB_PROFILE']}")
+    for name, value in db_profiles.describe(db.engine).items():
+        click.echo(f"  {name}: {value}")
+
+# --- CLI: списки пользователей ---
+@app.cli.group('lists')
+def lists_cli():
+    """Списки пользователей"""
+
+@lists_cli.command('export')
+@click.option('--format', 'fmt', type=click.Choice(list(list_export.FORMATS)), default='jsonl')
+@click.option('--user', 'username', default=None, help='Только этот пользователь (иначе все)')
+@click.option('--gzip', 'compress', is_flag=True, help='Сжимать вывод gzip')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Файл (по умолчанию stdout)')
+def lists_export(fmt, username, compress, output):
+    """Выгрузить списки потоком — память не зависит от числа записей"""
+    user = None
+    if username:
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f"Пользователь {username} не найден")
+    elif fmt == 'malxml':
+        raise click.ClickException("Формат malxml — один пользователь на файл, укажите --user")
+
+    rows = list_export.export_rows(user.id if user else None)
+    chunks = list_export.export_chunks(fmt, rows, username=username or '', with_user=user is None)
+    for data in list_export.encode(chunks, compress):
+        output.write(data)
+
 if __name__ == "__main__":
     app.run(debug=False)  # debug=False для продакшена
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""Карточки аниме для фронтенда из записей в форме Jikan.
+
+Единая стадия проекции: полный элемент Jikan (десятки полей, длинное
+описание, трейлеры, студии) один раз превращается в компактную карточку —
+ровно те поля, что рисует фронтенд, с уже склеенными жанрами и обрезанным
+описанием. Страница карточек кэшируется отдельно от исходного ответа
+(см. cached_jikan_cards в app.py), так что на тёплом кэше не разбирается
+полный JSON Jikan и не строятся заново словари.
+
+Постеры отдаются через прокси /img/<mal_id>/<size> (image_proxy.py).
+"""
+
+from image_proxy import proxy_url
+
+
+def image_of(a):
+    """Исходная ссылка на постер из элемента Jikan"""
+    images = a['images']['jpg']
+    return images.get('large_image_url') or images.get('image_url')
+
+
+def _genre_names(a):
+    genres = [genre['name'] for genre in a.get('genres') or ()]
+    genres.extend(genre['name'] for genre in a.get('explicit_genres') or ())
+    return genres
+
+
+def search_card(a):
+    """Карточка поиска, рейтингов и главной"""
+    return {
+        'mal_id': a['mal_id'],
+        'title': a.get('title_english') or a['title'],
+        'image': proxy_url(a['mal_id'], 'card') if a['images']['jpg'].get('large_image_url') else None,
+        'score': a.get('score'),
+        'popularity': a.get('popularity') or 0,
+        'members': a.get('members') or 0,
+        'favorites': a.get('favorites') or 0,
+        'start_date': a.get('aired', {}).get('from'),
+        'year': a.get('year') or 'N/A',
+        'type': a.get('type', 'TV'),
+        'episodes': a.get('episodes') or '?',
+        'synopsis': (a.get('synopsis') or 'Нет описания')[:200] + '...',
+        'genres': _genre_names(a)[:3]
+    }
+
+
+def random_card(a):
+    """Карточка для страницы случайных аниме"""
+    # Дата выхода
+    start_date = a.get('aired', {}).get('from')
+    year = None
+    if start_date:
+        try:
+            year = int(start_date[:4])
+        except ValueError:
+            year = None
+
+    return {
+        'mal_id': a['mal_id'],
+        'title': a.get('title_english') or a['title'] or 'Без названия',
+        'image': proxy_url(a['mal_id'], 'card') if image_of(a) else '',
+        'score': a.get('score') or 0,
+        'popularity': a.get('popularity') or 0,
+        'members': a.get('members') or 0,
+        'favorites': a.get('favorites') or 0,
+        'start_date': start_date,
+        'year': year or a.get('year') or '—',
+        'type': a.get('type', 'TV'),
+        'episodes': a.get('episodes') or '?',
+        'synopsis': (a.get('synopsis') or 'Нет описания')[:250] + '...',
+        'genres': _genre_names(a)[:5]
+    }
+
+
+PROJECTIONS = {
+    'search': search_card,
+    'random': random_card,
+}
+
+
+def project_page(data, kind='search'):
+    """Страница Jikan ({'data', 'pagination'}) -> {'data': [карточки], 'pagination'}"""
+    card = PROJECTIONS[kind]
+    return {
+        'data': [card(a) for a in data.get('data', [])],
+        'pagination': data.get('pagination', {}),
+    }
@@ -0,0 +1,255 @@
+"""Локальный каталог аниме: инкрементальная синхронизация с Jikan и выборки из него.
+
+Синхронизация листает /anime?order_by=mal_id&sort=asc постранично и после
+каждой страницы фиксирует номер страницы в SyncCheckpoint в той же
+транзакции, что и сами записи, поэтому прерванный sync продолжается с места
+обрыва. Новые тайтлы получают большие mal_id и появляются на последних
+страницах — повторный запуск без --full дочитывает только их.
+
+Уже прочитанные строки инкрементальный sync больше не трогает, поэтому
+airing, score, rank и popularity обновляет refresh_rankings: он перечитывает
+первые страницы рейтингов Jikan (а airing — целиком) и отмечает время в
+checkpoint 'rankings'. Пока этот проход свежее max_age, рейтинги отдаются из
+каталога; после — снова из кэша Jikan.
+"""
+import math
+import time
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Anime, SyncCheckpoint
+import search_index
+
+SYNC_NAME = 'anime'
+RANKINGS_SYNC_NAME = 'rankings'
+# Рейтинги, которые строятся по полям, меняющимся со временем, и перечитываются refresh_rankings
+REFRESHED_RANKINGS = ('top', 'popular', 'airing')
+PAGE_SIZE = 25
+READY_CHECK_INTERVAL = 60  # как часто перепроверять, готов ли каталог
+
+_ready = {'value': False, 'checked_at': 0.0}
+_rankings = {'synced_at': None, 'checked_at': 0.0}
+
+
+class SyncError(Exception):
+    """Jikan не отдал страницу — checkpoint остаётся на ней"""
+
+
+def sync_page_params(page):
+    return {'page': page, 'limit': PAGE_SIZE, 'order_by': 'mal_id', 'sort': 'asc'}
+
+
+def upsert_items(items):
+    """Вставить или обновить записи каталога одним запросом"""
+    rows = {}
+    for item in items:
+        if item.get('mal_id'):
+            rows[item['mal_id']] = Anime.values_from_jikan(item)
+    if not rows:
+        return 0
+
+    rows = list(rows.values())
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(Anime).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Anime.mal_id],
+            set_={name: stmt.excluded[name] for name in rows[0] if name != 'mal_id'}
+        )
+        db.session.execute(stmt)
+    else:
+        for row in rows:
+            db.session.merge(Anime(**row))
+    search_index.index_rows(rows)
+    return len(rows)
+
+
+def ensure_items(mal_ids, fetch_items):
+    """Записи каталога для mal_ids: недостающие — через fetch_items(mal_ids) (кэшированный Jikan).
+
+    Возвращает множество mal_id, которые теперь есть в каталоге; commit — за вызывающим.
+    """
+    mal_ids = set(mal_ids)
+    if not mal_ids:
+        return set()
+    present = {mal_id for mal_id, in db.session.query(Anime.mal_id).filter(Anime.mal_id.in_(mal_ids))}
+    missing = sorted(mal_ids - present)
+    if missing:
+        fetched = [item for item in fetch_items(missing) if item.get('mal_id') in mal_ids]
+        upsert_items(fetched)
+        present.update(item['mal_id'] for item in fetched)
+    return present
+
+
+def sync_catalog(get_page, full=False, max_pages=None, log=None):
+    """Синхронизировать каталог; get_page(page) -> JSON страницы Jikan или None"""
+    checkpoint = db.session.get(SyncCheckpoint, SYNC_NAME) or SyncCheckpoint(name=SYNC_NAME, page=1)
+    if full:
+        checkpoint.page = 1
+
+    page = checkpoint.page
+    pages = items = 0
+    while max_pages is None or pages < max_pages:
+        data = get_page(page)
+        if data is None:
+            raise SyncError(f"Не удалось получить страницу {page}")
+
+        items += upsert_items(data.get('data', []))
+        has_next = bool(data.get('pagination', {}).get('has_next_page'))
+        if has_next:
+            checkpoint.page = page + 1
+        else:
+            # Остаёмся на последней странице: следующий запуск дочитает новые тайтлы
+            checkpoint.page = page
+            checkpoint.completed_at = datetime.utcnow()
+        db.session.add(checkpoint)
+        db.session.commit()
+
+        pages += 1
+        if log:
+            log(f"Страница {page}: всего обработано {items} тайтлов")
+        if not has_next:
+            break
+        page += 1
+
+    _ready['checked_at'] = 0.0
+    return {'pages': pages, 'items': items, 'next_page': checkpoint.page,
+            'completed': checkpoint.completed_at is not None}
+
+
+def catalog_ready():
+    """Каталог можно отдавать вместо Jikan после первого полного прохода"""
+    now = time.time()
+    if now - _ready['checked_at'] > READY_CHECK_INTERVAL:
+        checkpoint = db.session.get(SyncCheckpoint, SYNC_NAME)
+        _ready['value'] = bool(checkpoint and checkpoint.completed_at)
+        _ready['checked_at'] = now
+    return _ready['value']
+
+
+def refresh_rankings(get_page, pages, airing_max_pages=None, log=None):
+    """Перечитать первые pages страниц рейтингов; get_page(name, page) -> JSON страницы Jikan или None.
+
+    Выходящие сейчас тайтлы читаются до последней страницы (не больше airing_max_pages):
+    у тех, кого в выдаче больше нет, снимается флаг airing и статус «Currently Airing».
+    """
+    items = 0
+    for name in REFRESHED_RANKINGS:
+        airing_ids = set()
+        page = 1
+        while True:
+            data = get_page(name, page)
+            if data is None:
+                db.session.rollback()
+                raise SyncError(f"Не удалось получить страницу {page} рейтинга {name}")
+            batch = data.get('data', [])
+            items += upsert_items(batch)
+            airing_ids.update(item['mal_id'] for item in batch if item.get('mal_id'))
+            has_next = bool(data.get('pagination', {}).get('has_next_page'))
+            limit = airing_max_pages if name == 'airing' else pages
+            if not has_next or (limit is not None and page >= limit):
+                break
+            page += 1
+
+        if name == 'airing' and not has_next:
+            # Прочитали всю выдачу: остальные тайтлы уже вышли (статус по нему фильтрует случайная выборка)
+            Anime.query.filter(Anime.airing.is_(True), Anime.mal_id.notin_(airing_ids)).update(
+                {'airing': False, 'status': 'Finished Airing'}, synchronize_session=False
+            )
+        if log:
+            log(f"Рейтинг {name}: {page} стр.")
+
+    checkpoint = db.session.get(SyncCheckpoint, RANKINGS_SYNC_NAME) or SyncCheckpoint(name=RANKINGS_SYNC_NAME)
+    checkpoint.page = 1
+    checkpoint.completed_at = datetime.utcnow()
+    db.session.add(checkpoint)
+    db.session.commit()
+    _rankings['checked_at'] = 0.0
+    return {'items': items, 'synced_at': checkpoint.completed_at}
+
+
+def rankings_age():
+    """Сколько секунд назад refresh_rankings последний раз прошёл целиком (None — ни разу)"""
+    now = time.time()
+    if now - _rankings['checked_at'] > READY_CHECK_INTERVAL:
+        checkpoint = db.session.get(SyncCheckpoint, RANKINGS_SYNC_NAME)
+        _rankings['synced_at'] = checkpoint.completed_at if checkpoint else None
+        _rankings['checked_at'] = now
+    if _rankings['synced_at'] is None:
+        return None
+    return (datetime.utcnow() - _rankings['synced_at']).total_seconds()
+
+
+def rankings_fresh(max_age):
+    age = rankings_age()
+    return age is not None and age < max_age
+
+
+def page_payload(items, page, limit, total):
+    """Страница записей каталога в форме ответа Jikan ({'data', 'pagination'})"""
+    last_page = max(1, math.ceil(total / limit))
+    return {
+        'data': [anime.to_jikan() for anime in items],
+        'pagination': {
+            'last_visible_page': last_page,
+            'has_next_page': page < last_page,
+            'current_page': page,
+            'items': {'count': len(items), 'total': total, 'per_page': limit},
+        },
+    }
+
+
+def paginate(query, page, limit):
+    total = query.order_by(None).count()
+    items = query.offset((page - 1) * limit).limit(limit).all()
+    return page_payload(items, page, limit, total)
+
+
+def ranking_query(name, sfw):
+    query = Anime.query
+    if sfw:
+        query = query.filter(Anime.is_nsfw.is_(False))
+
+    if name == 'top':
+        return query.filter(Anime.rank > 0).order_by(Anime.rank)
+    if name == 'popular':
+        return query.filter(Anime.popularity > 0).order_by(Anime.popularity)
+    if name == 'airing':
+        return query.filter(Anime.airing.is_(True)).order_by(Anime.rank.is_(None), Anime.rank)
+    if name == 'classic':
+        return query.filter(Anime.aired_from < '2001-01-01', Anime.score >= 7.0).order_by(Anime.score.desc())
+    raise ValueError(name)
+
+
+def ranking_page(name, page, limit, sfw):
+    return paginate(ranking_query(name, sfw), page, limit)
+
+
+def get_item(mal_id):
+    """Элемент каталога в форме Jikan или None.
+
+    None и для записей, которые миграция нормализации собрала из строк списков
+    (synced_at пуст): жанров и рейтинга у них нет, хентай не отличить от
+    остального — такие тайтлы берутся из Jikan, пока их не дозагрузит fill-missing.
+    """
+    anime = db.session.get(Anime, mal_id)
+    return anime.to_jikan() if anime and anime.synced_at is not None else None
+
+
+class CatalogVersion:
+    """Версия каталога для ETag списков: меняется, когда sync или дозагрузка переписали записи"""
+
+    def __init__(self, cache, timeout=30 * 86400):
+        self.cache = cache  # JikanCache: версия общая для воркеров и CLI
+        self.timeout = timeout
+
+    def get(self):
+        version = self.cache.peek('catalogver')
+        return version if version is not None else self.bump()
+
+    def bump(self):
+        version = int(time.time() * 1e6)
+        self.cache.set('catalogver', version, 'lists', timeout=self.timeout)
+        return version
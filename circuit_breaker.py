@@ -0,0 +1,185 @@
+"""Circuit breaker для запросов к Jikan.
+
+Когда Jikan лежит или отвечает по 10 секунд, каждый запрос к нему держит
+воркер до таймаута (да ещё с повторами) — и очень скоро заняты все воркеры,
+включая страницы, которым Jikan вообще не нужен. Breaker считает сбои
+(таймауты, ошибки соединения, 5xx): после threshold сбоев за window секунд
+он «размыкается», и запросы к Jikan сразу получают отказ — эндпоинты отдают
+последнее известное (просроченный кэш, каталог) или быстрый 503.
+
+Через reset_timeout секунд breaker полуоткрыт: ровно один пробный запрос
+(аренда в общем кэше — один на все воркеры) идёт в Jikan. Успех замыкает
+breaker, сбой размыкает его снова на вдвое больший срок (не больше
+max_reset_timeout).
+
+Состояние «разомкнут» общее для воркеров (запись в JikanCache): сбои
+заметил один воркер — быстрый отказ получают все. Счётчики сбоев и
+переходов — свои у каждого процесса, как у лимитера.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+# Значение gauge circuit_breaker_state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+STATE_REFRESH = 1.0  # как часто перечитывать общее состояние, сек
+
+
+class CircuitOpen(Exception):
+    """Breaker разомкнут: в upstream не ходим"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name}: circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, cache, app=None, name='jikan'):
+        self.cache = cache  # JikanCache: общее состояние и аренда пробного запроса
+        self.name = name
+        self.threshold = 5
+        self.window = 30
+        self.reset_timeout = 30
+        self.max_reset_timeout = 300
+        self.transitions = Counter()
+        self.rejected = 0
+        self.failures = 0
+        self._recent = deque()
+        self._shared = None
+        self._read_at = 0.0
+        self._owner = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.threshold = app.config.get('CIRCUIT_FAILURE_THRESHOLD', 5)
+        self.window = app.config.get('CIRCUIT_FAILURE_WINDOW', 30)
+        self.reset_timeout = app.config.get('CIRCUIT_RESET_TIMEOUT', 30)
+        self.max_reset_timeout = app.config.get('CIRCUIT_MAX_RESET_TIMEOUT', 300)
+        app.extensions[f'circuit_breaker.{self.name}'] = self
+
+    @property
+    def key(self):
+        return f"circuit:{self.name}"
+
+    def _state(self, refresh=False):
+        """Общее состояние {'open_until', 'reset_timeout'} или None (замкнут); перечитывается раз в секунду"""
+        now = time.time()
+        if refresh or now - self._read_at > STATE_REFRESH:
+            self._shared = self.cache.peek(self.key)
+            self._read_at = now
+        return self._shared
+
+    def _publish(self, state):
+        self._shared = state
+        self._read_at = time.time()
+        if state is None:
+            self.cache.backend.delete(self.key)
+        else:
+            self.cache.set(self.key, state, 'circuit', timeout=86400)
+
+    def state(self):
+        shared = self._state()
+        if shared is None:
+            return CLOSED
+        return OPEN if shared['open_until'] > time.time() else HALF_OPEN
+
+    def is_open(self):
+        """Upstream сейчас считается недоступным (разомкнут или ждёт пробного запроса)"""
+        return self._state() is not None
+
+    def retry_after(self):
+        """Через сколько секунд breaker попробует upstream снова (0 — замкнут)"""
+        shared = self._state()
+        if shared is None:
+            return 0.0
+        return max(shared['open_until'] - time.time(), 1.0)
+
+    def before_call(self):
+        """Можно ли идти в upstream: True — это пробный запрос, False — обычный; иначе CircuitOpen"""
+        shared = self._state()
+        if shared is None:
+            return False
+
+        now = time.time()
+        if shared['open_until'] <= now:
+            # Полуоткрыт: пробует тот, кто взял аренду (один на все воркеры)
+            owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+            if self.cache.backend.add_lease(f"{self.key}:probe", owner, 60):
+                with self._lock:
+                    self._owner = owner
+                    self.transitions[HALF_OPEN] += 1
+                metrics.CIRCUIT_TRANSITIONS.labels(self.name, HALF_OPEN).inc()
+                return True
+
+        with self._lock:
+            self.rejected += 1
+        metrics.CIRCUIT_REJECTED.labels(self.name).inc()
+        raise CircuitOpen(self.name, max(shared['open_until'] - now, 1.0))
+
+    def success(self, probe=False):
+        """Upstream ответил: любой удачный ответ замыкает breaker"""
+        with self._lock:
+            self._recent.clear()
+        if (probe or self._state() is not None) and self._state(refresh=True) is not None:
+            with self._lock:
+                self.transitions[CLOSED] += 1
+            metrics.CIRCUIT_TRANSITIONS.labels(self.name, CLOSED).inc()
+            self._publish(None)
+        if probe:
+            self._release_probe()
+
+    def failure(self, probe=False):
+        now = time.time()
+        with self._lock:
+            self.failures += 1
+            self._recent.append(now)
+            while self._recent and self._recent[0] <= now - self.window:
+                self._recent.popleft()
+            tripped = len(self._recent) >= self.threshold
+            if tripped:
+                self._recent.clear()
+
+        if probe:
+            # Пробный запрос не прошёл — размыкаем снова, на вдвое больший срок
+            shared = self._state(refresh=True) or {}
+            self._open(min(shared.get('reset_timeout', self.reset_timeout) * 2, self.max_reset_timeout))
+            self._release_probe()
+        elif tripped and self._state(refresh=True) is None:
+            self._open(self.reset_timeout)
+
+    def cancel(self, probe):
+        """Запрос так и не ушёл в upstream (например, отказал лимитер) — отдать пробу другим"""
+        if probe:
+            self._release_probe()
+
+    def _open(self, reset_timeout):
+        with self._lock:
+            self.transitions[OPEN] += 1
+        metrics.CIRCUIT_TRANSITIONS.labels(self.name, OPEN).inc()
+        self._publish({'open_until': time.time() + reset_timeout, 'reset_timeout': reset_timeout})
+
+    def _release_probe(self):
+        with self._lock:
+            owner, self._owner = self._owner, None
+        if owner:
+            self.cache.backend.release_lease(f"{self.key}:probe", owner)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state(),
+                'retry_after': round(self.retry_after(), 1),
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'transitions': {name: self.transitions[name] for name in (OPEN, HALF_OPEN, CLOSED)},
+            }
@@ -8,4 +8,119 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:///anime_app.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-    DEBUG = os.environ.get('FLASK_DEBUG', '1') == '0'  # Включаем отладку, если переменная окружения FLASK_DEBUG установлена в '1'
\ No newline at end of file
+    DEBUG = os.environ.get('FLASK_DEBUG', '1') == '0'  # Включаем отладку, если переменная окружения FLASK_DEBUG установлена в '1'
+
+    # --- Профиль основной базы (см. db_profiles.py) ---
+    # dev — настройки драйвера по умолчанию, как DEBUG и SECRET_KEY выше; production (gunicorn.conf.py
+    # выставляет его сам) — SQLite в WAL с busy_timeout или пул соединений PostgreSQL
+    DB_PROFILE = os.getenv("DB_PROFILE", "dev")
+    DB_SQLITE_BUSY_TIMEOUT = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "5000"))            # мс ожидания блокировки
+    DB_SQLITE_MMAP_SIZE = int(os.getenv("DB_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # байт
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))         # постоянных соединений PostgreSQL на воркер
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))    # сверх пула при пиках
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))   # сек ожидания свободного соединения
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # переоткрывать соединения старше, сек
+
+    # --- Пароли и вход (см. passwords.py) ---
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))          # смена — хэши пересчитаются при входе
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))   # процессов bcrypt на воркер; 0 — без пула
+    PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))      # задач в ожидании, сверх — отказ 503
+    PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+    LOGIN_THROTTLE_WINDOW = int(os.getenv("LOGIN_THROTTLE_WINDOW", "900"))            # сек
+    LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "30"))     # за окно, дальше 429
+    LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", "10"))
+    LOGIN_THROTTLE_PATH = os.getenv("LOGIN_THROTTLE_PATH")  # по умолчанию instance/login_throttle.db
+
+    # /metrics в формате Prometheus (нужен prometheus_client); под gunicorn — PROMETHEUS_MULTIPROC_DIR, см. gunicorn.conf.py
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+    # JSON-счётчики кэша и upstream: /api/cache_stats, /api/upstream_status
+    INTERNAL_STATS_ENABLED = os.getenv("INTERNAL_STATS_ENABLED", "1") == "1"
+    # Кому доступна телеметрия (/metrics и счётчики выше): по токену (Authorization: Bearer <токен>)
+    # или с адресов/подсетей через запятую. За обратным прокси remote_addr — адрес прокси, поэтому
+    # 127.0.0.1 в списке откроет телеметрию всем, кто ходит через него; по умолчанию закрыто
+    INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN")
+    INTERNAL_ALLOWED_IPS = [net.strip() for net in os.getenv("INTERNAL_ALLOWED_IPS", "").split(",") if net.strip()]
+
+    # Пользователь для @login_required берётся из памяти воркера не дольше стольких секунд (0 — всегда из базы)
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "30"))
+
+    JIKAN_BASE = os.getenv("JIKAN_BASE", "https://api.jikan.moe/v4")  # можно указать локальную заглушку
+    JIKAN_POOL_SIZE = int(os.getenv("JIKAN_POOL_SIZE", "10"))              # keep-alive соединений на воркер
+    JIKAN_CONNECT_TIMEOUT = float(os.getenv("JIKAN_CONNECT_TIMEOUT", "3.05"))
+    JIKAN_READ_TIMEOUT = float(os.getenv("JIKAN_READ_TIMEOUT", "10"))
+
+    # --- Circuit breaker к Jikan (см. circuit_breaker.py) ---
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))  # сбоев (таймауты, 5xx) ...
+    CIRCUIT_FAILURE_WINDOW = int(os.getenv("CIRCUIT_FAILURE_WINDOW", "30"))       # ... за столько сек — размыкаем
+    CIRCUIT_RESET_TIMEOUT = int(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))         # через сколько сек пробный запрос
+    CIRCUIT_MAX_RESET_TIMEOUT = int(os.getenv("CIRCUIT_MAX_RESET_TIMEOUT", "300"))  # после неудачных проб срок растёт до
+
+    # --- Общий кэш ответов Jikan (разделяется между воркерами gunicorn) ---
+    # sqlite — файл на диске без внешних сервисов, redis — нужен пакет redis, memory — для отладки
+    JIKAN_CACHE_BACKEND = os.getenv("JIKAN_CACHE_BACKEND", "sqlite")
+    JIKAN_CACHE_PATH = os.getenv("JIKAN_CACHE_PATH")  # по умолчанию instance/jikan_cache.db
+    JIKAN_CACHE_REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    JIKAN_CACHE_MAX_ENTRIES = int(os.getenv("JIKAN_CACHE_MAX_ENTRIES", "50000"))
+    # Сколько ещё хранить запись после stale-окна — на случай, когда Jikan недоступен (breaker разомкнут)
+    JIKAN_CACHE_GRACE_TTL = int(os.getenv("JIKAN_CACHE_GRACE_TTL", str(3 * 86400)))
+    # TTL и stale-окно (секунды) по семействам эндпоинтов: значения по умолчанию —
+    # DEFAULT_TTLS и DEFAULT_STALE_TTLS в jikan_cache.py, здесь только переопределения,
+    # например {'search': 600}
+    JIKAN_CACHE_TTLS = {}
+    JIKAN_CACHE_STALE_TTLS = {}
+
+    # --- Лимит запросов к Jikan (общий для всех воркеров) ---
+    JIKAN_RATE_PER_SECOND = int(os.getenv("JIKAN_RATE_PER_SECOND", "3"))
+    JIKAN_RATE_PER_MINUTE = int(os.getenv("JIKAN_RATE_PER_MINUTE", "60"))
+    JIKAN_RATE_BURST_SECOND = int(os.getenv("JIKAN_RATE_BURST_SECOND", "1"))
+    JIKAN_RATE_BURST_MINUTE = int(os.getenv("JIKAN_RATE_BURST_MINUTE", "10"))
+    JIKAN_RATE_MAX_WAIT = float(os.getenv("JIKAN_RATE_MAX_WAIT", "10"))  # дольше в очереди не ждём
+    JIKAN_RETRY_BACKOFF = float(os.getenv("JIKAN_RETRY_BACKOFF", "0.5"))  # пауза перед повтором после сетевой ошибки, удваивается
+    # Фоновые запросы (предзагрузка деталей) не встают в очередь: ждут слот, после которого в каждой
+    # корзине останется столько токенов пользователям, но не дольше BACKGROUND_MAX_WAIT сек
+    JIKAN_RATE_BACKGROUND_HEADROOM = int(os.getenv("JIKAN_RATE_BACKGROUND_HEADROOM", "5"))
+    JIKAN_RATE_BACKGROUND_MAX_WAIT = float(os.getenv("JIKAN_RATE_BACKGROUND_MAX_WAIT", "30"))
+    JIKAN_RATE_LIMIT_PATH = os.getenv("JIKAN_RATE_LIMIT_PATH")  # по умолчанию instance/jikan_ratelimit.db
+
+    # --- Прогрев рейтингов ---
+    JIKAN_WARM_ENABLED = os.getenv("JIKAN_WARM_ENABLED", "1") == "1"
+    JIKAN_WARM_PAGES = int(os.getenv("JIKAN_WARM_PAGES", "3"))         # сколько первых страниц прогревать
+    JIKAN_WARM_LIMIT = 12                                               # как запрашивает фронтенд
+    JIKAN_WARM_INTERVAL = int(os.getenv("JIKAN_WARM_INTERVAL", "60"))   # период планировщика, сек
+    JIKAN_WARM_LEAD = int(os.getenv("JIKAN_WARM_LEAD", "300"))          # обновлять за столько сек до истечения
+
+    # --- Документы деталей для модалки (см. anime_details.py) ---
+    # Карточки ответов поиска и рейтингов прогревают документы деталей в фоне
+    DETAIL_PREFETCH = os.getenv("DETAIL_PREFETCH", "1") == "1"
+    DETAIL_PREFETCH_QUEUE = int(os.getenv("DETAIL_PREFETCH_QUEUE", "200"))          # заявок в ожидании на воркер
+
+    # --- Прокси постеров /img/<mal_id>/<size> (см. image_proxy.py) ---
+    IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR")  # по умолчанию instance/images
+    IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    IMAGE_SIZES = {'thumb': 120, 'card': 240, 'large': 480}   # ширина, px
+    IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))      # WebP/JPEG (нужен Pillow)
+    # Отдача файлов фронтовым сервером: X-Sendfile (Apache, lighttpd) или префикс internal-локации nginx
+    USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "0") == "1"
+    IMAGE_ACCEL_REDIRECT = os.getenv("IMAGE_ACCEL_REDIRECT")  # например /_img_cache/ -> alias на IMAGE_CACHE_DIR
+
+    # --- Локальный каталог ---
+    # Отдавать рейтинги и карточки из каталога (после первой полной синхронизации `flask catalog sync`)
+    CATALOG_SERVE = os.getenv("CATALOG_SERVE", "1") == "1"
+    # Как долго индексы случайной выборки живут в памяти воркера до перечитывания каталога, сек
+    SAMPLER_INDEX_TTL = int(os.getenv("SAMPLER_INDEX_TTL", "600"))
+    # Инкрементальный sync не перечитывает старые строки: top/popular/airing освежает отдельный проход
+    CATALOG_REFRESH_ENABLED = os.getenv("CATALOG_REFRESH_ENABLED", "1") == "1"
+    CATALOG_REFRESH_INTERVAL = int(os.getenv("CATALOG_REFRESH_INTERVAL", str(6 * 3600)))   # как часто перечитывать, сек
+    CATALOG_REFRESH_CHECK = int(os.getenv("CATALOG_REFRESH_CHECK", "300"))                 # период планировщика, сек
+    CATALOG_REFRESH_PAGES = int(os.getenv("CATALOG_REFRESH_PAGES", "4"))                   # страниц top и popular по 25
+    CATALOG_REFRESH_AIRING_PAGES = int(os.getenv("CATALOG_REFRESH_AIRING_PAGES", "20"))    # airing читается до конца, но не дальше
+    # Рейтинги старше этого отдаются из кэша Jikan, а не из каталога, сек
+    CATALOG_RANKINGS_MAX_AGE = int(os.getenv("CATALOG_RANKINGS_MAX_AGE", str(24 * 3600)))
+
+    # --- Импорт списка с MyAnimeList ---
+    IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))  # XML-выгрузка MAL или JSON
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "200"))     # записей на один upsert и commit
+    IMPORT_ENRICH_BATCH = int(os.getenv("IMPORT_ENRICH_BATCH", "3"))   # параллельных запросов к Jikan за метаданными
+    IMPORT_PATH = os.getenv("IMPORT_PATH")  # куда сохранять загрузки, по умолчанию instance/imports
+    # Самое большое тело запроса в приложении — загрузка импорта; больше werkzeug не читает (413)
+    MAX_CONTENT_LENGTH = IMPORT_MAX_BYTES
@@ -0,0 +1,66 @@
+"""Профили подключения к основной базе.
+
+production (под gunicorn, см. gunicorn.conf.py):
+  * SQLite — WAL (читатели не ждут писателя), busy_timeout вместо мгновенного
+    «database is locked», synchronous=NORMAL (fsync только на checkpoint WAL)
+    и mmap для чтения без лишних копий. PRAGMA выставляются на каждое новое
+    соединение через событие connect.
+  * PostgreSQL — пул с pool_pre_ping и ограниченным переполнением: воркер
+    не открывает соединений больше, чем выдержит сервер.
+dev (по умолчанию) — настройки драйвера по умолчанию, как было до профилей.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS для профиля; вызывать до db.init_app"""
+    if config.get('DB_PROFILE') != 'production':
+        return {}
+
+    backend = make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend == 'sqlite':
+        # Ожидание блокировки в самом драйвере — на случай, если PRAGMA ещё не выполнена
+        return {'connect_args': {'timeout': config['DB_SQLITE_BUSY_TIMEOUT'] / 1000}}
+    if backend == 'postgresql':
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': True,
+        }
+    return {'pool_pre_ping': True}
+
+
+def init_engine(engine, config):
+    """Повесить на движок настройку соединений (для SQLite в профиле production)"""
+    if config.get('DB_PROFILE') != 'production' or engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = (
+        'PRAGMA journal_mode=WAL',
+        f"PRAGMA busy_timeout={int(config['DB_SQLITE_BUSY_TIMEOUT'])}",
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA mmap_size={int(config['DB_SQLITE_MMAP_SIZE'])}",
+        'PRAGMA temp_store=MEMORY',
+    )
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def describe(engine):
+    """Фактические настройки соединения — для `flask db-profile`"""
+    info = {'dialect': engine.dialect.name, 'pool': type(engine.pool).__name__}
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            for name in ('journal_mode', 'busy_timeout', 'synchronous', 'mmap_size'):
+                info[name] = conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+    elif hasattr(engine.pool, 'size'):
+        info['pool_size'] = engine.pool.size()
+    return info
@@ -0,0 +1,56 @@
+"""Сериализация JSON через orjson, если он установлен, иначе стандартный json.
+
+orjson в разы быстрее на dumps/loads; им пользуются общий кэш (payload
+каждой записи) и ответы Flask (jsonify). Форма ответов не меняется:
+ключи сортируются как у провайдера Flask по умолчанию, даты уходят в его
+же обработчик.
+
+orjson есть в requirements.txt; без него (нет колеса под платформу) всё
+работает на стандартном json, только медленнее.
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson  # без него — стандартный json
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Нестроковые ключи приводятся к строкам, как у json.dumps
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj):
+    """JSON-строка (UTF-8 без \\u-экранирования)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=_OPTIONS).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(s):
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Провайдер JSON для Flask на orjson: app.json = JSONProvider(app)"""
+
+    def dumps(self, obj, **kwargs):
+        # response() передаёт indent=2 (debug) или компактные separators; с другими аргументами — обычный json
+        if orjson is None or set(kwargs) - {'indent', 'separators'} or kwargs.get('indent') not in (None, 2):
+            return super().dumps(obj, **kwargs)
+        option = _OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        # Даты, UUID, dataclass и пр. — тем же обработчиком, что у Flask (даты в формате HTTP)
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
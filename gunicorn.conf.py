@@ -0,0 +1,29 @@
+"""Настройки gunicorn: `gunicorn -c gunicorn.conf.py wsgi:app`.
+
+Метрики воркеров складываются в общий каталог (multiprocess-режим
+prometheus_client, см. metrics.py). Переменные должны быть заданы до
+импорта приложения — поэтому здесь, в мастере, до fork воркеров.
+"""
+import os
+import shutil
+
+# Под gunicorn — боевой профиль базы (WAL или пул PostgreSQL); по умолчанию в config.py — dev
+os.environ.setdefault("DB_PROFILE", "production")
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               "instance", "prometheus"))
+
+
+def on_starting(server):
+    # Значения прошлого запуска не должны попасть в сумму
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,221 @@
+"""Прокси постеров /img/<mal_id>/<size> с кэшем миниатюр на диске.
+
+Карточки раньше грузили large_image_url прямо с CDN MyAnimeList: полный
+JPEG на каждую из 12-25 карточек и чужие заголовки кэширования. Теперь
+постер скачивается один раз, уменьшается до ширины размера (thumb/card/large)
+и хранится на диске в WebP (если браузер его принимает) или JPEG. Отдаётся
+send_file с Cache-Control: immutable на год — файл на диске gunicorn шлёт
+через sendfile, а за nginx можно отдать его самим nginx (X-Accel-Redirect)
+или Apache/lighttpd (USE_X_SENDFILE).
+
+Pillow есть в requirements.txt, но импорт необязательный (удобно в
+разработке): без него хранится и отдаётся исходный JPEG — один файл на все
+размеры, без уменьшения и WebP, — но кэш и заголовки те же.
+
+Каталог ограничен IMAGE_CACHE_MAX_BYTES: mtime файла — время последнего
+обращения (обновляется не чаще раза в час), при переполнении удаляются
+давно не запрошенные файлы.
+"""
+import io
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from PIL import Image, features  # без него — исходный JPEG на все размеры
+except ImportError:
+    Image = None
+
+# Ширина миниатюр по размерам, px (не больше исходника — не увеличиваем)
+DEFAULT_SIZES = {'thumb': 120, 'card': 240, 'large': 480}
+FORMATS = {
+    'webp': ('webp', 'image/webp'),
+    'jpeg': ('jpg', 'image/jpeg'),
+    'orig': ('jpg', 'image/jpeg'),
+}
+TOUCH_INTERVAL = 3600  # как часто обновлять mtime у часто запрашиваемых файлов, сек
+
+
+def proxy_url(mal_id, size='card'):
+    """Адрес постера через прокси"""
+    return f"/img/{mal_id}/{size}"
+
+
+class ImageUnavailable(Exception):
+    """CDN не отдал картинку или она не читается"""
+
+
+class ImageProxy:
+    def __init__(self, app=None, single_flight=None):
+        self.root = None
+        self.max_bytes = 512 * 1024 * 1024
+        self.sizes = dict(DEFAULT_SIZES)
+        self.quality = 80
+        self.timeout = (3.05, 10)
+        self.max_age = 365 * 86400
+        self.accel_prefix = None
+        self.single_flight = single_flight  # одна загрузка на постер между потоками и воркерами
+        self._written = 0
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config.get('IMAGE_CACHE_DIR') or os.path.join(app.instance_path, 'images')
+        self.max_bytes = app.config.get('IMAGE_CACHE_MAX_BYTES', self.max_bytes)
+        self.sizes.update(app.config.get('IMAGE_SIZES') or {})
+        self.quality = app.config.get('IMAGE_QUALITY', 80)
+        self.timeout = (app.config.get('IMAGE_CONNECT_TIMEOUT', 3.05), app.config.get('IMAGE_READ_TIMEOUT', 10))
+        self.accel_prefix = app.config.get('IMAGE_ACCEL_REDIRECT')
+        os.makedirs(self.root, exist_ok=True)
+        app.extensions['image_proxy'] = self
+
+    @property
+    def session(self):
+        # Свой keep-alive пул к CDN; пересоздаётся после fork воркера
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=10, max_retries=1)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+                    self._pid = os.getpid()
+        return self._session
+
+    @staticmethod
+    def choose_format(accept_webp):
+        if Image is None:
+            return 'orig'
+        if accept_webp and features.check('webp'):
+            return 'webp'
+        return 'jpeg'
+
+    def path(self, mal_id, size, fmt):
+        # Раскладываем по 256 подкаталогам, чтобы не держать десятки тысяч файлов в одном
+        ext = FORMATS[fmt][0]
+        name = f"{mal_id}_orig.{ext}" if fmt == 'orig' else f"{mal_id}_{size}.{ext}"
+        return os.path.join(self.root, f"{mal_id % 256:02x}", name)
+
+    def get(self, mal_id, size, source_url, accept_webp=False):
+        """(путь к файлу, mimetype) или None, если у тайтла нет постера.
+
+        source_url(mal_id) -> исходная ссылка на CDN; ImageUnavailable — CDN не отдал картинку.
+        """
+        fmt = self.choose_format(accept_webp)
+        path = self.path(mal_id, size, fmt)
+        if self._touch(path):
+            return path, FORMATS[fmt][1]
+
+        def render():
+            url = source_url(mal_id)
+            if not url:
+                return None
+            self._store(path, self._render(self._download(url), self.sizes[size], fmt))
+            return path
+
+        if self.single_flight is None:
+            found = render()
+        else:
+            found = self.single_flight.do(f"img:{path}", render,
+                                          lookup=lambda: path if os.path.exists(path) else None)
+        return (found, FORMATS[fmt][1]) if found else None
+
+    def _download(self, url):
+        try:
+            resp = self.session.get(url, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise ImageUnavailable(str(e))
+        if resp.status_code != 200 or not resp.content:
+            raise ImageUnavailable(f"HTTP {resp.status_code}")
+        return resp.content
+
+    def _render(self, original, width, fmt):
+        if fmt == 'orig':
+            return original
+        try:
+            with Image.open(io.BytesIO(original)) as img:
+                # draft: JPEG декодируется сразу в уменьшенном масштабе — в разы быстрее
+                img.draft('RGB', (width, width * 3))
+                img = img.convert('RGB')
+                img.thumbnail((width, width * 3), Image.LANCZOS)
+                out = io.BytesIO()
+                if fmt == 'webp':
+                    img.save(out, 'WEBP', quality=self.quality, method=4)
+                else:
+                    img.save(out, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+                return out.getvalue()
+        except OSError as e:
+            raise ImageUnavailable(str(e))
+
+    def _store(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Пишем во временный файл и переименовываем: параллельный читатель не увидит половину файла
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._written += len(data)
+            sweep = self._written > self.max_bytes // 20
+            if sweep:
+                self._written = 0
+        if sweep:
+            self.sweep()
+
+    @staticmethod
+    def _touch(path):
+        """Есть ли файл; заодно отметить обращение для LRU"""
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return False
+        now = time.time()
+        if now - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        return True
+
+    def sweep(self):
+        """Удалить давно не запрошенные файлы сверх лимита (до 90% от него); вернуть число удалённых"""
+        files = []
+        total = 0
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def accel_path(self, path):
+        """Внутренний адрес для nginx (X-Accel-Redirect) или None"""
+        if not self.accel_prefix:
+            return None
+        return self.accel_prefix.rstrip('/') + '/' + os.path.relpath(path, self.root).replace(os.sep, '/')
@@ -0,0 +1,455 @@
+"""Общий (межпроцессный) кэш ответов Jikan API.
+
+Хранит только декодированный JSON, а не объекты requests.Response,
+поэтому кэш можно разделять между воркерами gunicorn:
+  * sqlite — файл на диске, работает без внешних сервисов (по умолчанию);
+  * redis  — если установлен пакет redis и есть сервер;
+  * memory — словарь в памяти процесса (для отладки).
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import fastjson
+import metrics
+
+# TTL по семействам эндпоинтов (секунды)
+DEFAULT_TTLS = {
+    'search': 300,
+    'top': 1800,
+    'details': 86400,
+    'detail_docs': 7 * 86400,
+    'genres': 86400,
+    'default': 1800,
+}
+
+# Сколько ещё после истечения TTL запись можно отдавать «устаревшей»,
+# пока фоновый воркер её обновляет (stale-while-revalidate)
+DEFAULT_STALE_TTLS = {
+    'search': 0,
+    'top': 86400,
+    'details': 86400,
+    'detail_docs': 30 * 86400,
+    'genres': 7 * 86400,
+    'default': 0,
+}
+
+STATS_FLUSH_INTERVAL = 5  # как часто сбрасывать локальные счётчики в общее хранилище
+
+
+def endpoint_family(url):
+    """Определить семейство эндпоинта Jikan по URL"""
+    path = urlsplit(url).path.rstrip('/')
+    if '/genres/' in path:
+        return 'genres'
+    if '/top/' in path:
+        return 'top'
+    if re.search(r'/anime/\d+', path):
+        return 'details'
+    if path.endswith('/anime'):
+        return 'search'
+    return 'default'
+
+
+def make_key(url, params=None):
+    return f"jikan:{url}:{json.dumps(params, sort_keys=True)}"
+
+
+# --- Бэкенды ---
+
+class SQLiteBackend:
+    """Кэш в SQLite-файле; WAL позволяет читать параллельно из всех воркеров"""
+
+    def __init__(self, path, max_entries=50000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._init_schema()
+
+    def _conn(self):
+        # Соединение на поток и на процесс (после fork соединение нельзя переиспользовать)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jikan_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' family TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' stored_at REAL NOT NULL,'
+            ' fresh_until REAL NOT NULL DEFAULT 0,'
+            ' expires_at REAL NOT NULL)'
+        )
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(jikan_cache)')]
+        if 'fresh_until' not in columns:
+            # Файл кэша от версии без stale-while-revalidate
+            conn.execute('ALTER TABLE jikan_cache ADD COLUMN fresh_until REAL NOT NULL DEFAULT 0')
+            conn.execute('UPDATE jikan_cache SET fresh_until = expires_at')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_jikan_cache_expires ON jikan_cache (expires_at)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jikan_cache_stats ('
+            ' family TEXT NOT NULL,'
+            ' name TEXT NOT NULL,'
+            ' value INTEGER NOT NULL DEFAULT 0,'
+            ' PRIMARY KEY (family, name))'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jikan_leases ('
+            ' key TEXT PRIMARY KEY,'
+            ' owner TEXT NOT NULL,'
+            ' expires_at REAL NOT NULL)'
+        )
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT payload, stored_at, fresh_until, expires_at FROM jikan_cache WHERE key = ?', (key,)
+        ).fetchone()
+        return row
+
+    def set(self, key, family, payload, fresh_until, expires_at):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO jikan_cache (key, family, payload, stored_at, fresh_until, expires_at)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            (key, family, payload, time.time(), fresh_until, expires_at)
+        )
+
+    def delete(self, key):
+        return self._conn().execute('DELETE FROM jikan_cache WHERE key = ?', (key,)).rowcount
+
+    def purge(self, now):
+        """Удалить просроченные записи и лишнее сверх лимита; вернуть {family: count}"""
+        conn = self._conn()
+        removed = Counter()
+        rows = conn.execute(
+            'SELECT family, COUNT(*) FROM jikan_cache WHERE expires_at <= ? GROUP BY family', (now,)
+        ).fetchall()
+        if rows:
+            conn.execute('DELETE FROM jikan_cache WHERE expires_at <= ?', (now,))
+            removed.update(dict(rows))
+
+        total = conn.execute('SELECT COUNT(*) FROM jikan_cache').fetchone()[0]
+        overflow = total - self.max_entries
+        if overflow > 0:
+            # Вытесняем записи, которые истекут раньше всех
+            victims = conn.execute(
+                'SELECT key, family FROM jikan_cache ORDER BY expires_at LIMIT ?', (overflow,)
+            ).fetchall()
+            conn.executemany('DELETE FROM jikan_cache WHERE key = ?', [(k,) for k, _ in victims])
+            removed.update(family for _, family in victims)
+        return removed
+
+    def clear(self):
+        self._conn().execute('DELETE FROM jikan_cache')
+
+    def add_lease(self, key, owner, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('DELETE FROM jikan_leases WHERE key = ? AND expires_at <= ?', (key, now))
+        return conn.execute(
+            'INSERT OR IGNORE INTO jikan_leases (key, owner, expires_at) VALUES (?, ?, ?)',
+            (key, owner, now + ttl)
+        ).rowcount == 1
+
+    def has_lease(self, key):
+        row = self._conn().execute(
+            'SELECT 1 FROM jikan_leases WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def release_lease(self, key, owner):
+        self._conn().execute('DELETE FROM jikan_leases WHERE key = ? AND owner = ?', (key, owner))
+
+    def incr_stats(self, deltas):
+        conn = self._conn()
+        conn.executemany(
+            'INSERT INTO jikan_cache_stats (family, name, value) VALUES (?, ?, ?)'
+            ' ON CONFLICT (family, name) DO UPDATE SET value = value + excluded.value',
+            [(family, name, value) for (family, name), value in deltas.items()]
+        )
+
+    def read_stats(self):
+        rows = self._conn().execute('SELECT family, name, value FROM jikan_cache_stats').fetchall()
+        return {(family, name): value for family, name, value in rows}
+
+    def size(self):
+        return self._conn().execute('SELECT COUNT(*) FROM jikan_cache').fetchone()[0]
+
+
+class RedisBackend:
+    """Кэш в Redis; просрочку записей выполняет сам Redis"""
+
+    def __init__(self, url, prefix='anime_app:'):
+        import redis  # опциональная зависимость
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _k(self, key):
+        return self.prefix + key
+
+    def get(self, key):
+        raw = self.client.get(self._k(key))
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry['payload'], entry['stored_at'], entry['fresh_until'], entry['expires_at']
+
+    def set(self, key, family, payload, fresh_until, expires_at):
+        now = time.time()
+        entry = json.dumps({
+            'payload': payload,
+            'stored_at': now,
+            'fresh_until': fresh_until,
+            'expires_at': expires_at,
+        })
+        self.client.set(self._k(key), entry, ex=max(1, int(expires_at - now)))
+
+    def delete(self, key):
+        return self.client.delete(self._k(key))
+
+    def purge(self, now):
+        # Redis удаляет просроченные ключи сам, явных вытеснений нет
+        return Counter()
+
+    def clear(self):
+        for key in self.client.scan_iter(self._k('jikan:*')):
+            self.client.delete(key)
+
+    def add_lease(self, key, owner, ttl):
+        return bool(self.client.set(self._k('lease:' + key), owner, nx=True, ex=max(1, int(ttl))))
+
+    def has_lease(self, key):
+        return self.client.exists(self._k('lease:' + key)) == 1
+
+    def release_lease(self, key, owner):
+        lease = self._k('lease:' + key)
+        if self.client.get(lease) == owner.encode():
+            self.client.delete(lease)
+
+    def incr_stats(self, deltas):
+        pipe = self.client.pipeline()
+        for (family, name), value in deltas.items():
+            pipe.hincrby(self._k('jikan_stats'), f'{family}:{name}', value)
+        pipe.execute()
+
+    def read_stats(self):
+        raw = self.client.hgetall(self._k('jikan_stats'))
+        stats = {}
+        for field, value in raw.items():
+            family, name = field.decode().split(':', 1)
+            stats[(family, name)] = int(value)
+        return stats
+
+    def size(self):
+        return sum(1 for _ in self.client.scan_iter(self._k('jikan:*')))
+
+
+class MemoryBackend:
+    """Словарь в памяти процесса (только для отладки и одного воркера)"""
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._data = {}
+        self._stats = Counter()
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        return entry[1:] if entry else None
+
+    def set(self, key, family, payload, fresh_until, expires_at):
+        with self._lock:
+            self._data[key] = (family, payload, time.time(), fresh_until, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            return 1 if self._data.pop(key, None) else 0
+
+    def purge(self, now):
+        removed = Counter()
+        with self._lock:
+            for key, (family, _, _, _, expires_at) in list(self._data.items()):
+                if expires_at <= now:
+                    del self._data[key]
+                    removed[family] += 1
+            overflow = len(self._data) - self.max_entries
+            if overflow > 0:
+                victims = sorted(self._data.items(), key=lambda kv: kv[1][4])[:overflow]
+                for key, (family, *_) in victims:
+                    del self._data[key]
+                    removed[family] += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def add_lease(self, key, owner, ttl):
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease and lease[1] > time.time():
+                return False
+            self._leases[key] = (owner, time.time() + ttl)
+            return True
+
+    def has_lease(self, key):
+        lease = self._leases.get(key)
+        return bool(lease and lease[1] > time.time())
+
+    def release_lease(self, key, owner):
+        with self._lock:
+            if self._leases.get(key, (None,))[0] == owner:
+                del self._leases[key]
+
+    def incr_stats(self, deltas):
+        with self._lock:
+            self._stats.update(deltas)
+
+    def read_stats(self):
+        return dict(self._stats)
+
+    def size(self):
+        return len(self._data)
+
+
+# --- Кэш ---
+
+class JikanCache:
+    """Кэш декодированных ответов Jikan с TTL по семействам эндпоинтов"""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttls = dict(DEFAULT_TTLS)
+        self.stale_ttls = dict(DEFAULT_STALE_TTLS)
+        self.grace = 0
+        self._counters = Counter()
+        self._counters_lock = threading.Lock()
+        self._last_flush = time.time()
+        self._last_purge = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('JIKAN_CACHE_BACKEND', 'sqlite')
+        max_entries = app.config.get('JIKAN_CACHE_MAX_ENTRIES', 50000)
+        self.ttls.update(app.config.get('JIKAN_CACHE_TTLS') or {})
+        self.stale_ttls.update(app.config.get('JIKAN_CACHE_STALE_TTLS') or {})
+        self.grace = app.config.get('JIKAN_CACHE_GRACE_TTL', 0)
+
+        if kind == 'redis':
+            self.backend = RedisBackend(app.config['JIKAN_CACHE_REDIS_URL'])
+        elif kind == 'memory':
+            self.backend = MemoryBackend(max_entries)
+        else:
+            path = app.config.get('JIKAN_CACHE_PATH') or os.path.join(app.instance_path, 'jikan_cache.db')
+            self.backend = SQLiteBackend(path, max_entries)
+
+        app.extensions['jikan_cache'] = self
+
+    def ttl_for(self, family):
+        return self.ttls.get(family, self.ttls['default'])
+
+    def stale_ttl_for(self, family):
+        return self.stale_ttls.get(family, self.stale_ttls['default'])
+
+    def get(self, key, family='default', last_known=False):
+        """Вернуть (JSON, свежий ли) или None; устаревшие записи отдаются с fresh=False.
+
+        Записи живут ещё grace секунд после stale-окна: обычному чтению они уже
+        не видны, а с last_known=True (upstream недоступен) отдаются как устаревшие.
+        """
+        now = time.time()
+        entry = self.backend.get(key)
+        if entry is None:
+            self.count(family, 'misses')
+            return None
+
+        payload, _, fresh_until, expires_at = entry
+        if expires_at <= now:
+            self.backend.delete(key)
+            self.count(family, 'misses')
+            self.count(family, 'evictions')
+            return None
+
+        if fresh_until > now:
+            self.count(family, 'hits')
+            return fastjson.loads(payload), True
+
+        if not last_known and fresh_until + self.stale_ttl_for(family) <= now:
+            self.count(family, 'misses')
+            return None
+
+        self.count(family, 'stale_hits')
+        return fastjson.loads(payload), False
+
+    def peek(self, key):
+        """Свежий JSON без счётчиков и без удаления (для ожидающих single-flight)"""
+        entry = self.backend.get(key)
+        if entry is None or entry[2] <= time.time():
+            return None
+        return fastjson.loads(entry[0])
+
+    def fresh_for(self, key):
+        """Сколько секунд запись ещё свежая (None — записи нет)"""
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        return entry[2] - time.time()
+
+    def set(self, key, data, family='default', timeout=None):
+        ttl = timeout if timeout is not None else self.ttl_for(family)
+        now = time.time()
+        fresh_until = now + ttl
+        expires_at = fresh_until + self.stale_ttl_for(family) + self.grace
+        self.backend.set(key, family, fastjson.dumps(data), fresh_until, expires_at)
+        self.count(family, 'sets')
+
+        # Периодически чистим просроченное, чтобы файл не рос бесконечно
+        if now - self._last_purge > 60:
+            self._last_purge = now
+            for fam, removed in self.backend.purge(now).items():
+                self.count(fam, 'evictions', removed)
+
+    def clear(self):
+        self.backend.clear()
+
+    def count(self, family, name, value=1):
+        metrics.CACHE_EVENTS.labels(family, name).inc(value)
+        with self._counters_lock:
+            self._counters[(family, name)] += value
+        if time.time() - self._last_flush > STATS_FLUSH_INTERVAL:
+            self.flush_stats()
+
+    def flush_stats(self):
+        with self._counters_lock:
+            deltas, self._counters = self._counters, Counter()
+            self._last_flush = time.time()
+        if deltas:
+            self.backend.incr_stats(deltas)
+
+    def stats(self):
+        """Суммарные счётчики всех воркеров по семействам"""
+        self.flush_stats()
+        result = {}
+        for (family, name), value in self.backend.read_stats().items():
+            result.setdefault(family, {'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0, 'sets': 0})[name] = value
+        for counters in result.values():
+            served = counters['hits'] + counters['stale_hits']
+            lookups = served + counters['misses']
+            counters['hit_rate'] = round(served / lookups, 4) if lookups else 0.0
+        return {'entries': self.backend.size(), 'families': result}
@@ -0,0 +1,103 @@
+"""HTTP-клиент к Jikan с пулом постоянных соединений.
+
+requests.get() без Session на каждый вызов заново делает DNS, TCP и TLS.
+JikanClient держит один Session на процесс (пересоздаётся после fork
+воркера) с пулом keep-alive соединений заданного размера.
+
+Клиент — только транспорт: лимитер, circuit breaker и повторы — в
+rate_limited_get (app.py), поэтому запросы к Jikan из приложения идут
+через него, а не напрямую сюда.
+AsyncJikanClient — вариант для async-view Flask или ASGI: выполняет тот же
+синхронный путь (обычно rate_limited_get) в потоке через asyncio.to_thread,
+поэтому делит с ним лимитер, breaker и метрики.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from jikan_cache import endpoint_family
+
+
+class JikanClient:
+    def __init__(self, app=None):
+        self.pool_size = 10
+        self.timeout = (3.05, 10)
+        self._session = None
+        self._pid = None
+        self._executor = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.pool_size = app.config.get('JIKAN_POOL_SIZE', 10)
+        self.timeout = (app.config.get('JIKAN_CONNECT_TIMEOUT', 3.05), app.config.get('JIKAN_READ_TIMEOUT', 10))
+        app.extensions['jikan_client'] = self
+
+    @property
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    session = requests.Session()
+                    # Повторы делает rate_limited_get с учётом лимитера, здесь — без них
+                    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers['Accept'] = 'application/json'
+                    self._session = session
+                    self._executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix='jikan-http')
+                    self._pid = os.getpid()
+        return self._session
+
+    def get(self, url, params=None, timeout=None):
+        family = endpoint_family(url)
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(url, params=params, timeout=timeout or self.timeout)
+        except requests.exceptions.RequestException:
+            metrics.JIKAN_REQUESTS.labels(family, 'error').inc()
+            raise
+        finally:
+            metrics.JIKAN_LATENCY.labels(family).observe(time.perf_counter() - start)
+        metrics.JIKAN_REQUESTS.labels(family, resp.status_code).inc()
+        return resp
+
+    def map(self, fn, items):
+        """Выполнить fn над items параллельно в пуле клиента (результаты в исходном порядке)"""
+        self.session  # создаёт пул потоков для текущего процесса
+        return list(self._executor.map(fn, items))
+
+    def fetch_many(self, requests_list):
+        """Параллельные GET: [(url, params), ...] -> [Response | исключение, ...]"""
+        def fetch(request):
+            url, params = request
+            try:
+                return self.get(url, params)
+            except requests.exceptions.RequestException as e:
+                return e
+        return self.map(fetch, requests_list)
+
+
+
+class AsyncJikanClient:
+    """Асинхронный вариант для async-view или ASGI-развёртывания"""
+
+    def __init__(self, get):
+        self._get = get  # callable(url, params=None, **kwargs) -> Response | None
+
+    async def get(self, url, params=None, **kwargs):
+        return await asyncio.to_thread(self._get, url, params, **kwargs)
+
+    async def fetch_many(self, requests_list):
+        """Параллельные GET; исключения возвращаются на месте ответа"""
+        return await asyncio.gather(
+            *(self.get(url, params) for url, params in requests_list),
+            return_exceptions=True
+        )
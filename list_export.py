@@ -0,0 +1,154 @@
+"""Экспорт списков пользователей в JSON Lines, CSV и XML-формат MyAnimeList.
+
+Строки читаются серверным курсором (yield_per) только нужными колонками и
+сразу форматируются в текстовые куски примерно по CHUNK_SIZE символов —
+память не зависит от длины списка. Те же генераторы отдают потоковый
+ответ /api/list/export и пишут файл в `flask lists export`.
+"""
+import csv
+import io
+import json
+import zlib
+from xml.sax.saxutils import escape
+
+from sqlalchemy import func, select
+
+from models import db, Anime, User, UserAnime
+
+FORMATS = {
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'csv': ('text/csv', 'csv'),
+    'malxml': ('application/xml', 'xml'),
+}
+CHUNK_SIZE = 64 * 1024
+YIELD_PER = 500
+
+COLUMNS = ('mal_id', 'title', 'type', 'episodes', 'year', 'image', 'status', 'score',
+           'comment', 'is_private', 'created_at', 'updated_at')
+
+# Статусы списка -> my_status выгрузки MAL (её понимает и наш импорт)
+MAL_STATUSES = {
+    'planned': 'Plan to Watch',
+    'watching': 'Watching',
+    'completed': 'Completed',
+    'dropped': 'Dropped',
+}
+
+
+# Поля тайтла — из каталога, поля записи — из списка
+ANIME_FIELDS = {
+    'title': func.coalesce(Anime.title_english, Anime.title),
+    'type': Anime.type,
+    'episodes': Anime.episodes,
+    'year': Anime.year,
+    'image': Anime.image,
+}
+
+
+def export_rows(user_id=None):
+    """Записи списка (одного пользователя или всех) потоком, без загрузки в память"""
+    columns = [UserAnime.user_id, User.username] + [
+        ANIME_FIELDS[name].label(name) if name in ANIME_FIELDS else getattr(UserAnime, name)
+        for name in COLUMNS
+    ]
+    stmt = (select(*columns)
+            .join(User, User.id == UserAnime.user_id)
+            .join(Anime, Anime.mal_id == UserAnime.mal_id)
+            .order_by(UserAnime.user_id, UserAnime.id))
+    if user_id is not None:
+        stmt = stmt.where(UserAnime.user_id == user_id)
+    # yield_per включает stream_results: строки идут с серверного курсора пачками
+    for row in db.session.execute(stmt.execution_options(yield_per=YIELD_PER)):
+        yield row._mapping
+
+
+def _value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _chunked(pieces):
+    """Склеить мелкие строки в куски ~CHUNK_SIZE — меньше chunk'ов в ответе и системных вызовов"""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def jsonl_chunks(rows, with_user=False):
+    names = (('user_id', 'username') if with_user else ()) + COLUMNS
+    return _chunked(
+        json.dumps({name: _value(row[name]) for name in names}, ensure_ascii=False) + '\n'
+        for row in rows
+    )
+
+
+def csv_chunks(rows, with_user=False):
+    names = (('user_id', 'username') if with_user else ()) + COLUMNS
+
+    def lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        for row in rows:
+            writer.writerow([_value(row[name]) for name in names])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    return _chunked(lines())
+
+
+def malxml_chunks(rows, username=''):
+    """Выгрузка в формате MAL (<myanimelist><anime>...) — её принимает импорт MAL и наш"""
+    def text(value):
+        return escape(str(value)) if value is not None else ''
+
+    def lines():
+        yield '<?xml version="1.0" encoding="UTF-8" ?>\n<myanimelist>\n'
+        yield f'  <myinfo>\n    <user_name>{text(username)}</user_name>\n    <user_export_type>1</user_export_type>\n  </myinfo>\n'
+        for row in rows:
+            yield (
+                '  <anime>\n'
+                f'    <series_animedb_id>{row["mal_id"]}</series_animedb_id>\n'
+                f'    <series_title>{text(row["title"])}</series_title>\n'
+                f'    <series_type>{text(row["type"])}</series_type>\n'
+                f'    <series_episodes>{row["episodes"] or 0}</series_episodes>\n'
+                f'    <my_score>{row["score"] or 0}</my_score>\n'
+                f'    <my_status>{MAL_STATUSES.get(row["status"], "Plan to Watch")}</my_status>\n'
+                f'    <my_comments>{text(row["comment"])}</my_comments>\n'
+                '  </anime>\n'
+            )
+        yield '</myanimelist>\n'
+
+    return _chunked(lines())
+
+
+def export_chunks(fmt, rows, username='', with_user=False):
+    if fmt == 'jsonl':
+        return jsonl_chunks(rows, with_user)
+    if fmt == 'csv':
+        return csv_chunks(rows, with_user)
+    if fmt == 'malxml':
+        return malxml_chunks(rows, username)
+    raise ValueError(fmt)
+
+
+def encode(chunks, compress=False):
+    """Куски текста -> байты UTF-8, при compress — gzip-поток, сжимаемый по ходу"""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: формат gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,292 @@
+"""Импорт списка с MyAnimeList: XML-выгрузка MAL или JSON.
+
+Файл читается потоком (iterparse для XML, raw_decode по кускам для JSON),
+поэтому выгрузка на тысячи тайтлов не держится в памяти целиком. Записи
+идут пачками: тайтлы, которых нет в локальном каталоге, подтягиваются через
+кэшированный слой Jikan небольшими порциями в пределах лимитера (метаданные
+из файла не сохраняются — карточки берут их из каталога). Каждая пачка —
+один upsert по unique_user_anime и один commit. Прогресс задания лежит в общем кэше, так
+что его видно из любого воркера.
+"""
+import gzip
+import io
+import json
+import os
+import re
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, UserAnime
+import catalog
+
+# Статусы MAL (строки XML-выгрузки, API v2 и числовые коды load.json) -> статусы списка
+STATUS_MAP = {
+    'watching': 'watching',
+    'completed': 'completed',
+    'on-hold': 'watching',
+    'on_hold': 'watching',
+    'dropped': 'dropped',
+    'plan to watch': 'planned',
+    'plan_to_watch': 'planned',
+    'planned': 'planned',
+    '1': 'watching',
+    '2': 'completed',
+    '3': 'watching',
+    '4': 'dropped',
+    '6': 'planned',
+}
+JSON_CHUNK = 64 * 1024
+WRAPPED_ARRAY = re.compile(r'\s*\{\s*"(?:data|anime)"\s*:\s*\[')
+
+
+class ImportFileError(Exception):
+    """Файл не похож ни на XML-выгрузку MAL, ни на JSON-список"""
+
+
+def open_upload(path):
+    """Бинарный поток файла; .gz распаковывается на лету (MAL отдаёт выгрузку сжатой)"""
+    raw = open(path, 'rb')
+    if raw.read(2) == b'\x1f\x8b':
+        raw.seek(0)
+        return raw, gzip.GzipFile(fileobj=raw)
+    raw.seek(0)
+    return raw, raw
+
+
+def detect_format(stream):
+    """'xml' или 'json' по первому значимому символу"""
+    head = stream.peek(512)[:512].lstrip(b'\xef\xbb\xbf \t\r\n')
+    if head.startswith(b'<'):
+        return 'xml'
+    if head[:1] in (b'[', b'{'):
+        return 'json'
+    raise ImportFileError('Неизвестный формат файла')
+
+
+def iter_xml_records(stream):
+    """Записи <anime> из XML-выгрузки MAL; разобранные элементы сразу освобождаются"""
+    context = ET.iterparse(stream, events=('start', 'end'))
+    root = None
+    for event, elem in context:
+        if root is None and event == 'start':
+            root = elem
+        if event != 'end' or elem.tag != 'anime':
+            continue
+        yield {child.tag: (child.text or '').strip() for child in elem}
+        elem.clear()
+        root.clear()  # иначе корень копит ссылки на все пройденные <anime>
+
+
+def iter_json_records(stream):
+    """Объекты из JSON-массива, JSON Lines или {"data": [...]} — без чтения файла целиком"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    try:
+        yield from _decode_objects(text)
+    finally:
+        text.detach()  # иначе сборка обёртки закроет и сам файл
+
+
+def _decode_objects(text):
+    decoder = json.JSONDecoder()
+    buffer, eof = text.read(JSON_CHUNK), False
+    # Обёртку {"data": [ ... ]} (API MAL и Jikan) пропускаем, чтобы идти по массиву потоком
+    wrapper = WRAPPED_ARRAY.match(buffer)
+    pos = wrapper.end() if wrapper else 0
+    # Разделители верхнего уровня; хвост обёртки ("paging": {...}) даст не-записи, их отсеет normalize_record
+    separators = ' \t\r\n,[]:}' if wrapper else ' \t\r\n,[]'
+    while True:
+        while pos < len(buffer) and buffer[pos] in separators:
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                return
+            buffer, pos = text.read(JSON_CHUNK), 0
+            eof = not buffer
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise ImportFileError('Повреждённый JSON')
+            chunk = text.read(JSON_CHUNK)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        pos = end
+        if isinstance(value, dict) and isinstance(value.get('data') or value.get('anime'), list):
+            yield from value.get('data') or value.get('anime')
+        elif isinstance(value, dict):
+            yield value
+
+
+def normalize_record(raw):
+    """Запись выгрузки -> поля UserAnime (None, если нет mal_id)"""
+    if not isinstance(raw, dict):
+        return None
+    node = raw.get('node') or raw.get('anime') or {}
+    list_status = raw.get('list_status') or {}
+
+    def pick(*values):
+        return next((v for v in values if v not in (None, '')), None)
+
+    def number(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    mal_id = number(pick(raw.get('series_animedb_id'), raw.get('mal_id'), raw.get('anime_id'),
+                         node.get('mal_id'), node.get('id')))
+    if not mal_id:
+        return None
+
+    status = str(pick(raw.get('my_status'), list_status.get('status'), raw.get('status'),
+                      raw.get('watching_status')) or '').lower()
+    score = number(pick(raw.get('my_score'), list_status.get('score'), raw.get('score')))
+    return {
+        'mal_id': mal_id,
+        'status': STATUS_MAP.get(status, 'planned'),
+        'score': score if score and 1 <= score <= 10 else None,
+        'comment': pick(raw.get('my_comments'), list_status.get('comments'), raw.get('comment')),
+    }
+
+
+def upsert_records(user_id, records):
+    """Вставить или обновить записи списка одним запросом; вернуть mal_id новых"""
+    rows = {}
+    now = datetime.utcnow()
+    for r in records:
+        rows[r['mal_id']] = {
+            'user_id': user_id, 'mal_id': r['mal_id'], 'status': r['status'], 'score': r['score'],
+            'comment': r['comment'], 'is_private': False, 'created_at': now, 'updated_at': now,
+        }
+    existing = {mal_id for mal_id, in db.session.query(UserAnime.mal_id).filter(
+        UserAnime.user_id == user_id, UserAnime.mal_id.in_(rows))}
+
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        table = UserAnime.__table__
+        stmt = insert(UserAnime).values(list(rows.values()))
+        # Статус и оценка — из MAL; оценку и комментарий не затираем пустыми
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserAnime.user_id, UserAnime.mal_id],
+            set_={
+                'status': stmt.excluded.status,
+                'score': func.coalesce(stmt.excluded.score, table.c.score),
+                'comment': func.coalesce(stmt.excluded.comment, table.c.comment),
+                'updated_at': stmt.excluded.updated_at,
+            }
+        )
+        db.session.execute(stmt)
+    else:
+        for row in rows.values():
+            anime = UserAnime.query.filter_by(user_id=user_id, mal_id=row['mal_id']).first()
+            if anime is None:
+                db.session.add(UserAnime(**row))
+            else:
+                anime.status = row['status']
+                anime.score = row['score'] or anime.score
+                anime.comment = row['comment'] or anime.comment
+    return [mal_id for mal_id in rows if mal_id not in existing]
+
+
+def run_import(user_id, path, fetch_items, batch_size=200, progress=None, committed=None):
+    """Импортировать файл; после commit каждой пачки вызываются committed(новые mal_id) и progress(dict).
+
+    Пачки коммитятся по одной: если файл оборвётся на середине, записи из
+    прошлых пачек уже в списке — committed позволяет сразу обновить версию списка.
+    """
+    state = {'processed': 0, 'imported': 0, 'added': 0, 'unknown': 0, 'skipped': 0,
+             'bytes_read': 0, 'bytes_total': os.path.getsize(path)}
+    added = []
+    raw, stream = open_upload(path)
+    try:
+        fmt = detect_format(stream)
+        records = iter_xml_records(stream) if fmt == 'xml' else iter_json_records(stream)
+
+        def flush(batch):
+            # Записи только на тайтлы из каталога; чего нет ни там, ни в Jikan — пропускаем
+            known = catalog.ensure_items([r['mal_id'] for r in batch], fetch_items)
+            state['unknown'] += sum(1 for r in batch if r['mal_id'] not in known)
+            batch = [r for r in batch if r['mal_id'] in known]
+            new = upsert_records(user_id, batch) if batch else []
+            db.session.commit()
+            added.extend(new)
+            if committed:
+                committed(new)
+            state['imported'] += len(batch)
+            state['added'] += len(new)
+            state['bytes_read'] = raw.tell()
+            if progress:
+                progress(dict(state))
+
+        batch = []
+        for raw_record in records:
+            state['processed'] += 1
+            record = normalize_record(raw_record)
+            if record is None:
+                state['skipped'] += 1
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    except ET.ParseError as e:
+        raise ImportFileError(f'Повреждённый XML: {e}')
+    finally:
+        raw.close()
+
+    state['bytes_read'] = state['bytes_total']
+    return state, added
+
+
+class ImportJobs:
+    """Фоновые задания импорта; состояние — в общем кэше, чтобы опрашивать из любого воркера"""
+
+    def __init__(self, cache, runner, timeout=86400):
+        self.cache = cache      # JikanCache
+        self.runner = runner    # BackgroundRefresher: пул потоков воркера
+        self.timeout = timeout
+
+    def get(self, job_id):
+        return self.cache.peek(f"import:{job_id}")
+
+    def active_for(self, user_id):
+        job_id = self.cache.peek(f"import_user:{user_id}")
+        job = self.get(job_id) if job_id else None
+        return job if job and job['state'] in ('queued', 'running') else None
+
+    def update(self, job_id, **fields):
+        job = self.get(job_id) or {}
+        job.update(fields)
+        self.cache.set(f"import:{job_id}", job, 'imports', timeout=self.timeout)
+        return job
+
+    def start(self, user_id, path, work):
+        """work(job_id, progress) выполняется в фоне; возвращает id задания"""
+        job_id = uuid.uuid4().hex
+        self.update(job_id, id=job_id, user_id=user_id, state='queued', created_at=time.time())
+        self.cache.set(f"import_user:{user_id}", job_id, 'imports', timeout=self.timeout)
+
+        def run():
+            self.update(job_id, state='running', started_at=time.time())
+            try:
+                result = work(job_id, lambda state: self.update(job_id, **state))
+                self.update(job_id, state='done', finished_at=time.time(), **result)
+            except Exception as e:
+                self.update(job_id, state='failed', finished_at=time.time(), error=str(e))
+                raise
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        self.runner.submit(job_id, run)
+        return job_id
@@ -0,0 +1,209 @@
+"""Метрики в формате Prometheus: /metrics.
+
+Что считается:
+  * HTTP — запросы по маршруту, методу и статусу, гистограмма длительности;
+  * Jikan — длительность и коды ответов upstream по семействам эндпоинтов,
+    ожидание слота лимитера и отказы, состояние и переходы circuit breaker;
+  * общий кэш — hit/stale_hit/miss/eviction/set по семействам ключей;
+  * база — число SQL-запросов и время в них на один HTTP-запрос;
+  * bcrypt — время хэширования и проверки пароля, отказы пула.
+
+Метрики — объекты уровня модуля: модули, где происходит событие
+(jikan_client, rate_limiter, jikan_cache, passwords, circuit_breaker),
+импортируют их и вызывают inc/observe — это микросекунды на событие.
+
+Под gunicorn каждый воркер — отдельный процесс. Если задана переменная
+PROMETHEUS_MULTIPROC_DIR (см. gunicorn.conf.py), prometheus_client пишет
+значения в mmap-файлы этого каталога, а /metrics в любом воркере собирает
+сумму по всем (MultiProcessCollector).
+
+prometheus_client есть в requirements.txt, но импорт необязательный: без него
+(или с METRICS_ENABLED=0) метрики — пустые заглушки, а маршрута /metrics нет.
+
+/metrics и JSON-счётчики (/api/cache_stats, /api/upstream_status) — внутренняя
+телеметрия: internal_only пускает только с токеном INTERNAL_TOKEN
+(Authorization: Bearer) или с адресов из INTERNAL_ALLOWED_IPS, остальным — 403.
+"""
+import functools
+import hmac
+import ipaddress
+import os
+import time
+
+from flask import Response, current_app, g, has_request_context, request
+from werkzeug.exceptions import Forbidden
+from sqlalchemy import event
+
+try:
+    import prometheus_client  # без него метрики отключены
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+    from prometheus_client.core import GaugeMetricFamily
+    from prometheus_client.multiprocess import MultiProcessCollector
+except ImportError:
+    prometheus_client = None
+
+# Короткие запросы: от миллисекунды (кэш) до таймаута Jikan
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BCRYPT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class _Noop:
+    """Заглушка метрики без prometheus_client"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, amount):
+        pass
+
+
+def _counter(name, documentation, labels=()):
+    if prometheus_client is None:
+        return _Noop()
+    return Counter(name, documentation, labels)
+
+
+def _histogram(name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+    if prometheus_client is None:
+        return _Noop()
+    return Histogram(name, documentation, labels, buckets=buckets)
+
+
+HTTP_REQUESTS = _counter('http_requests_total', 'HTTP-запросы', ('method', 'route', 'status'))
+HTTP_LATENCY = _histogram('http_request_duration_seconds', 'Длительность HTTP-запроса', ('method', 'route'))
+
+JIKAN_REQUESTS = _counter('jikan_requests_total', 'Запросы к Jikan по коду ответа (error — нет ответа)',
+                          ('family', 'status'))
+JIKAN_LATENCY = _histogram('jikan_request_duration_seconds', 'Длительность запроса к Jikan', ('family',))
+RATE_LIMIT_WAIT = _histogram('rate_limiter_wait_seconds', 'Ожидание слота лимитера', ('name',))
+RATE_LIMIT_REJECTED = _counter('rate_limiter_rejected_total', 'Отказы лимитера: ждать дольше max_wait', ('name',))
+CIRCUIT_TRANSITIONS = _counter('circuit_breaker_transitions_total', 'Переходы circuit breaker', ('name', 'state'))
+CIRCUIT_REJECTED = _counter('circuit_breaker_rejected_total', 'Запросы, не пущенные разомкнутым breaker', ('name',))
+
+CACHE_EVENTS = _counter('cache_events_total', 'События общего кэша (hits, stale_hits, misses, evictions, sets)',
+                        ('family', 'event'))
+
+DB_QUERIES = _histogram('db_queries_per_request', 'SQL-запросов на HTTP-запрос', ('route',),
+                        buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = _histogram('db_query_seconds_per_request', 'Время в SQL за HTTP-запрос', ('route',))
+
+PASSWORD_HASH_TIME = _histogram('password_hash_duration_seconds', 'bcrypt: время с учётом очереди пула',
+                                ('op',), buckets=BCRYPT_BUCKETS)
+PASSWORD_HASH_REJECTED = _counter('password_hash_rejected_total', 'bcrypt: отказы пула', ('reason',))
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def internal_allowed():
+    """Можно ли текущему запросу читать внутреннюю телеметрию"""
+    token = current_app.config.get('INTERNAL_TOKEN')
+    auth = request.authorization
+    if token and auth is not None and auth.type == 'bearer' and auth.token:
+        if hmac.compare_digest(auth.token.encode(), token.encode()):
+            return True
+
+    try:
+        addr = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return any(addr in ipaddress.ip_network(net, strict=False)
+               for net in current_app.config.get('INTERNAL_ALLOWED_IPS') or ())
+
+
+def internal_only(view):
+    """Декоратор для эндпоинтов телеметрии: без токена или разрешённого адреса — 403"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not internal_allowed():
+            raise Forbidden()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.gauges = []  # (имя, описание, метки, callable -> {значения меток: число}) — считаются при сборе
+        self.enabled = False
+        self._callbacks = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+        if prometheus_client is None or not app.config.get('METRICS_ENABLED', True):
+            return
+        self.enabled = True
+        self._callbacks = _CallbackCollector(self.gauges)
+        if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+            prometheus_client.REGISTRY.register(self._callbacks)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', internal_only(self.view))
+
+    def gauge(self, name, documentation, labels, collect):
+        """Метрика, которая считается в момент сбора (например, общее для воркеров состояние)"""
+        self.gauges.append((name, documentation, labels, collect))
+
+    def instrument_engine(self, engine):
+        """Считать SQL-запросы и время в них для текущего HTTP-запроса"""
+        if not self.enabled:
+            return
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info['metrics_start'].pop()
+            if has_request_context():
+                g.metrics_db_queries = g.get('metrics_db_queries', 0) + 1
+                g.metrics_db_time = g.get('metrics_db_time', 0.0) + elapsed
+
+    @staticmethod
+    def _before_request():
+        g.metrics_start = time.perf_counter()
+
+    @staticmethod
+    def _after_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        route = _route()
+        HTTP_LATENCY.labels(request.method, route).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(request.method, route, response.status_code).inc()
+        DB_QUERIES.labels(route).observe(g.pop('metrics_db_queries', 0))
+        DB_TIME.labels(route).observe(g.pop('metrics_db_time', 0.0))
+        return response
+
+    def registry(self):
+        if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+            return prometheus_client.REGISTRY
+        # Сумма по всем воркерам из mmap-файлов
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        registry.register(self._callbacks)
+        return registry
+
+    def view(self):
+        response = Response(generate_latest(self.registry()), mimetype=CONTENT_TYPE_LATEST)
+        response.cache_control.no_store = True
+        return response
+
+
+class _CallbackCollector:
+    def __init__(self, gauges):
+        self.gauges = gauges
+
+    def collect(self):
+        for name, documentation, labels, collect in self.gauges:
+            family = GaugeMetricFamily(name, documentation, labels=labels)
+            for values, value in collect().items():
+                family.add_metric(list(values), value)
+            yield family
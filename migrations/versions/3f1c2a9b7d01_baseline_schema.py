@@ -0,0 +1,128 @@
+"""baseline schema
+
+Схема на момент перехода на миграции. Таблицы создаются, только если их
+ещё нет: базы, созданные раньше через db.create_all(), проходят
+`flask db upgrade` без `stamp`.
+
+Revision ID: 3f1c2a9b7d01
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing = set(sa.inspect(bind).get_table_names())
+
+    if 'user' not in existing:
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=30), nullable=False),
+            sa.Column('password', sa.String(length=128), nullable=False),
+            sa.Column('tag', sa.String(length=50), nullable=True),
+            sa.Column('vip', sa.Boolean(), nullable=True),
+            sa.Column('vip_date', sa.DateTime(), nullable=True),
+            sa.Column('private_account', sa.Boolean(), nullable=True),
+            sa.Column('nsfw_allowed', sa.Boolean(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('username'),
+        )
+
+    if 'user_anime' not in existing:
+        op.create_table(
+            'user_anime',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('mal_id', sa.Integer(), nullable=True),
+            sa.Column('title', sa.String(length=255), nullable=True),
+            sa.Column('image', sa.String(length=500), nullable=True),
+            sa.Column('type', sa.String(length=20), nullable=True),
+            sa.Column('episodes', sa.Integer(), nullable=True),
+            sa.Column('year', sa.Integer(), nullable=True),
+            sa.Column('synopsis', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('score', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('is_private', sa.Boolean(), nullable=True),
+            sa.Column('comment', sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('user_id', 'mal_id', name='unique_user_anime'),
+        )
+        op.create_index('ix_user_anime_user_id', 'user_anime', ['user_id'])
+        op.create_index('ix_user_anime_mal_id', 'user_anime', ['mal_id'])
+
+    if 'anime' not in existing:
+        op.create_table(
+            'anime',
+            sa.Column('mal_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('title', sa.String(length=255), nullable=False),
+            sa.Column('title_english', sa.String(length=255), nullable=True),
+            sa.Column('title_japanese', sa.String(length=255), nullable=True),
+            sa.Column('title_synonyms', sa.JSON(), nullable=True),
+            sa.Column('image', sa.String(length=500), nullable=True),
+            sa.Column('image_small', sa.String(length=500), nullable=True),
+            sa.Column('type', sa.String(length=20), nullable=True),
+            sa.Column('episodes', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=50), nullable=True),
+            sa.Column('airing', sa.Boolean(), nullable=True),
+            sa.Column('rating', sa.String(length=50), nullable=True),
+            sa.Column('aired_from', sa.String(length=32), nullable=True),
+            sa.Column('aired_to', sa.String(length=32), nullable=True),
+            sa.Column('year', sa.Integer(), nullable=True),
+            sa.Column('score', sa.Float(), nullable=True),
+            sa.Column('scored_by', sa.Integer(), nullable=True),
+            sa.Column('rank', sa.Integer(), nullable=True),
+            sa.Column('popularity', sa.Integer(), nullable=True),
+            sa.Column('members', sa.Integer(), nullable=True),
+            sa.Column('favorites', sa.Integer(), nullable=True),
+            sa.Column('genres', sa.JSON(), nullable=True),
+            sa.Column('is_nsfw', sa.Boolean(), nullable=True),
+            sa.Column('synopsis', sa.Text(), nullable=True),
+            sa.Column('synced_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('mal_id'),
+        )
+        for column in ('year', 'score', 'rank', 'popularity', 'is_nsfw'):
+            op.create_index(f'ix_anime_{column}', 'anime', [column])
+
+    if 'sync_checkpoint' not in existing:
+        op.create_table(
+            'sync_checkpoint',
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('page', sa.Integer(), nullable=False),
+            sa.Column('completed_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('name'),
+        )
+
+    # Полнотекстовый индекс поиска (search_index.py) есть только на SQLite
+    if bind.dialect.name == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS anime_fts USING fts5("
+            "title, title_english, title_japanese, synonyms, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS anime_fts_vocab USING fts5vocab(anime_fts, row)")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS anime_fts_vocab")
+        op.execute("DROP TABLE IF EXISTS anime_fts")
+    op.drop_table('sync_checkpoint')
+    op.drop_table('anime')
+    op.drop_table('user_anime')
+    op.drop_table('user')
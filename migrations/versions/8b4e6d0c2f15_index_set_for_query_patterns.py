@@ -0,0 +1,60 @@
+"""index set for query patterns
+
+Индексы user_anime под реальные запросы:
+  * (user_id, mal_id) — unique_user_anime: toggle_list, add_to_list, импорт,
+    /api/my_anime_ids (покрывающий, уже в порядке mal_id) и любой фильтр
+    по одному user_id как по левому префиксу;
+  * (id, user_id) — первичный ключ, user_id проверяется на найденной строке;
+  * (user_id, status, updated_at) и (user_id, updated_at) — страницы /my-list.
+Одиночные ix_user_anime_user_id и ix_user_anime_mal_id ничего из этого не
+ускоряют, но замедляют каждую запись — удаляются. user.username уже
+уникален, его индекс и есть индекс входа.
+
+Revision ID: 8b4e6d0c2f15
+Revises: 3f1c2a9b7d01
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d0c2f15'
+down_revision = '3f1c2a9b7d01'
+branch_labels = None
+depends_on = None
+
+LIST_INDEXES = {
+    'ix_user_anime_user_status_updated': ['user_id', 'status', 'updated_at'],
+    'ix_user_anime_user_updated': ['user_id', 'updated_at'],
+}
+REDUNDANT_INDEXES = {
+    'ix_user_anime_user_id': ['user_id'],
+    'ix_user_anime_mal_id': ['mal_id'],
+}
+
+
+def _existing_indexes():
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('user_anime')}
+
+
+def upgrade():
+    existing = _existing_indexes()
+    # Базы после create_all уже могли получить составные индексы из модели
+    for name, columns in LIST_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'user_anime', columns)
+    for name in REDUNDANT_INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name='user_anime')
+
+
+def downgrade():
+    existing = _existing_indexes()
+    for name, columns in REDUNDANT_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'user_anime', columns)
+    for name in LIST_INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name='user_anime')
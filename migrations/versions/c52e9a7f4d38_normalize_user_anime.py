@@ -0,0 +1,115 @@
+"""normalize user_anime into catalog references
+
+Метаданные тайтла (title, image, type, episodes, year, synopsis) уходят из
+user_anime в общий каталог anime: строка списка остаётся узкой связкой
+пользователь — тайтл. Для mal_id, которых в каталоге ещё нет, создаётся
+одна запись из строк списков (по каждому полю — последнее непустое
+значение); synced_at у неё пуст, `flask catalog fill-missing` дозагрузит
+её из Jikan. Строки без mal_id удаляются — показать их нечем.
+
+Revision ID: c52e9a7f4d38
+Revises: 8b4e6d0c2f15
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e9a7f4d38'
+down_revision = '8b4e6d0c2f15'
+branch_labels = None
+depends_on = None
+
+METADATA_COLUMNS = (
+    sa.Column('title', sa.String(255)),
+    sa.Column('image', sa.String(500)),
+    sa.Column('type', sa.String(20)),
+    sa.Column('episodes', sa.Integer()),
+    sa.Column('year', sa.Integer()),
+    sa.Column('synopsis', sa.Text()),
+)
+FIELDS = [column.name for column in METADATA_COLUMNS]
+BATCH = 500
+
+anime = sa.table(
+    'anime',
+    sa.column('mal_id', sa.Integer),
+    sa.column('title', sa.String),
+    sa.column('image', sa.String),
+    sa.column('image_small', sa.String),
+    sa.column('type', sa.String),
+    sa.column('episodes', sa.Integer),
+    sa.column('year', sa.Integer),
+    sa.column('synopsis', sa.Text),
+    sa.column('title_synonyms', sa.JSON),
+    sa.column('genres', sa.JSON),
+    sa.column('airing', sa.Boolean),
+    sa.column('is_nsfw', sa.Boolean),
+    sa.column('synced_at', sa.DateTime),
+)
+
+
+def _catalog_rows(bind):
+    """Записи каталога для mal_id из списков, которых в каталоге нет"""
+    result = bind.execute(sa.text(
+        "SELECT ua.mal_id, ua.title, ua.image, ua.type, ua.episodes, ua.year, ua.synopsis "
+        "FROM user_anime ua LEFT JOIN anime a ON a.mal_id = ua.mal_id "
+        "WHERE a.mal_id IS NULL "
+        "ORDER BY ua.mal_id, ua.updated_at DESC"
+    ))
+    rows = {}
+    for mal_id, *values in result:
+        row = rows.setdefault(mal_id, {'mal_id': mal_id})
+        for name, value in zip(FIELDS, values):
+            if row.get(name) is None and value not in (None, ''):
+                row[name] = value
+    for row in rows.values():
+        yield {
+            **{name: row.get(name) for name in FIELDS},
+            'mal_id': row['mal_id'],
+            'title': row.get('title') or '',
+            'image_small': row.get('image'),
+            'title_synonyms': [],
+            'genres': [],
+            'airing': False,
+            'is_nsfw': True,    # рейтинг неизвестен до дозагрузки — в SFW-выдачу не попадает
+            'synced_at': None,
+        }
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.execute("DELETE FROM user_anime WHERE mal_id IS NULL")
+
+    batch = []
+    for row in _catalog_rows(bind):
+        batch.append(row)
+        if len(batch) >= BATCH:
+            op.bulk_insert(anime, batch)
+            batch = []
+    if batch:
+        op.bulk_insert(anime, batch)
+
+    with op.batch_alter_table('user_anime') as batch_op:
+        for name in FIELDS:
+            batch_op.drop_column(name)
+        batch_op.alter_column('mal_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_user_anime_anime', 'anime', ['mal_id'], ['mal_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('user_anime') as batch_op:
+        batch_op.drop_constraint('fk_user_anime_anime', type_='foreignkey')
+        batch_op.alter_column('mal_id', existing_type=sa.Integer(), nullable=True)
+        for column in METADATA_COLUMNS:
+            batch_op.add_column(sa.Column(column.name, column.type))
+
+    # Копии метаданных обратно в строки списков (название — как показывали карточки)
+    op.execute(
+        "UPDATE user_anime SET "
+        "title = (SELECT COALESCE(a.title_english, a.title) FROM anime a WHERE a.mal_id = user_anime.mal_id), "
+        + ", ".join(f"{name} = (SELECT a.{name} FROM anime a WHERE a.mal_id = user_anime.mal_id)"
+                    for name in FIELDS if name != 'title')
+    )
@@ -0,0 +1,45 @@
+"""catalog ranking indexes
+
+SFW-рейтинги каталога (/api/top_anime, /api/popular_anime, главная) шли по
+ix_anime_is_nsfw и сортировали всю SFW-часть каталога (USE TEMP B-TREE FOR
+ORDER BY). Составные (is_nsfw, rank) и (is_nsfw, popularity) отдают первую
+страницу прямо в порядке индекса.
+
+Revision ID: e7a3b5c9d210
+Revises: c52e9a7f4d38
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3b5c9d210'
+down_revision = 'c52e9a7f4d38'
+branch_labels = None
+depends_on = None
+
+RANKING_INDEXES = {
+    'ix_anime_sfw_rank': ['is_nsfw', 'rank'],
+    'ix_anime_sfw_popularity': ['is_nsfw', 'popularity'],
+}
+
+
+def _existing_indexes():
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('anime')}
+
+
+def upgrade():
+    existing = _existing_indexes()
+    # Базы после create_all уже могли получить индексы из модели
+    for name, columns in RANKING_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'anime', columns)
+
+
+def downgrade():
+    existing = _existing_indexes()
+    for name in RANKING_INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name='anime')
@@ -0,0 +1,49 @@
+"""user_anime timestamps not null
+
+Keyset-пагинация /my-list сравнивает (updated_at, id) / (created_at, id) с
+курсором, а сравнение с NULL ложно: строки с пустой датой (старые записи
+до default=datetime.utcnow) не попадали ни на одну страницу. Пустые даты
+заполняются соседней колонкой или временем миграции, колонки становятся
+NOT NULL. COALESCE в самом запросе не годится: страница перестала бы
+читаться в порядке ix_user_anime_user_updated.
+
+Revision ID: f4c8d2a6b913
+Revises: e7a3b5c9d210
+Create Date: 2026-10-18 18:10:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c8d2a6b913'
+down_revision = 'e7a3b5c9d210'
+branch_labels = None
+depends_on = None
+
+user_anime = sa.table(
+    'user_anime',
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def upgrade():
+    now = datetime.utcnow()
+    op.execute(user_anime.update().where(user_anime.c.created_at.is_(None)).values(
+        created_at=sa.func.coalesce(user_anime.c.updated_at, now)))
+    op.execute(user_anime.update().where(user_anime.c.updated_at.is_(None)).values(
+        updated_at=user_anime.c.created_at))
+
+    with op.batch_alter_table('user_anime') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_anime') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=True)
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
@@ -24,31 +24,156 @@ class User(db.Model, UserMixin):
 class UserAnime(db.Model):
     id = db.Column(db.Integer, primary_key=True)
 
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
-    mal_id = db.Column(db.Integer, index=True)
-
-    # ⬇️ НОВОЕ
-    title = db.Column(db.String(255))
-    image = db.Column(db.String(500))
-    type = db.Column(db.String(20))
-    episodes = db.Column(db.Integer)
-    year = db.Column(db.Integer)
-    synopsis = db.Column(db.Text)
+    # Отдельные индексы не нужны: оба поля покрывает unique_user_anime (user_id, mal_id)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    # Название, постер, описание и прочее — в общем каталоге, здесь только ссылка на него
+    mal_id = db.Column(db.Integer, db.ForeignKey('anime.mal_id', name='fk_user_anime_anime'), nullable=False)
 
     status = db.Column(db.String(20), default='planned')
     score = db.Column(db.Integer)
 
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # NOT NULL: ключи keyset-пагинации /my-list, NULL выпал бы из всех страниц
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(
         db.DateTime,
         default=datetime.utcnow,
-        onupdate=datetime.utcnow
+        onupdate=datetime.utcnow,
+        nullable=False
     )
     
     is_private = db.Column(db.Boolean, default=False)
 
     __table_args__ = (
         db.UniqueConstraint('user_id', 'mal_id', name='unique_user_anime'),
+        # Страницы /my-list: фильтр по статусу и keyset по updated_at
+        db.Index('ix_user_anime_user_status_updated', 'user_id', 'status', 'updated_at'),
+        db.Index('ix_user_anime_user_updated', 'user_id', 'updated_at'),
+    )
+
+    comment = db.Column(db.Text)
+
+    anime = db.relationship('Anime')
+
+
+# --- Локальный каталог аниме (зеркало Jikan) ---
+
+class Anime(db.Model):
+    mal_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    title = db.Column(db.String(255), nullable=False)
+    title_english = db.Column(db.String(255))
+    title_japanese = db.Column(db.String(255))
+    title_synonyms = db.Column(db.JSON, default=list)   # синонимы и названия на других языках
+    image = db.Column(db.String(500))
+    image_small = db.Column(db.String(500))
+
+    type = db.Column(db.String(20))
+    episodes = db.Column(db.Integer)
+    status = db.Column(db.String(50))
+    airing = db.Column(db.Boolean, default=False)
+    rating = db.Column(db.String(50))
+    aired_from = db.Column(db.String(32))   # ISO-дата как в Jikan
+    aired_to = db.Column(db.String(32))
+    year = db.Column(db.Integer, index=True)
+
+    score = db.Column(db.Float, index=True)
+    scored_by = db.Column(db.Integer)
+    rank = db.Column(db.Integer, index=True)
+    popularity = db.Column(db.Integer, index=True)
+    members = db.Column(db.Integer)
+    favorites = db.Column(db.Integer)
+
+    genres = db.Column(db.JSON, default=list)   # [{'mal_id': 1, 'name': 'Action'}, ...] вместе с explicit
+    is_nsfw = db.Column(db.Boolean, default=False, index=True)
+    synopsis = db.Column(db.Text)
+
+    synced_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # SFW-рейтинги каталога: фильтр is_nsfw и страница сразу в порядке rank / popularity
+        db.Index('ix_anime_sfw_rank', 'is_nsfw', 'rank'),
+        db.Index('ix_anime_sfw_popularity', 'is_nsfw', 'popularity'),
     )
 
-    comment = db.Column(db.Text)
\ No newline at end of file
+    @staticmethod
+    def values_from_jikan(item):
+        """Нормализованные поля из элемента ответа Jikan"""
+        images = item.get('images', {}).get('jpg', {})
+        aired = item.get('aired') or {}
+        genres = [
+            {'mal_id': g['mal_id'], 'name': g['name']}
+            for g in (item.get('genres') or []) + (item.get('explicit_genres') or [])
+        ]
+        genre_names = {g['name'].lower() for g in genres}
+        rating = item.get('rating')
+        year = item.get('year')
+        if not year and aired.get('from'):
+            year = int(aired['from'][:4])
+
+        return {
+            'mal_id': item['mal_id'],
+            'title': item.get('title') or '',
+            'title_english': item.get('title_english'),
+            'title_japanese': item.get('title_japanese'),
+            'title_synonyms': [t['title'] for t in item.get('titles') or []
+                               if t.get('type') not in ('Default', 'English', 'Japanese')]
+                              or item.get('title_synonyms') or [],
+            'image': images.get('large_image_url') or images.get('image_url'),
+            'image_small': images.get('small_image_url') or images.get('image_url'),
+            'type': item.get('type'),
+            'episodes': item.get('episodes'),
+            'status': item.get('status'),
+            'airing': bool(item.get('airing')),
+            'rating': rating,
+            'aired_from': aired.get('from'),
+            'aired_to': aired.get('to'),
+            'year': year,
+            'score': item.get('score'),
+            'scored_by': item.get('scored_by'),
+            'rank': item.get('rank'),
+            'popularity': item.get('popularity'),
+            'members': item.get('members'),
+            'favorites': item.get('favorites'),
+            'genres': genres,
+            'is_nsfw': bool(rating and rating.startswith('Rx')) or bool(genre_names & {'hentai', 'erotica'}),
+            'synopsis': item.get('synopsis'),
+            'synced_at': datetime.utcnow(),
+        }
+
+    def to_jikan(self):
+        """Элемент в форме ответа Jikan — чтобы обработчики не отличали каталог от API"""
+        return {
+            'mal_id': self.mal_id,
+            'title': self.title,
+            'title_english': self.title_english,
+            'title_japanese': self.title_japanese,
+            'title_synonyms': self.title_synonyms or [],
+            'images': {'jpg': {
+                'large_image_url': self.image,
+                'image_url': self.image,
+                'small_image_url': self.image_small,
+            }},
+            'type': self.type,
+            'episodes': self.episodes,
+            'status': self.status,
+            'airing': self.airing,
+            'rating': self.rating,
+            'aired': {'from': self.aired_from, 'to': self.aired_to},
+            'year': self.year,
+            'score': self.score,
+            'scored_by': self.scored_by,
+            'rank': self.rank,
+            'popularity': self.popularity,
+            'members': self.members,
+            'favorites': self.favorites,
+            'genres': self.genres or [],
+            'synopsis': self.synopsis,
+        }
+
+
+class SyncCheckpoint(db.Model):
+    """Докуда дошла синхронизация каталога (чтобы продолжать после обрыва)"""
+    name = db.Column(db.String(50), primary_key=True)
+    page = db.Column(db.Integer, default=1, nullable=False)
+    completed_at = db.Column(db.DateTime)   # первый полный проход завершён
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
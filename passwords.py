@@ -0,0 +1,201 @@
+"""Пароли: bcrypt в отдельном пуле процессов и ограничение попыток входа.
+
+bcrypt специально медленный (~250 мс при 12 раундах), и на потоке запроса он
+занимает CPU воркера целиком: волна входов или подбор паролей останавливает
+и дешёвые API. Поэтому хэширование и проверка идут в небольшом пуле
+процессов, а ожидающих задач в воркере не больше PASSWORD_HASH_QUEUE —
+сверх этого запрос сразу получает отказ (HasherBusy), а не встаёт в очередь.
+
+Число раундов задаётся BCRYPT_LOG_ROUNDS; хэш со старым числом раундов
+пересчитывается при следующем успешном входе.
+
+LoginThrottle считает неудачные входы по IP и по имени пользователя в
+SQLite-файле, общем для всех воркеров, и отказывает ещё до проверки пароля.
+"""
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+import metrics
+
+# bcrypt учитывает только первые 72 байта; bcrypt>=5 не обрезает сам, а падает
+MAX_PASSWORD_BYTES = 72
+
+
+class HasherBusy(Exception):
+    """Очередь хэширования переполнена или задача не уложилась в таймаут"""
+
+
+def _secret(password):
+    return password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+
+def hash_password(password, rounds=12):
+    """Хэш bcrypt строкой (совместим с хэшами Flask-Bcrypt)"""
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def check_password(pw_hash, password):
+    try:
+        return bcrypt.checkpw(_secret(password), pw_hash.encode('utf-8'))
+    except ValueError:  # не bcrypt-хэш
+        return False
+
+
+def hash_rounds(pw_hash):
+    """Число раундов из хэша вида $2b$12$..."""
+    try:
+        return int(pw_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = 2
+        self.max_pending = 16
+        self.timeout = 10.0
+        self.rejected = 0
+        self._slots = None
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.max_pending = app.config.get('PASSWORD_HASH_QUEUE', 16)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10.0)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        app.extensions['password_hasher'] = self
+
+    def _executor(self):
+        # Пул создаётся при первом обращении в каждом процессе: пул мастера после fork воркера не годится.
+        # spawn — потому что воркер к этому моменту уже многопоточный
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, op, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            metrics.PASSWORD_HASH_REJECTED.labels('queue').inc()
+            raise HasherBusy()
+        start = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                result = fn(*args)  # без пула (разработка): на потоке запроса, но с тем же лимитом очереди
+            else:
+                result = self._executor().submit(fn, *args).result(timeout=self.timeout)
+            metrics.PASSWORD_HASH_TIME.labels(op).observe(time.perf_counter() - start)
+            return result
+        except FutureTimeout:
+            self.rejected += 1
+            metrics.PASSWORD_HASH_REJECTED.labels('timeout').inc()
+            raise HasherBusy()
+        except BrokenProcessPool:
+            with self._lock:
+                self._pool = None
+            metrics.PASSWORD_HASH_REJECTED.labels('broken_pool').inc()
+            raise HasherBusy()
+        finally:
+            self._slots.release()
+
+    def generate(self, password):
+        return self._run('hash', hash_password, password, self.rounds)
+
+    def check(self, pw_hash, password):
+        return self._run('check', check_password, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        return hash_rounds(pw_hash) != self.rounds
+
+
+class LoginThrottle:
+    """Неудачные входы по IP и по имени в окне window секунд, общие для воркеров"""
+
+    PURGE_EVERY = 100
+
+    def __init__(self, app=None):
+        self.path = None
+        self.window = 900
+        self.limits = {'ip': 30, 'user': 10}
+        self._local = threading.local()
+        self._failures = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.window = app.config.get('LOGIN_THROTTLE_WINDOW', 900)
+        self.limits = {
+            'ip': app.config.get('LOGIN_MAX_FAILURES_PER_IP', 30),
+            'user': app.config.get('LOGIN_MAX_FAILURES_PER_USER', 10),
+        }
+        self.path = app.config.get('LOGIN_THROTTLE_PATH') or os.path.join(app.instance_path, 'login_throttle.db')
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn().execute(
+            'CREATE TABLE IF NOT EXISTS login_failures ('
+            ' key TEXT PRIMARY KEY,'
+            ' failures INTEGER NOT NULL,'
+            ' window_start REAL NOT NULL)'
+        )
+        app.extensions['login_throttle'] = self
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _keys(ip, username):
+        return {f"ip:{ip}": 'ip', f"user:{(username or '').strip().lower()}": 'user'}
+
+    def retry_after(self, ip, username):
+        """Сколько секунд ещё отказывать (0 — можно проверять пароль)"""
+        keys = self._keys(ip, username)
+        now = time.time()
+        wait = 0.0
+        rows = self._conn().execute(
+            f"SELECT key, failures, window_start FROM login_failures WHERE key IN ({','.join('?' * len(keys))})",
+            list(keys)
+        )
+        for key, failures, window_start in rows:
+            if failures >= self.limits[keys[key]] and window_start + self.window > now:
+                wait = max(wait, window_start + self.window - now)
+        return wait
+
+    def failure(self, ip, username):
+        now = time.time()
+        conn = self._conn()
+        # Одним UPSERT на ключ: счётчик атомарен между воркерами, истёкшее окно начинается заново
+        conn.executemany(
+            'INSERT INTO login_failures (key, failures, window_start) VALUES (?, 1, ?)'
+            ' ON CONFLICT (key) DO UPDATE SET'
+            '  failures = CASE WHEN window_start + ? <= excluded.window_start THEN 1 ELSE failures + 1 END,'
+            '  window_start = CASE WHEN window_start + ? <= excluded.window_start'
+            '                 THEN excluded.window_start ELSE window_start END',
+            [(key, now, self.window, self.window) for key in self._keys(ip, username)]
+        )
+        self._failures += 1
+        if self._failures % self.PURGE_EVERY == 0:
+            conn.execute('DELETE FROM login_failures WHERE window_start < ?', (now - self.window,))
+
+    def success(self, username):
+        """Успешный вход снимает счётчик имени (счётчик IP остаётся)"""
+        key = next(key for key, kind in self._keys(None, username).items() if kind == 'user')
+        self._conn().execute('DELETE FROM login_failures WHERE key = ?', (key,))
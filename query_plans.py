@@ -0,0 +1,96 @@
+"""Проверка планов горячих запросов: каждый должен идти по индексу.
+
+Запросы строятся тем же кодом, что и в обработчиках, и выполняются с
+префиксом EXPLAIN (EXPLAIN QUERY PLAN на SQLite). Полный проход таблицы
+(SCAN / Seq Scan) — ошибка; для страниц списка и рейтингов каталога ошибкой
+считается и отдельная сортировка (TEMP B-TREE / Sort): страница должна
+читаться прямо в порядке индекса. Запуск: `flask db check-plans` после `flask db upgrade`;
+то же на временной базе проверяет tests/test_query_plans.py.
+"""
+from datetime import datetime
+
+from sqlalchemy import event, select
+
+from models import db, Anime, User, UserAnime
+import catalog
+import user_list
+
+SAMPLE_USER_ID = 1
+SAMPLE_MAL_ID = 1
+
+
+def hot_queries():
+    """[(название, запрос, должен ли идти в порядке индекса без сортировки)]"""
+    default_filters = user_list.parse_list_args({})
+    status_filters = user_list.parse_list_args({'status': 'watching'})
+    cursor = user_list.encode_cursor('updated', 'desc', datetime.utcnow(), 10)
+    return [
+        ('login: user по username', select(User).where(User.username == 'sample'), False),
+        ('user_loader: user по id', select(User).where(User.id == SAMPLE_USER_ID), False),
+        ('toggle_list / add_to_list: (user_id, mal_id)',
+         select(UserAnime).where(UserAnime.user_id == SAMPLE_USER_ID, UserAnime.mal_id == SAMPLE_MAL_ID), False),
+        ('update_* / delete_from_list: (id, user_id)',
+         select(UserAnime).where(UserAnime.id == 1, UserAnime.user_id == SAMPLE_USER_ID), False),
+        ('my_anime_ids: mal_id по user_id',
+         select(UserAnime.mal_id).where(UserAnime.user_id == SAMPLE_USER_ID).order_by(UserAnime.mal_id), True),
+        ('my-list: первая страница',
+         user_list.page_query(SAMPLE_USER_ID, default_filters).limit(25).statement, True),
+        ('my-list: следующая страница по курсору',
+         user_list.page_query(SAMPLE_USER_ID, default_filters, cursor).limit(25).statement, True),
+        ('my-list: фильтр по статусу',
+         user_list.page_query(SAMPLE_USER_ID, status_filters).limit(25).statement, True),
+        ('каталог: карточка по mal_id', select(Anime).where(Anime.mal_id == SAMPLE_MAL_ID), False),
+        ('каталог: топ по рейтингу', catalog.ranking_query('top', True).limit(12).statement, True),
+        ('каталог: топ по популярности', catalog.ranking_query('popular', True).limit(12).statement, True),
+    ]
+
+
+def explain(connection, statement):
+    """Строки плана запроса для текущего диалекта"""
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+
+    # Параметры привязывает сам SQLAlchemy, мы лишь дописываем EXPLAIN к готовому SQL
+    def add_prefix(conn, cursor, sql, parameters, context, executemany):
+        return prefix + sql, parameters
+
+    event.listen(connection, 'before_cursor_execute', add_prefix, retval=True)
+    try:
+        result = connection.execute(statement)
+        rows = result.cursor.fetchall()
+        result.close()
+    finally:
+        event.remove(connection, 'before_cursor_execute', add_prefix)
+
+    if connection.dialect.name == 'sqlite':
+        return [row[-1] for row in rows]   # (id, parent, notused, detail)
+    return [row[0] for row in rows]
+
+
+def problems(plan, dialect, ordered):
+    """Что в плане не так (пустой список — запрос идёт по индексу)"""
+    found = []
+    for line in plan:
+        if dialect == 'sqlite':
+            if line.startswith('SCAN ') and 'CONSTANT ROW' not in line:
+                found.append(f'полный проход: {line}')
+            if ordered and 'TEMP B-TREE' in line:
+                found.append(f'отдельная сортировка: {line}')
+        else:
+            if 'Seq Scan' in line:
+                found.append(f'полный проход: {line.strip()}')
+            if ordered and line.strip().startswith(('Sort', '->  Sort')):
+                found.append(f'отдельная сортировка: {line.strip()}')
+    return found
+
+
+def check_plans():
+    """[(название, план, проблемы)] по всем горячим запросам"""
+    results = []
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # На почти пустой базе Postgres честно выбирает Seq Scan — спрашиваем, может ли он без него
+            connection.exec_driver_sql('SET enable_seqscan = off')
+        for name, statement, ordered in hot_queries():
+            plan = explain(connection, statement)
+            results.append((name, plan, problems(plan, connection.dialect.name, ordered)))
+    return results
@@ -0,0 +1,223 @@
+"""Общий для всех воркеров лимитер запросов к Jikan (token bucket).
+
+Состояние корзин хранится в SQLite-файле, а BEGIN IMMEDIATE даёт
+межпроцессную блокировку без внешних сервисов. Каждый вызывающий
+резервирует ближайший свободный слот под блокировкой и спит ровно до
+него, поэтому очередь обслуживается по порядку прихода (FIFO), а не
+«кто первый проснулся».
+
+Фоновые запросы (предзагрузка) в очередь не встают: acquire_spare
+периодически пробует взять свободный слот, и только если в корзинах после
+него останется запас (headroom) для пользователей. Пришедший за это время
+пользовательский запрос получает слот первым.
+"""
+import email.utils
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+
+SPARE_POLL_INTERVAL = 0.25  # как часто фоновый запрос проверяет, не появился ли запас, сек
+
+
+class RateLimitExceeded(Exception):
+    """Ожидание слота превысило допустимое время"""
+
+
+def parse_retry_after(value, default=None):
+    """Заголовок Retry-After (секунды или HTTP-дата) -> секунды"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(0.0, dt.timestamp() - time.time())
+
+
+class TokenBucketLimiter:
+    """Две корзины токенов (в секунду и в минуту) + блокировка по Retry-After"""
+
+    def __init__(self, app=None, name='jikan'):
+        self.name = name
+        self.path = None
+        self.buckets = ()
+        self.max_wait = 10.0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.acquired = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.buckets = (
+            self._bucket(app.config.get('JIKAN_RATE_PER_SECOND', 3), 1,
+                         app.config.get('JIKAN_RATE_BURST_SECOND', 1)),
+            self._bucket(app.config.get('JIKAN_RATE_PER_MINUTE', 60), 60,
+                         app.config.get('JIKAN_RATE_BURST_MINUTE', 10)),
+        )
+        self.max_wait = app.config.get('JIKAN_RATE_MAX_WAIT', 10.0)
+        self.path = app.config.get('JIKAN_RATE_LIMIT_PATH') or os.path.join(app.instance_path, 'jikan_ratelimit.db')
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._init_schema()
+        app.extensions['rate_limiter'] = self
+
+    @staticmethod
+    def _bucket(limit, window, burst):
+        """(ёмкость, скорость пополнения в токенах/сек) так, чтобы в любом окне
+        длиной window было не больше limit запросов: burst + rate * window <= limit"""
+        burst = max(1, min(burst, limit - 1)) if limit > 1 else 1
+        return burst, max(limit - burst, 1) / window
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_buckets ('
+            ' name TEXT NOT NULL,'
+            ' bucket INTEGER NOT NULL,'
+            ' tokens REAL NOT NULL,'
+            ' updated_at REAL NOT NULL,'
+            ' PRIMARY KEY (name, bucket))'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_blocks ('
+            ' name TEXT PRIMARY KEY,'
+            ' blocked_until REAL NOT NULL)'
+        )
+
+    def _load(self, conn, now):
+        rows = dict(
+            (bucket, (tokens, updated_at)) for bucket, tokens, updated_at in conn.execute(
+                'SELECT bucket, tokens, updated_at FROM rate_buckets WHERE name = ?', (self.name,)
+            )
+        )
+        state = [rows.get(i, (float(capacity), now)) for i, (capacity, _) in enumerate(self.buckets)]
+        row = conn.execute('SELECT blocked_until FROM rate_blocks WHERE name = ?', (self.name,)).fetchone()
+        return state, (row[0] if row else 0.0)
+
+    def _save(self, conn, state):
+        conn.executemany(
+            'INSERT OR REPLACE INTO rate_buckets (name, bucket, tokens, updated_at) VALUES (?, ?, ?, ?)',
+            [(self.name, i, tokens, updated_at) for i, (tokens, updated_at) in enumerate(state)]
+        )
+
+    def reserve(self, max_wait=None, headroom=0):
+        """Зарезервировать слот; вернуть момент времени, когда можно слать запрос.
+
+        headroom — сколько токенов в каждой корзине оставить другим (не больше
+        ёмкости без одного): слот выдаётся, только когда они накопятся.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            state, blocked_until = self._load(conn, now)
+
+            # Ближайший момент, когда в каждой корзине будет целый токен (и сверх него — headroom)
+            slot = max(now, blocked_until)
+            for (capacity, rate), (tokens, updated_at) in zip(self.buckets, state):
+                base = max(now, updated_at)
+                need = 1 + min(headroom, capacity - 1)
+                available = min(capacity, tokens + (base - updated_at) * rate)
+                ready_at = base if available >= need else base + (need - available) / rate
+                slot = max(slot, ready_at)
+
+            if slot - now > max_wait:
+                conn.execute('ROLLBACK')
+                return None
+
+            # Списываем токен в момент слота (токены могут «уйти» в будущее — это и есть очередь)
+            new_state = []
+            for (capacity, rate), (tokens, updated_at) in zip(self.buckets, state):
+                tokens = min(capacity, tokens + (slot - updated_at) * rate) - 1
+                new_state.append((tokens, slot))
+            self._save(conn, new_state)
+            conn.execute('COMMIT')
+            return slot
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def acquire(self, max_wait=None):
+        """Дождаться своей очереди; RateLimitExceeded, если ждать дольше max_wait"""
+        slot = self.reserve(max_wait)
+        if slot is None:
+            with self._stats_lock:
+                self.rejected += 1
+            metrics.RATE_LIMIT_REJECTED.labels(self.name).inc()
+            raise RateLimitExceeded(self.name)
+
+        wait = slot - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        wait = max(0.0, wait)
+        with self._stats_lock:
+            self.acquired += 1
+            self.total_wait += wait
+        metrics.RATE_LIMIT_WAIT.labels(self.name).observe(wait)
+        return wait
+
+    def acquire_spare(self, headroom, max_wait):
+        """Слот для фоновой работы: без очереди, с запасом headroom в корзинах; RateLimitExceeded через max_wait"""
+        start = time.time()
+        while True:
+            slot = self.reserve(0, headroom)
+            if slot is not None:
+                break
+            if time.time() - start + SPARE_POLL_INTERVAL > max_wait:
+                with self._stats_lock:
+                    self.rejected += 1
+                metrics.RATE_LIMIT_REJECTED.labels(self.name).inc()
+                raise RateLimitExceeded(self.name)
+            time.sleep(SPARE_POLL_INTERVAL)
+
+        wait = max(0.0, slot - start)
+        with self._stats_lock:
+            self.acquired += 1
+            self.total_wait += wait
+        metrics.RATE_LIMIT_WAIT.labels(self.name).observe(wait)
+        return wait
+
+    def penalize(self, seconds):
+        """Upstream ответил 429: никто не шлёт запросы ближайшие seconds секунд"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            until = time.time() + seconds
+            conn.execute(
+                'INSERT INTO rate_blocks (name, blocked_until) VALUES (?, ?)'
+                ' ON CONFLICT (name) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until)',
+                (self.name, until)
+            )
+            # Обнуляем корзины, чтобы после паузы не выстрелить всей ёмкостью сразу
+            self._save(conn, [(0.0, until) for _ in self.buckets])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'acquired': self.acquired,
+                'rejected': self.rejected,
+                'total_wait_seconds': round(self.total_wait, 3),
+            }
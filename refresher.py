@@ -0,0 +1,130 @@
+"""Фоновое обновление кэша Jikan.
+
+BackgroundRefresher — обновляет устаревшие записи, которые только что
+отдали пользователю (stale-while-revalidate).
+CacheWarmer — периодически прогревает первые страницы рейтингов заранее,
+до истечения их TTL, чтобы главная страница никогда не ждала Jikan.
+PeriodicTask — то же расписание с арендой для произвольной задачи
+(например, перечитывания рейтингов каталога).
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundRefresher:
+    def __init__(self, max_workers=2, logger=None, max_pending=None):
+        self.max_workers = max_workers
+        self.logger = logger
+        self.max_pending = max_pending  # None — очередь не ограничена
+        self._executor = None
+        self._pid = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Пул создаётся лениво и заново после fork воркера gunicorn
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='jikan-refresh')
+            self._pid = os.getpid()
+            self._pending = set()
+        return self._executor
+
+    def submit(self, key, fn):
+        """Поставить обновление ключа в очередь (повторные заявки на тот же ключ и сверх max_pending игнорируются)"""
+        with self._lock:
+            if key in self._pending:
+                return False
+            executor = self._get_executor()
+            if self.max_pending is not None and len(self._pending) >= self.max_pending:
+                return False
+            self._pending.add(key)
+        executor.submit(self._run, key, fn)
+        return True
+
+    def _run(self, key, fn):
+        try:
+            fn()
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Фоновое обновление {key} не удалось: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+
+class CacheWarmer:
+    """Планировщик прогрева: раз в interval секунд обновляет цели, которым осталось жить меньше lead"""
+
+    def __init__(self, cache, targets, refresh, interval=60, lead=300, logger=None):
+        self.cache = cache
+        self.targets = targets    # callable -> [(key, url, params, family)]
+        self.refresh = refresh    # callable(url, params, family)
+        self.interval = interval
+        self.lead = lead
+        self.logger = logger
+        self._thread = None
+        self._pid = None
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+    def start(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        self._thread = threading.Thread(target=self._loop, name='jikan-warmer', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                # Прогревает только один воркер за цикл — тот, кто взял аренду
+                if self.cache.backend.add_lease('warmer', self._owner, self.interval):
+                    self.run_once()
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"Прогрев кэша не удался: {e}")
+            time.sleep(self.interval)
+
+    def run_once(self):
+        warmed = 0
+        for key, url, params, family in self.targets():
+            remaining = self.cache.fresh_for(key)
+            if remaining is None or remaining < self.lead:
+                self.refresh(url, params, family)
+                warmed += 1
+        return warmed
+
+
+class PeriodicTask:
+    """Раз в interval секунд выполняет job() в одном воркере — том, кто взял аренду name"""
+
+    def __init__(self, cache, name, job, interval=300, logger=None):
+        self.cache = cache
+        self.name = name
+        self.job = job
+        self.interval = interval
+        self.logger = logger
+        self._thread = None
+        self._pid = None
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+    def start(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        self._thread = threading.Thread(target=self._loop, name=f'task-{self.name}', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                if self.cache.backend.add_lease(self.name, self._owner, self.interval):
+                    self.job()
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"Периодическая задача {self.name} не удалась: {e}")
+            time.sleep(self.interval)
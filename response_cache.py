@@ -0,0 +1,89 @@
+"""Кэш готовых JSON-ответов /api с ETag и Last-Modified.
+
+Ключ строится из нормализованной строки запроса (параметры отсортированы,
+limit ограничен, sfw приведён к 'true'/'false'), поэтому ?limit=12&page=1
+и ?page=1&limit=12 попадают в одну запись. В ключ идут только параметры,
+которые читает view (ключи defaults и names) — ?x=1, ?x=2, ... не плодят записей. Хранится уже сериализованное
+тело ответа — на попадании не вызывается ни view, ни jsonify.
+"""
+import functools
+import hashlib
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from flask import Response, request
+
+MAX_LIMIT = 25
+
+
+def normalize_args(args, defaults=None, names=()):
+    """Каноничный набор параметров запроса: только из defaults и names, остальные отбрасываются"""
+    params = dict(defaults or {})
+    allowed = set(params) | set(names)
+    for name, value in args.items():
+        if name not in allowed:
+            continue
+        value = value.strip()
+        if value:
+            params[name] = value
+
+    if 'limit' in params:
+        try:
+            params['limit'] = max(1, min(int(params['limit']), MAX_LIMIT))
+        except ValueError:
+            params['limit'] = (defaults or {}).get('limit', 12)
+    if 'page' in params:
+        try:
+            params['page'] = max(1, int(params['page']))
+        except ValueError:
+            params['page'] = 1
+    if 'sfw' in params:
+        # Как во view: SFW только при точном 'true'
+        params['sfw'] = 'true' if params['sfw'] == 'true' else 'false'
+    return sorted((name, str(value)) for name, value in params.items())
+
+
+class ResponseCache:
+    def __init__(self, cache, family='views'):
+        self.cache = cache  # JikanCache: общий бэкенд для всех воркеров
+        self.family = family
+
+    def cached(self, timeout=300, defaults=None, max_age=60, names=()):
+        """Декоратор view: ставить ПОД @app.route; names — параметры без значения по умолчанию"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                query = urlencode(normalize_args(request.args, defaults, names))
+                key = f"view:{request.path}?{query}"
+
+                entry = self.cache.peek(key)
+                if entry is None:
+                    rv = view(*args, **kwargs)
+                    response = rv if isinstance(rv, Response) else None
+                    if response is None or response.status_code != 200 or response.cache_control.no_store:
+                        return rv  # ошибки и частичные ответы (no-store) не кэшируем
+                    body = response.get_data(as_text=True)
+                    entry = {
+                        'body': body,
+                        'etag': hashlib.sha1(body.encode('utf-8')).hexdigest(),
+                        'last_modified': int(time.time()),
+                    }
+                    self.cache.set(key, entry, self.family, timeout=timeout)
+                    self.cache.count(self.family, 'misses')
+                else:
+                    self.cache.count(self.family, 'hits')
+
+                return self._build(entry, max_age)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _build(entry, max_age):
+        response = Response(entry['body'], mimetype='application/json')
+        response.set_etag(entry['etag'])
+        response.last_modified = datetime.fromtimestamp(entry['last_modified'], tz=timezone.utc)
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        # 304 Not Modified, если браузер прислал If-None-Match / If-Modified-Since
+        return response.make_conditional(request)
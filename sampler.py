@@ -0,0 +1,143 @@
+"""Равномерная случайная выборка из локального каталога для /api/random_anime_filtered.
+
+Каталог один раз загружается в компактные колонки (mal_id, тип, статус,
+рейтинг, год, жанры, nsfw). Для каждого набора фильтров строится и кэшируется
+массив подходящих mal_id — его длина и есть точный total. Выборка k штук без
+повторений — алгоритм Флойда, O(k) независимо от размера индекса.
+"""
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from models import db, Anime
+
+# Значения фильтров фронтенда (как у Jikan) -> поля каталога
+STATUS_VALUES = {
+    'airing': 'Currently Airing',
+    'complete': 'Finished Airing',
+    'upcoming': 'Not yet aired',
+}
+RATING_PREFIXES = {
+    'g': 'G ',
+    'pg': 'PG ',
+    'pg13': 'PG-13',
+    'r17': 'R - 17+',
+    'r': 'R+',
+    'rx': 'Rx',
+}
+
+
+def parse_filters(args):
+    """Каноничный ключ фильтра из параметров запроса"""
+    def year(name):
+        try:
+            return int(args.get(name) or 0) or None
+        except ValueError:
+            return None
+
+    genres = tuple(sorted({int(g) for g in (args.get('genres') or '').split(',') if g.strip().isdigit()}))
+    return (
+        (args.get('type') or '').lower() or None,
+        args.get('status') or None,
+        args.get('rating') or None,
+        genres,
+        year('min_year'),
+        year('max_year'),
+        args.get('sfw', 'true') == 'true',
+    )
+
+
+def floyd_sample(n, k, rng=random):
+    """k различных индексов из range(n), равномерно, за O(k)"""
+    k = min(k, n)
+    chosen = set()
+    picks = []
+    for j in range(n - k, n):
+        t = rng.randint(0, j)
+        pick = t if t not in chosen else j
+        chosen.add(pick)
+        picks.append(pick)
+    rng.shuffle(picks)  # порядок у Флойда не равномерный — перемешиваем k элементов
+    return picks
+
+
+class RandomSampler:
+    def __init__(self, ttl=600, max_indexes=256):
+        self.ttl = ttl
+        self.max_indexes = max_indexes
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._columns = None
+        self._indexes = OrderedDict()
+
+    def _load(self):
+        """Колонки каталога в памяти процесса (перечитываются раз в ttl секунд)"""
+        ids, years, nsfw = array('i'), array('i'), bytearray()
+        types, statuses, ratings, genres = [], [], [], []
+        query = db.session.query(
+            Anime.mal_id, Anime.type, Anime.status, Anime.rating, Anime.year, Anime.is_nsfw, Anime.genres
+        ).order_by(Anime.mal_id)
+        for mal_id, type_, status, rating, year, is_nsfw, anime_genres in query.yield_per(2000):
+            ids.append(mal_id)
+            types.append((type_ or '').lower())
+            statuses.append(status or '')
+            ratings.append(rating or '')
+            years.append(year or 0)
+            nsfw.append(1 if is_nsfw else 0)
+            genres.append(frozenset(g['mal_id'] for g in anime_genres or ()))
+        return {'ids': ids, 'types': types, 'statuses': statuses, 'ratings': ratings,
+                'years': years, 'nsfw': nsfw, 'genres': genres}
+
+    def _build(self, columns, key):
+        type_, status, rating, genres, min_year, max_year, sfw = key
+        status = STATUS_VALUES.get(status, status)
+        rating_prefix = RATING_PREFIXES.get(rating) if rating else None
+        wanted = frozenset(genres)
+
+        index = array('i')
+        for i, mal_id in enumerate(columns['ids']):
+            if sfw and columns['nsfw'][i]:
+                continue
+            if type_ and columns['types'][i] != type_:
+                continue
+            if status and columns['statuses'][i] != status:
+                continue
+            if rating_prefix and not columns['ratings'][i].startswith(rating_prefix):
+                continue
+            year = columns['years'][i]
+            if (min_year or max_year) and not year:
+                continue
+            if min_year and year < min_year:
+                continue
+            if max_year and year > max_year:
+                continue
+            if wanted and not wanted <= columns['genres'][i]:
+                continue
+            index.append(mal_id)
+        return index
+
+    def index(self, key):
+        """Массив mal_id под фильтр (строится один раз и живёт до перезагрузки каталога)"""
+        with self._lock:
+            if self._columns is None or time.time() - self._loaded_at > self.ttl:
+                self._columns = self._load()
+                self._loaded_at = time.time()
+                self._indexes.clear()
+
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = self._build(self._columns, key)
+                if len(self._indexes) > self.max_indexes:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(key)
+            return index
+
+    def sample(self, key, k, rng=random):
+        """(k случайных записей каталога в форме Jikan, точное число подходящих)"""
+        index = self.index(key)
+        ids = [index[i] for i in floyd_sample(len(index), k, rng)]
+        by_id = {a.mal_id: a for a in Anime.query.filter(Anime.mal_id.in_(ids))} if ids else {}
+        return [by_id[i].to_jikan() for i in ids if i in by_id], len(index)
@@ -0,0 +1,181 @@
+"""Полнотекстовый поиск по локальному каталогу (SQLite FTS5).
+
+Индексируются основное, английское, японское название и все синонимы
+(включая названия на других языках). Каждое слово запроса ищется по
+префиксу; если ничего не нашлось, слова с опечатками заменяются на
+ближайшие термины словаря индекса. На PostgreSQL индекс не строится —
+поиск уходит в Jikan, как раньше.
+"""
+import difflib
+import re
+import threading
+
+from sqlalchemy import text
+
+from models import db, Anime
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+CJK_RE = re.compile(r'[぀-ヿ㐀-鿿]')
+
+# order_by из API Jikan -> выражение сортировки
+ORDER_COLUMNS = {
+    'title': 'anime.title',
+    'score': 'anime.score',
+    'scored_by': 'anime.scored_by',
+    'rank': 'anime.rank',
+    'popularity': 'anime.popularity',
+    'members': 'anime.members',
+    'favorites': 'anime.favorites',
+    'episodes': 'anime.episodes',
+    'start_date': 'anime.aired_from',
+}
+
+# Веса колонок для bm25: title, title_english, title_japanese, synonyms
+BM25 = 'bm25(anime_fts, 10.0, 8.0, 5.0, 3.0)'
+
+_vocab = {'terms': None}
+_vocab_lock = threading.Lock()
+
+
+def available():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def ensure_index():
+    """Создать FTS-таблицу; если она пустая, а каталог нет — перестроить"""
+    if not available():
+        return False
+    db.session.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS anime_fts USING fts5("
+        "title, title_english, title_japanese, synonyms, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    db.session.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS anime_fts_vocab USING fts5vocab(anime_fts, row)"))
+    db.session.commit()
+
+    indexed = db.session.execute(text("SELECT COUNT(*) FROM anime_fts")).scalar()
+    if not indexed and db.session.query(Anime.mal_id).limit(1).first():
+        rebuild()
+    return True
+
+
+def index_rows(rows):
+    """Обновить индекс для записей каталога (словари из Anime.values_from_jikan)"""
+    if not available() or not rows:
+        return
+    params = [{
+        'id': row['mal_id'],
+        'title': row.get('title') or '',
+        'title_english': row.get('title_english') or '',
+        'title_japanese': row.get('title_japanese') or '',
+        'synonyms': ' | '.join(row.get('title_synonyms') or []),
+    } for row in rows]
+    db.session.execute(text("DELETE FROM anime_fts WHERE rowid = :id"), params)
+    db.session.execute(text(
+        "INSERT INTO anime_fts (rowid, title, title_english, title_japanese, synonyms) "
+        "VALUES (:id, :title, :title_english, :title_japanese, :synonyms)"
+    ), params)
+    _vocab['terms'] = None
+
+
+def rebuild(batch_size=1000):
+    """Перестроить индекс из каталога целиком"""
+    db.session.execute(text("DELETE FROM anime_fts"))
+    columns = (Anime.mal_id, Anime.title, Anime.title_english, Anime.title_japanese, Anime.title_synonyms)
+    batch = []
+    for mal_id, title, title_english, title_japanese, synonyms in db.session.query(*columns).yield_per(batch_size):
+        batch.append({'mal_id': mal_id, 'title': title, 'title_english': title_english,
+                      'title_japanese': title_japanese, 'title_synonyms': synonyms})
+        if len(batch) >= batch_size:
+            index_rows(batch)
+            batch = []
+    index_rows(batch)
+    db.session.commit()
+
+
+def _terms():
+    """Словарь индекса, сгруппированный по первой букве (для исправления опечаток)"""
+    with _vocab_lock:
+        if _vocab['terms'] is None:
+            terms = {}
+            for (term,) in db.session.execute(text("SELECT term FROM anime_fts_vocab")):
+                terms.setdefault(term[0], []).append(term)
+            _vocab['terms'] = terms
+        return _vocab['terms']
+
+
+def _match_expression(tokens):
+    # Каждое слово — в кавычках (без синтаксиса FTS) и по префиксу
+    return ' '.join('"{}"*'.format(token.replace('"', '')) for token in tokens)
+
+
+def _corrected(tokens):
+    """Заменить слова с опечатками на ближайшие термины словаря: ("a" OR "b")"""
+    terms = _terms()
+    parts = []
+    changed = False
+    for token in tokens:
+        bucket = terms.get(token[0], ())
+        if any(t.startswith(token) for t in bucket):
+            parts.append('"{}"*'.format(token))
+            continue
+        candidates = [t for t in bucket if abs(len(t) - len(token)) <= 2]
+        close = difflib.get_close_matches(token, candidates, n=3, cutoff=0.75)
+        if not close:
+            return None
+        changed = True
+        parts.append('(' + ' OR '.join('"{}"'.format(t) for t in close) + ')')
+    return ' '.join(parts) if changed else None
+
+
+def _run(match, page, limit, order_by, sort, sfw):
+    where = "anime_fts MATCH :match"
+    if sfw:
+        where += " AND anime.is_nsfw = 0"
+    direction = 'ASC' if sort == 'asc' else 'DESC'
+    column = ORDER_COLUMNS.get(order_by)
+    # Без явной сортировки (или по умолчанию 'score', как в search_anime) — по релевантности
+    order = f"{column} IS NULL, {column} {direction}, {BM25}" if column and order_by != 'score' else BM25
+
+    # CROSS JOIN фиксирует порядок: сначала FTS, потом каталог по первичному ключу
+    # (иначе для COUNT планировщик перебирает весь каталог по индексу is_nsfw)
+    base = f"FROM anime_fts CROSS JOIN anime ON anime.mal_id = anime_fts.rowid WHERE {where}"
+    params = {'match': match, 'limit': limit, 'offset': (page - 1) * limit}
+    ids = [row[0] for row in db.session.execute(
+        text(f"SELECT anime.mal_id {base} ORDER BY {order} LIMIT :limit OFFSET :offset"), params
+    )]
+    total = db.session.execute(text(f"SELECT COUNT(*) {base}"), params).scalar()
+    return ids, total
+
+
+def search(query, page=1, limit=12, order_by='score', sort='desc', sfw=True):
+    """Страница результатов в форме ответа Jikan; None — искать в Jikan"""
+    if not available():
+        return None
+
+    tokens = [t.lower() for t in TOKEN_RE.findall(query)]
+    if not tokens:
+        return None
+
+    if CJK_RE.search(query):
+        # unicode61 не делит японский текст на слова — ищем подстрокой
+        q = Anime.query.filter(Anime.title_japanese.contains(query.strip()))
+        if sfw:
+            q = q.filter(Anime.is_nsfw.is_(False))
+        total = q.count()
+        ids = [a.mal_id for a in q.order_by(Anime.popularity).offset((page - 1) * limit).limit(limit)]
+    else:
+        ids, total = _run(_match_expression(tokens), page, limit, order_by, sort, sfw)
+        if not total:
+            match = _corrected(tokens)
+            if match is None:
+                return None
+            ids, total = _run(match, page, limit, order_by, sort, sfw)
+
+    if not total:
+        return None
+
+    from catalog import page_payload
+
+    by_id = {a.mal_id: a for a in Anime.query.filter(Anime.mal_id.in_(ids))}
+    return page_payload([by_id[i] for i in ids if i in by_id], page, limit, total)
@@ -0,0 +1,83 @@
+"""Single-flight: одновременные одинаковые запросы к upstream выполняются один раз.
+
+Внутри процесса ожидающие потоки ждут на Event и получают общий результат.
+Между воркерами лидер берёт «аренду» ключа в общем кэше; остальные воркеры
+в это время опрашивают кэш и подхватывают ответ, как только лидер его сохранит.
+"""
+import os
+import threading
+import time
+import uuid
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, cache, lease_ttl=15, poll_interval=0.05):
+        self.cache = cache
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0  # сколько вызовов получили чужой результат
+
+    def do(self, key, fn, lookup=None):
+        """Выполнить fn() один раз на ключ; lookup() проверяет, не готов ли ответ в кэше"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_shared(key, fn, lookup)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def _do_shared(self, key, fn, lookup):
+        """Координация между воркерами через аренду ключа в общем кэше"""
+        backend = self.cache.backend
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        deadline = time.time() + self.lease_ttl
+
+        while not backend.add_lease(key, owner, self.lease_ttl):
+            # Другой воркер уже качает этот ключ — ждём его результат в кэше
+            if lookup is not None:
+                result = lookup()
+                if result is not None:
+                    with self._lock:
+                        self.coalesced += 1
+                    return result
+            if time.time() > deadline or not backend.has_lease(key):
+                break
+            time.sleep(self.poll_interval)
+        else:
+            try:
+                # Пока брали аренду, ответ мог появиться
+                result = lookup() if lookup is not None else None
+                return result if result is not None else fn()
+            finally:
+                backend.release_lease(key, owner)
+
+        # Лидер другого воркера пропал или не справился — пробуем сами
+        result = lookup() if lookup is not None else None
+        return result if result is not None else fn()
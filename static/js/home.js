@@ -12,89 +12,47 @@ async function initializeHomePage() {
     // Загружаем список аниме пользователя
     await window.userState.loadUserAnimeIds();
     
-    // Загружаем все три блока параллельно
-    loadPopularAnime();
-    loadTopAnime();
-    loadAiringAnime();
+    // Загружаем все три блока одним запросом
+    loadHomeFeed();
     
     // Обработчики для кнопок добавления
     setupAddToCartHandlers();
 }
 
-// ===== ФУНКЦИИ ДЛЯ КАЖДОГО БЛОКА =====
+// ===== ЗАГРУЗКА БЛОКОВ =====
 
-async function loadPopularAnime() {
-    const grid = document.getElementById('popular-grid');
-    const loading = document.getElementById('loading-popular');
-    const error = document.getElementById('error-popular');
-    
-    showLoading(loading, grid, error);
-    
-    try {
-        const response = await fetch('/api/popular_anime?limit=12');
-        const data = await response.json();
-        
-        if (data.error) {
-            showError(error, data.error);
-            return;
-        }
-        
-        renderAnimeGrid('popular-grid', data.data);
-    } catch (err) {
-        showError(error, 'Ошибка загрузки популярных аниме');
-        console.error(err);
-    } finally {
-        hideLoading(loading);
-    }
-}
+// Секции главной: id в разметке и текст ошибки
+const HOME_SECTIONS = {
+    popular: 'Ошибка загрузки популярных аниме',
+    top: 'Ошибка загрузки топ аниме',
+    airing: 'Ошибка загрузки новинок'
+};
 
-async function loadTopAnime() {
-    const grid = document.getElementById('top-grid');
-    const loading = document.getElementById('loading-top');
-    const error = document.getElementById('error-top');
-    
-    showLoading(loading, grid, error);
+async function loadHomeFeed() {
+    const names = Object.keys(HOME_SECTIONS);
+    names.forEach(name => showLoading(
+        document.getElementById(`loading-${name}`),
+        document.getElementById(`${name}-grid`),
+        document.getElementById(`error-${name}`)
+    ));
     
     try {
-        const response = await fetch('/api/top_anime?limit=12');
+        const response = await fetch(`/api/home_feed?limit=12&sections=${names.join(',')}`);
         const data = await response.json();
         
-        if (data.error) {
-            showError(error, data.error);
-            return;
-        }
-        
-        renderAnimeGrid('top-grid', data.data);
-    } catch (err) {
-        showError(error, 'Ошибка загрузки топ аниме');
-        console.error(err);
-    } finally {
-        hideLoading(loading);
-    }
-}
-
-async function loadAiringAnime() {
-    const grid = document.getElementById('airing-grid');
-    const loading = document.getElementById('loading-airing');
-    const error = document.getElementById('error-airing');
-    
-    showLoading(loading, grid, error);
-    
-    try {
-        const response = await fetch('/api/airing_anime?limit=12');
-        const data = await response.json();
-        
-        if (data.error) {
-            showError(error, data.error);
-            return;
-        }
-        
-        renderAnimeGrid('airing-grid', data.data);
+        names.forEach(name => {
+            const section = (data.sections || {})[name];
+            if (!section || section.error) {
+                showError(document.getElementById(`error-${name}`), section?.error || data.error || HOME_SECTIONS[name]);
+                return;
+            }
+            renderAnimeGrid(`${name}-grid`, section.data);
+        });
     } catch (err) {
-        showError(error, 'Ошибка загрузки новинок');
+        names.forEach(name => showError(document.getElementById(`error-${name}`), HOME_SECTIONS[name]));
         console.error(err);
     } finally {
-        hideLoading(loading);
+        names.forEach(name => hideLoading(document.getElementById(`loading-${name}`)));
     }
 }
 
@@ -194,7 +152,7 @@ function setupAddToCartHandlers() {
             const response = await fetch('/api/toggle_list', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(anime)
+                body: JSON.stringify({ mal_id: anime.mal_id })
             });
             const data = await response.json();
             
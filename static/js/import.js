@@ -0,0 +1,62 @@
+// static/js/import.js - импорт списка с MyAnimeList на странице настроек
+document.addEventListener('DOMContentLoaded', () => {
+    const form = document.getElementById('import-form');
+    if (!form) return;
+
+    const statusLine = document.getElementById('import-status');
+    const showStatus = (text) => {
+        statusLine.textContent = text;
+        statusLine.classList.remove('hidden');
+    };
+
+    form.addEventListener('submit', async (e) => {
+        e.preventDefault();
+        const file = document.getElementById('import-file').files[0];
+        if (!file) return;
+
+        const button = form.querySelector('button[type="submit"]');
+        button.disabled = true;
+        showStatus('Загружаем файл...');
+
+        try {
+            const body = new FormData();
+            body.append('file', file);
+            const response = await fetch('/api/list/import', { method: 'POST', body });
+            const data = await response.json();
+            if (!response.ok) {
+                showStatus(data.error || 'Не удалось начать импорт');
+                button.disabled = false;
+                return;
+            }
+            pollImport(data.status_url, showStatus, () => { button.disabled = false; });
+        } catch (err) {
+            console.error(err);
+            showStatus('Ошибка соединения с сервером');
+            button.disabled = false;
+        }
+    });
+});
+
+// Опрос прогресса задания раз в секунду до завершения
+async function pollImport(statusUrl, showStatus, onFinish) {
+    try {
+        const response = await fetch(statusUrl);
+        const job = await response.json();
+
+        if (job.state === 'done') {
+            showStatus(`Готово: импортировано ${job.imported}, новых ${job.added}, не найдено в каталоге ${job.unknown}`);
+            localStorage.removeItem('userAnimeIds');  // список изменился — перечитать id целиком
+            onFinish();
+            return;
+        }
+        if (job.state === 'failed' || job.error) {
+            showStatus(`Ошибка импорта: ${job.error || 'неизвестная ошибка'}`);
+            onFinish();
+            return;
+        }
+        showStatus(`Импорт: ${job.percent || 0}% — обработано ${job.processed || 0} записей`);
+    } catch (err) {
+        console.error(err);
+    }
+    setTimeout(() => pollImport(statusUrl, showStatus, onFinish), 1000);
+}
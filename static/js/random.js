@@ -231,7 +231,7 @@ async function initializeRandomPage() {
                 const foundCountEl = document.getElementById('found-count');
                 if (foundCountEl) {
                     if (data.total > 0) {
-                        foundCountEl.textContent = `Найдено ≈ ${data.total.toLocaleString()} тайтлов по выбранным фильтрам`;
+                        foundCountEl.textContent = `Найдено ${data.total.toLocaleString()} тайтлов по выбранным фильтрам`;
                         foundCountEl.classList.remove('hidden');
                     } else {
                         foundCountEl.textContent = 'По таким фильтрам ничего не найдено';
@@ -363,7 +363,7 @@ async function initializeRandomPage() {
             const resp = await fetch('/api/toggle_list', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(anime)
+                body: JSON.stringify({ mal_id: anime.mal_id })
             });
             const data = await resp.json();
             
@@ -229,7 +229,7 @@ async function initializeScript() {
                 const foundCountEl = document.getElementById('found-count');
                 if (foundCountEl) {
                     if (data.total > 0) {
-                        foundCountEl.textContent = `Найдено ≈ ${data.total.toLocaleString()} тайтлов по выбранным фильтрам`;
+                        foundCountEl.textContent = `Найдено ${data.total.toLocaleString()} тайтлов по выбранным фильтрам`;
                         foundCountEl.classList.remove('hidden');
                     } else {
                         foundCountEl.textContent = 'По таким фильтрам ничего не найдено';
@@ -466,6 +466,29 @@ async function initializeScript() {
             }
         });
 
+        // Комментарий и полное описание грузятся при первом раскрытии
+        // (toggle не всплывает — слушаем на фазе перехвата)
+        listContainer.addEventListener('toggle', async (e) => {
+            const details = e.target;
+            if (!details.classList?.contains('comment-section') || !details.open) return;
+            if (details.dataset.loaded === 'true') return;
+            const card = details.closest('.list-card-wide');
+            const id = parseInt(card.dataset.animeId, 10);
+
+            try {
+                const resp = await fetch(`/api/list_item/${id}`);
+                const data = await resp.json();
+                const textarea = details.querySelector('.comment-input');
+                textarea.value = data.comment || '';
+                textarea.disabled = false;
+                if (data.synopsis) card.querySelector('.synopsis').textContent = data.synopsis;
+                details.dataset.loaded = 'true';
+            } catch (err) {
+                console.error(err);
+                alert('Ошибка соединения с сервером');
+            }
+        }, true);
+
         // Удаление
         listContainer.addEventListener('click', async (e) => {
             console.log('click event:', e.target);
@@ -503,7 +526,7 @@ async function initializeScript() {
             const resp = await fetch('/api/toggle_list', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(anime)
+                body: JSON.stringify({ mal_id: anime.mal_id })
             });
             const data = await resp.json();
             if (data.status === 'added') {
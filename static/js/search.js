@@ -285,7 +285,7 @@ function setupAddToListHandlers() {
                 const response = await fetch('/api/toggle_list', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(anime)
+                    body: JSON.stringify({ mal_id: anime.mal_id })
                 });
                 const data = await response.json();
                 
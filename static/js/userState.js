@@ -1,38 +1,86 @@
 // static/js/userState.js
+const ANIME_IDS_STORAGE_KEY = 'userAnimeIds';
+
 window.userState = {
     animeIds: new Set(),
-    
+
     async loadUserAnimeIds() {
         const isLoggedIn = document.body.dataset.userLoggedIn === 'true';
-        
+
         if (!isLoggedIn) {
             console.log('Пользователь не авторизован, пропускаем загрузку списка');
+            localStorage.removeItem(ANIME_IDS_STORAGE_KEY);
             return;
         }
-        
+
         try {
+            // Сохранённая версия списка: с ней сервер присылает только изменения
+            const stored = this.readStored();
+            if (stored) {
+                this.animeIds = new Set(stored.ids);
+                const response = await fetch(`/api/my_anime_ids?since=${stored.version}`);
+                const data = await response.json();
+                if (data.success && this.applyResponse(data)) return;
+            }
+
             console.log('Загружаем список anime_id пользователя...');
             const response = await fetch('/api/my_anime_ids');
             const data = await response.json();
-            
-            if (data.success && data.ids) {
-                this.animeIds = new Set(data.ids);
-                console.log(`Загружено ${data.ids.length} anime_id пользователя`);
-            }
+            if (data.success) this.applyResponse(data);
         } catch (error) {
             console.error('Ошибка загрузки списка аниме пользователя:', error);
         }
     },
-    
+
+    // Принять полный список или дельту; false — дельта не сошлась, нужен полный
+    applyResponse(data) {
+        if (data.delta) {
+            const ids = new Set(this.animeIds);
+            data.removed.forEach(id => ids.delete(id));
+            data.added.forEach(id => ids.add(id));
+
+            let checksum = 0;
+            ids.forEach(id => { checksum += id; });
+            if (ids.size !== data.count || checksum !== data.checksum) return false;
+
+            this.animeIds = ids;
+        } else if (data.ids) {
+            this.animeIds = new Set(data.ids);
+            console.log(`Загружено ${data.ids.length} anime_id пользователя`);
+        } else {
+            return false;
+        }
+
+        this.writeStored(data.version);
+        return true;
+    },
+
+    readStored() {
+        try {
+            const stored = JSON.parse(localStorage.getItem(ANIME_IDS_STORAGE_KEY));
+            return stored && stored.version && Array.isArray(stored.ids) ? stored : null;
+        } catch (error) {
+            return null;
+        }
+    },
+
+    writeStored(version) {
+        try {
+            localStorage.setItem(ANIME_IDS_STORAGE_KEY, JSON.stringify({ version, ids: [...this.animeIds] }));
+        } catch (error) {
+            // Переполненный localStorage не мешает работе — просто без дельт
+        }
+    },
+
     hasAnime(malId) {
         return this.animeIds.has(parseInt(malId));
     },
-    
+
     addAnime(malId) {
         this.animeIds.add(parseInt(malId));
     },
-    
+
     removeAnime(malId) {
         this.animeIds.delete(parseInt(malId));
     }
-};
\ No newline at end of file
+};
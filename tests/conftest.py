@@ -0,0 +1,63 @@
+"""Общие фикстуры: приложение на временных базах и локальная заглушка Jikan.
+
+app.py настраивается из окружения при импорте, поэтому переменные
+выставляются до первого импорта, а сам импорт — внутри фикстуры.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+from stub_jikan import start_stub_server  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def stub_jikan():
+    """(server, stub, base_url) заглушки Jikan на свободном порту"""
+    server, stub, base = start_stub_server(items=120)
+    yield server, stub, base
+    server.shutdown()
+
+
+@pytest.fixture(scope='session')
+def app_module(stub_jikan):
+    """Модуль app поверх временных SQLite-баз, схема — миграциями до head"""
+    _, _, base = stub_jikan
+    folder = tempfile.mkdtemp(prefix='anime-app-tests-')
+    os.environ.update({
+        'DATABASE_URI': f"sqlite:///{os.path.join(folder, 'app.db')}",
+        'JIKAN_CACHE_PATH': os.path.join(folder, 'jikan_cache.db'),
+        'JIKAN_RATE_LIMIT_PATH': os.path.join(folder, 'jikan_ratelimit.db'),
+        'LOGIN_THROTTLE_PATH': os.path.join(folder, 'login_throttle.db'),
+        'IMAGE_CACHE_DIR': os.path.join(folder, 'images'),
+        'IMPORT_PATH': os.path.join(folder, 'imports'),
+        'JIKAN_BASE': base,
+        # Заглушка локальная: лимит Jikan здесь только замедлил бы тесты
+        'JIKAN_RATE_PER_SECOND': '1000',
+        'JIKAN_RATE_PER_MINUTE': '100000',
+        'JIKAN_RATE_BURST_SECOND': '1000',
+        'JIKAN_RATE_BURST_MINUTE': '100000',
+        # Без фоновых потоков: тесты сами вызывают то, что им нужно
+        'JIKAN_WARM_ENABLED': '0',
+        'CATALOG_REFRESH_ENABLED': '0',
+        'DETAIL_PREFETCH': '0',
+        'PASSWORD_HASH_WORKERS': '0',
+    })
+
+    import app as app_module
+    from flask_migrate import upgrade
+
+    with app_module.app.app_context():
+        upgrade()
+    return app_module
+
+
+@pytest.fixture
+def app_context(app_module):
+    with app_module.app.app_context() as context:
+        yield context
@@ -0,0 +1,66 @@
+"""Синхронизация каталога против локальной заглушки Jikan (без сети)"""
+import math
+
+import pytest
+
+import catalog
+from models import db, Anime, SyncCheckpoint
+
+
+@pytest.fixture(scope='module')
+def synced(app_module, stub_jikan):
+    """Каталог после двух запусков `flask catalog sync`: первый обрывается на --max-pages 2"""
+    _, stub, _ = stub_jikan
+    runner = app_module.app.test_cli_runner()
+    start = stub.requests
+
+    first = runner.invoke(args=['catalog', 'sync', '--max-pages', '2'])
+    assert first.exit_code == 0, first.output
+    with app_module.app.app_context():
+        assert db.session.get(SyncCheckpoint, catalog.SYNC_NAME).page == 3
+        assert not catalog.catalog_ready()
+
+    second = runner.invoke(args=['catalog', 'sync'])
+    assert second.exit_code == 0, second.output
+    return stub.requests - start
+
+
+def pages(stub):
+    return math.ceil(len(stub.catalog) / catalog.PAGE_SIZE)
+
+
+def test_sync_resumes_from_checkpoint(app_context, synced, stub_jikan):
+    _, stub, _ = stub_jikan
+    # Второй запуск продолжил с третьей страницы: каждая страница прочитана один раз
+    assert synced == pages(stub)
+    assert Anime.query.count() == len(stub.catalog)
+    checkpoint = db.session.get(SyncCheckpoint, catalog.SYNC_NAME)
+    assert checkpoint.completed_at is not None
+    assert checkpoint.page == pages(stub)
+
+    catalog._ready['checked_at'] = 0.0
+    assert catalog.catalog_ready()
+
+
+def test_catalog_serves_rankings_after_refresh(app_module, app_context, synced, stub_jikan):
+    _, stub, _ = stub_jikan
+    catalog._ready['checked_at'] = catalog._rankings['checked_at'] = 0.0
+    # Инкрементальный sync старые строки не перечитывает: пока рейтинги не освежены — из Jikan
+    assert not app_module.catalog_serves_ranking('top')
+    assert app_module.catalog_serves_ranking('classic')
+
+    airing_id = next(item['mal_id'] for item in stub.catalog if item['airing'])
+    stub.by_id[airing_id].update(airing=False, status='Finished Airing')
+    stub.by_id[1]['rank'] = 5000
+    try:
+        app_module.refresh_catalog_rankings()
+    finally:
+        stub.by_id[airing_id].update(airing=True, status='Currently Airing')
+        stub.by_id[1]['rank'] = 1
+
+    finished = db.session.get(Anime, airing_id)
+    assert (finished.airing, finished.status) == (False, 'Finished Airing')
+    assert db.session.get(Anime, 1).rank == 5000
+    assert app_module.catalog_serves_ranking('top')
+    # Рейтинги, которые отдаёт каталог, прогреватель кэша Jikan больше не трогает
+    assert list(app_module.ranking_warm_targets()) == []
@@ -0,0 +1,13 @@
+import query_plans
+
+
+def test_hot_queries_use_indexes(app_context):
+    """После `flask db upgrade` каждый горячий запрос идёт по индексу и без лишней сортировки"""
+    failed = {name: (plan, problems) for name, plan, problems in query_plans.check_plans() if problems}
+    assert failed == {}
+
+
+def test_plan_check_detects_full_scan():
+    plan = ['SCAN user_anime', 'USE TEMP B-TREE FOR ORDER BY']
+    assert len(query_plans.problems(plan, 'sqlite', ordered=True)) == 2
+    assert query_plans.problems(['SEARCH anime USING INTEGER PRIMARY KEY (rowid=?)'], 'sqlite', ordered=False) == []
@@ -0,0 +1,18 @@
+"""Поведение rate_limited_get, когда Jikan не отвечает"""
+import socket
+import time
+
+
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}/v4/anime/1/full'
+
+
+def test_connection_errors_return_none_after_backoff(app_module, app_context, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'JIKAN_RETRY_BACKOFF', 0.05)
+    start = time.perf_counter()
+    # Две попытки — меньше порога breaker'а, остальные тесты его не заметят
+    assert app_module.rate_limited_get(closed_port_url(), retries=2) is None
+    assert time.perf_counter() - start >= 0.05
@@ -0,0 +1,108 @@
+"""Бенчмарк: пакетный /api/list/bulk против одиночных /api/update_* и /api/delete_from_list.
+
+Создаёт временную SQLite-базу с одним пользователем и N записями в списке и
+проходит один и тот же сценарий правок двумя путями через тестовый клиент Flask:
+  * по одному запросу (SELECT + UPDATE + COMMIT) на каждое поле каждой записи;
+  * одним запросом /api/list/bulk.
+
+Запуск:  python tools/bench_bulk.py --items 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP = tempfile.mkdtemp(prefix='bench_bulk_')
+os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(TMP, 'bench.db')}"
+os.environ['JIKAN_CACHE_PATH'] = os.path.join(TMP, 'cache.db')
+os.environ['JIKAN_RATE_LIMIT_PATH'] = os.path.join(TMP, 'ratelimit.db')
+os.environ['JIKAN_WARM_ENABLED'] = '0'
+os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+
+from flask_migrate import upgrade  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, User, UserAnime  # noqa: E402
+from passwords import hash_password  # noqa: E402
+import catalog  # noqa: E402
+
+STATUSES = ('watching', 'completed', 'dropped', 'planned')
+
+
+def prepare(items):
+    """Схема и записи каталога, на которые ссылаются строки списка"""
+    with app.app_context():
+        upgrade()
+        catalog.upsert_items([{'mal_id': mal_id, 'title': f'Bench {mal_id}'} for mal_id in range(1, items + 1)])
+        db.session.commit()
+
+
+def seed(username, items):
+    with app.app_context():
+        user = User(username=username, password=hash_password('bench', 4))
+        db.session.add(user)
+        db.session.commit()
+        db.session.add_all(UserAnime(user_id=user.id, mal_id=mal_id, status='planned') for mal_id in range(1, items + 1))
+        db.session.commit()
+        return [row.id for row in UserAnime.query.filter_by(user_id=user.id).order_by(UserAnime.id)]
+
+
+def client_for(username):
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': 'bench'})
+    return client
+
+
+def scenario(ids):
+    """Статус и оценка каждой записи, удаление каждой десятой"""
+    patches = [(row_id, STATUSES[i % 4], i % 10 + 1) for i, row_id in enumerate(ids)]
+    deletes = ids[::10]
+    return patches, deletes
+
+
+def per_call(client, ids):
+    patches, deletes = scenario(ids)
+    for row_id, status, score in patches:
+        client.post('/api/update_status', json={'id': row_id, 'status': status})
+        client.post('/api/update_score', json={'id': row_id, 'score': score})
+    for row_id in deletes:
+        client.post('/api/delete_from_list', json={'id': row_id})
+    return len(patches) * 2 + len(deletes)
+
+
+def bulk(client, ids):
+    patches, deletes = scenario(ids)
+    operations = [{'op': 'patch', 'id': row_id, 'status': status, 'score': score} for row_id, status, score in patches]
+    operations += [{'op': 'delete', 'id': row_id} for row_id in deletes]
+    requests_made = 0
+    for start in range(0, len(operations), 500):
+        response = client.post('/api/list/bulk', json={'operations': operations[start:start + 500]})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        requests_made += 1
+    return requests_made
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=200)
+    args = parser.parse_args()
+
+    prepare(args.items)
+    for name, run in (('по одному запросу', per_call), ('/api/list/bulk', bulk)):
+        username = f"bench_{run.__name__}"
+        ids = seed(username, args.items)
+        client = client_for(username)
+        start = time.perf_counter()
+        requests_made = run(client, ids)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{name:<20} {requests_made:5d} запросов   {elapsed:9.1f} ms")
+
+    print(f"\nБаза: {TMP}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Микробенчмарк: CPU на запрос поиска при тёплом кэше Jikan, до и после проекции в карточки.
+
+В общий кэш (временный SQLite-файл) кладётся страница из 25 полноразмерных
+элементов Jikan. Дальше один и тот же ответ собирается двумя путями:
+  * как раньше — полный JSON Jikan из кэша через json.loads, карточки
+    строятся на каждый запрос, ответ сериализует стандартный провайдер Flask;
+  * как сейчас — cached_jikan_cards (готовые карточки из кэша) и jsonify
+    через fastjson (orjson, если установлен).
+Печатается процессорное время на запрос (time.process_time).
+
+Запуск:  python tools/bench_cards.py --requests 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP = tempfile.mkdtemp(prefix='bench_cards_')
+os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(TMP, 'bench.db')}"
+os.environ['JIKAN_CACHE_PATH'] = os.path.join(TMP, 'cache.db')
+os.environ['JIKAN_RATE_LIMIT_PATH'] = os.path.join(TMP, 'ratelimit.db')
+os.environ['JIKAN_WARM_ENABLED'] = '0'
+# Предзагрузка деталей работает в фоновых потоках и попала бы в process_time
+os.environ['DETAIL_PREFETCH'] = '0'
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import app as anime_app  # noqa: E402
+import cards  # noqa: E402
+import fastjson  # noqa: E402
+from jikan_cache import make_key  # noqa: E402
+
+app = anime_app.app
+
+
+def jikan_item(mal_id):
+    """Элемент /anime в полный размер ответа Jikan"""
+    image = f"https://cdn.myanimelist.net/images/anime/{mal_id}/{mal_id}"
+    return {
+        'mal_id': mal_id,
+        'url': f"https://myanimelist.net/anime/{mal_id}/Title",
+        'images': {fmt: {'image_url': f"{image}.{fmt}", 'small_image_url': f"{image}t.{fmt}",
+                         'large_image_url': f"{image}l.{fmt}"} for fmt in ('jpg', 'webp')},
+        'trailer': {'youtube_id': 'x' * 11, 'url': 'https://youtube.com/watch?v=x', 'embed_url': 'https://youtube.com/embed/x',
+                    'images': {name: f"https://img.youtube.com/vi/x/{name}.jpg" for name in ('image_url', 'small_image_url',
+                                                                                        'medium_image_url', 'large_image_url')}},
+        'approved': True,
+        'titles': [{'type': kind, 'title': f"Название {mal_id} ({kind})"} for kind in ('Default', 'Synonym', 'Japanese', 'English')],
+        'title': f"Title {mal_id}", 'title_english': f"English title {mal_id}", 'title_japanese': 'タイトル',
+        'title_synonyms': [f"Alias {mal_id}"],
+        'type': 'TV', 'source': 'Manga', 'episodes': 24, 'status': 'Finished Airing', 'airing': False,
+        'aired': {'from': '2006-10-04T00:00:00+00:00', 'to': '2007-03-28T00:00:00+00:00',
+                  'prop': {'from': {'day': 4, 'month': 10, 'year': 2006}, 'to': {'day': 28, 'month': 3, 'year': 2007}},
+                  'string': 'Oct 4, 2006 to Mar 28, 2007'},
+        'duration': '24 min per ep', 'rating': 'R - 17+ (violence & profanity)',
+        'score': 8.5, 'scored_by': 1500000, 'rank': mal_id, 'popularity': mal_id, 'members': 3000000, 'favorites': 150000,
+        'synopsis': 'Длинное описание сюжета. ' * 60, 'background': 'Историческая справка. ' * 20,
+        'season': 'fall', 'year': 2006, 'broadcast': {'day': 'Wednesdays', 'time': '01:29', 'timezone': 'Asia/Tokyo',
+                                                       'string': 'Wednesdays at 01:29 (JST)'},
+        **{group: [{'mal_id': i, 'type': 'anime', 'name': f"{group} {i}", 'url': f"https://myanimelist.net/{group}/{i}"}
+                   for i in range(1, 4)]
+           for group in ('producers', 'licensors', 'studios', 'genres', 'explicit_genres', 'themes', 'demographics')},
+    }
+
+
+def legacy_response(key, provider):
+    """Старый путь: полный JSON из кэша, карточки и сериализация на каждый запрос"""
+    payload = anime_app.jikan_cache.backend.get(key)[0]
+    data = json.loads(payload)
+    return provider.response({
+        'data': [cards.search_card(a) for a in data.get('data', [])],
+        'pagination': data.get('pagination', {}),
+    })
+
+
+def measure(fn, requests):
+    fn()  # первый вызов заполняет кэш карточек
+    start = time.process_time()
+    for _ in range(requests):
+        fn()
+    return (time.process_time() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=25)
+    args = parser.parse_args()
+
+    url, params = f"{anime_app.JIKAN_BASE}/anime", {'q': 'bench', 'page': 1, 'limit': args.items}
+    key = make_key(url, params)
+    page = {'data': [jikan_item(i) for i in range(1, args.items + 1)],
+            'pagination': {'last_visible_page': 40, 'has_next_page': True, 'current_page': 1,
+                           'items': {'count': args.items, 'total': 1000, 'per_page': args.items}}}
+    anime_app.jikan_cache.set(key, page, 'search', timeout=3600)
+
+    with app.test_request_context():
+        legacy_provider = DefaultJSONProvider(app)
+        before = measure(lambda: legacy_response(key, legacy_provider), args.requests)
+        after = measure(lambda: anime_app.process_search_response(
+            anime_app.cached_jikan_cards(url, params, 'search')), args.requests)
+
+    print(f"JSON-кодек: {'orjson' if fastjson.orjson else 'json'}; {args.items} элементов на странице")
+    print(f"до:    {before:8.1f} мкс CPU на запрос")
+    print(f"после: {after:8.1f} мкс CPU на запрос   (x{before / after:.1f})")
+    print(f"\nБаза: {TMP}")
+
+
+if __name__ == '__main__':
+    main()
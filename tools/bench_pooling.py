@@ -0,0 +1,82 @@
+"""Бенчмарк: задержка запроса к Jikan с пулом соединений и без него.
+
+Поднимает локальную заглушку Jikan (tools/stub_jikan.py) и сравнивает:
+  * requests.get без Session (как было в rate_limited_get);
+  * JikanClient с keep-alive пулом;
+  * параллельный fetch_many и асинхронный клиент против последовательных вызовов.
+
+Запуск:  python tools/bench_pooling.py --requests 200 --delay 0.02
+Заглушка работает по HTTP, поэтому выигрыш здесь — только TCP-рукопожатие;
+на настоящем api.jikan.moe к нему добавляются DNS и TLS.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+from jikan_client import AsyncJikanClient, JikanClient  # noqa: E402
+from stub_jikan import start_stub_server  # noqa: E402
+
+
+def timed(fn, n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:<34} mean {statistics.mean(samples):7.2f} ms   p50 {samples[len(samples) // 2]:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--parallel', type=int, default=12, help='запросов в одной параллельной пачке')
+    parser.add_argument('--delay', type=float, default=0.0, help='задержка заглушки, сек')
+    args = parser.parse_args()
+
+    server, stub, base = start_stub_server(items=300, delay=args.delay)
+    url = f"{base}/anime"
+    params = lambda i: {'page': i % 10 + 1, 'limit': 25}  # noqa: E731
+
+    client = JikanClient()
+    client.get(url, params(0))  # прогрев: первое соединение
+
+    print(f"Заглушка {base}, {args.requests} запросов, задержка {args.delay * 1000:.0f} мс\n")
+    report('requests.get (без пула)', timed(lambda i: requests.get(url, params=params(i), timeout=10), args.requests))
+    report('JikanClient (keep-alive пул)', timed(lambda i: client.get(url, params(i)), args.requests))
+
+    batch = [(url, params(i)) for i in range(args.parallel)]
+    batches = max(1, args.requests // args.parallel)
+    report(f'{args.parallel} последовательно (пул)',
+           timed(lambda _: [client.get(u, p) for u, p in batch], batches))
+    report(f'{args.parallel} параллельно fetch_many',
+           timed(lambda _: client.fetch_many(batch), batches))
+
+    async_client = AsyncJikanClient(client.get)
+
+    async def run_async():
+        samples = []
+        for _ in range(batches):
+            start = time.perf_counter()
+            await async_client.fetch_many(batch)
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    report(f'{args.parallel} параллельно async', asyncio.run(run_async()))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Бенчмарк: user_loader из базы против кэша пользователей в памяти воркера.
+
+Временная SQLite-база с одним пользователем; через тестовый клиент Flask
+по кругу идут «болтливые» запросы /api/my_anime_ids и /api/update_score.
+Один и тот же прогон выполняется с USER_CACHE_TTL=0 (SELECT user на каждый
+запрос, как раньше) и с кэшем; печатаются запросы в секунду и среднее число
+SQL-запросов к основной базе на HTTP-запрос.
+
+Запуск:  python tools/bench_user_loader.py --seconds 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP = tempfile.mkdtemp(prefix='bench_user_loader_')
+os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(TMP, 'bench.db')}"
+os.environ['JIKAN_CACHE_PATH'] = os.path.join(TMP, 'cache.db')
+os.environ['JIKAN_RATE_LIMIT_PATH'] = os.path.join(TMP, 'ratelimit.db')
+os.environ['JIKAN_WARM_ENABLED'] = '0'
+os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+
+from flask_migrate import upgrade  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import app, user_cache  # noqa: E402
+from models import db, User, UserAnime  # noqa: E402
+from passwords import hash_password  # noqa: E402
+import catalog  # noqa: E402
+
+
+def seed():
+    with app.app_context():
+        upgrade()
+        catalog.upsert_items([{'mal_id': 1, 'title': 'Bench'}])
+        user = User(username='bench', password=hash_password('bench', 4))
+        db.session.add(user)
+        db.session.commit()
+        anime = UserAnime(user_id=user.id, mal_id=1, status='watching')
+        db.session.add(anime)
+        db.session.commit()
+        return anime.id
+
+
+def run(client, anime_id, seconds, statements):
+    requests_made = 0
+    statements['count'] = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        client.get('/api/my_anime_ids')
+        client.post('/api/update_score', json={'id': anime_id, 'score': requests_made % 10 + 1})
+        requests_made += 2
+    return requests_made
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    anime_id = seed()
+    statements = {'count': 0}
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count(*_):
+            statements['count'] += 1
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+    ttl = user_cache.ttl
+    for name, cache_ttl in (('без кэша', 0), (f'кэш, ttl {ttl} с', ttl)):
+        user_cache.ttl = cache_ttl
+        requests_made = run(client, anime_id, args.seconds, statements)
+        print(f"{name:<16} {requests_made / args.seconds:8.1f} req/s   "
+              f"{statements['count'] / requests_made:5.2f} SQL на запрос")
+
+    print(f"\nБаза: {TMP}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Локальная заглушка Jikan API для офлайн-проверок и бенчмарков.
+
+Отдаёт детерминированный синтетический каталог в форме ответов Jikan v4:
+  /v4/anime (page, limit, q, order_by, sort, sfw), /v4/top/anime,
+  /v4/anime/<id>/full, /v4/genres/anime.
+
+Запуск:  python tools/stub_jikan.py --port 8765 --items 500
+Затем:   JIKAN_BASE=http://127.0.0.1:8765/v4 flask catalog sync
+В тестах — фикстура stub_jikan (tests/conftest.py).
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+GENRES = [
+    (1, 'Action'), (2, 'Adventure'), (4, 'Comedy'), (8, 'Drama'), (10, 'Fantasy'),
+    (22, 'Romance'), (24, 'Sci-Fi'), (36, 'Slice of Life'), (12, 'Hentai'),
+]
+TYPES = ['TV', 'Movie', 'OVA', 'ONA', 'Special']
+WORDS = ['shingeki', 'kyojin', 'naruto', 'bleach', 'steins', 'gate', 'cowboy', 'bebop',
+         'monogatari', 'fullmetal', 'alchemist', 'sword', 'online', 'hunter', 'clannad']
+
+
+def make_item(mal_id):
+    rnd = random.Random(mal_id)
+    title = ' '.join(rnd.choice(WORDS) for _ in range(2)).title() + f' {mal_id}'
+    genres = rnd.sample(GENRES[:-1], 2)
+    explicit = [GENRES[-1]] if mal_id % 50 == 0 else []
+    year = 1970 + mal_id % 55
+    airing = mal_id % 17 == 0
+    return {
+        'mal_id': mal_id,
+        'title': title,
+        'title_english': title.upper() if mal_id % 3 else None,
+        'title_japanese': f'アニメ {mal_id}',
+        'titles': [{'type': 'Synonym', 'title': f'Alias {mal_id}'}],
+        'images': {'jpg': {
+            'image_url': f'https://cdn.example/{mal_id}.jpg',
+            'small_image_url': f'https://cdn.example/{mal_id}t.jpg',
+            'large_image_url': f'https://cdn.example/{mal_id}l.jpg',
+        }},
+        'type': rnd.choice(TYPES),
+        'episodes': rnd.randint(1, 64),
+        'status': 'Currently Airing' if airing else 'Finished Airing',
+        'airing': airing,
+        'rating': 'Rx - Hentai' if explicit else 'PG-13 - Teens 13 or older',
+        'aired': {'from': f'{year}-04-01T00:00:00+00:00', 'to': None},
+        'year': year,
+        'score': round(rnd.uniform(5, 9.3), 2),
+        'scored_by': rnd.randint(100, 10 ** 6),
+        'rank': mal_id,
+        'popularity': rnd.randint(1, 20000),
+        'members': rnd.randint(100, 3 * 10 ** 6),
+        'favorites': rnd.randint(0, 10 ** 5),
+        'genres': [{'mal_id': g, 'name': n} for g, n in genres],
+        'explicit_genres': [{'mal_id': g, 'name': n} for g, n in explicit],
+        'synopsis': f'Synthetic synopsis for {title}. ' * 10,
+    }
+
+
+class StubJikan:
+    def __init__(self, items=500, delay=0.0):
+        self.catalog = [make_item(i) for i in range(1, items + 1)]
+        self.by_id = {item['mal_id']: item for item in self.catalog}
+        self.delay = delay
+        self.requests = 0
+
+    def page(self, items, params):
+        page = int(params.get('page', 1))
+        limit = min(int(params.get('limit', 25)), 25)
+        total = len(items)
+        last = max(1, math.ceil(total / limit))
+        chunk = items[(page - 1) * limit:page * limit]
+        return {
+            'data': chunk,
+            'pagination': {
+                'last_visible_page': last,
+                'has_next_page': page < last,
+                'current_page': page,
+                'items': {'count': len(chunk), 'total': total, 'per_page': limit},
+            },
+        }
+
+    def handle(self, path, params):
+        if self.delay:
+            time.sleep(self.delay)
+        self.requests += 1
+        items = self.catalog
+        if params.get('sfw') == 'true':
+            items = [a for a in items if not a['explicit_genres']]
+
+        if path == '/v4/genres/anime':
+            return 200, {'data': [{'mal_id': g, 'name': n} for g, n in GENRES]}
+        match = re.fullmatch(r'/v4/anime/(\d+)(/full)?', path)
+        if match:
+            item = self.by_id.get(int(match.group(1)))
+            return (200, {'data': item}) if item else (404, {'status': 404})
+        if path == '/v4/top/anime':
+            if params.get('filter') == 'airing':
+                items = [a for a in items if a['airing']]
+            if params.get('filter') == 'bypopularity':
+                items = sorted(items, key=lambda a: a['popularity'])
+            return 200, self.page(items, params)
+        if path == '/v4/anime':
+            if params.get('q'):
+                q = params['q'].lower()
+                items = [a for a in items if q in a['title'].lower()]
+            order_by = params.get('order_by')
+            if order_by:
+                items = sorted(items, key=lambda a: a.get(order_by) or 0,
+                               reverse=params.get('sort') == 'desc')
+            return 200, self.page(items, params)
+        return 404, {'status': 404}
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящего Jikan
+        disable_nagle_algorithm = True  # иначе заголовки и тело ждут delayed ACK на keep-alive
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+            status, payload = stub.handle(parts.path, params)
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_stub_server(port=0, items=500, delay=0.0):
+    """Запустить заглушку в фоновом потоке; вернуть (server, stub, base_url)"""
+    stub = StubJikan(items, delay)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub, f'http://127.0.0.1:{server.server_address[1]}/v4'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--delay', type=float, default=0.0, help='искусственная задержка ответа, сек')
+    args = parser.parse_args()
+
+    stub = StubJikan(args.items, args.delay)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(stub))
+    print(f'Заглушка Jikan: http://127.0.0.1:{args.port}/v4 ({args.items} тайтлов)')
+    server.serve_forever()
@@ -0,0 +1,70 @@
+"""Кэш пользователей для user_loader: без SELECT на каждый запрос с @login_required.
+
+В памяти процесса по user_id лежат значения колонок User (кроме пароля) и
+срок годности записи. Из них собирается объект и через
+make_transient_to_detached + merge(load=False) привязывается к сессии как
+уже загруженный: правки настроек сохраняются обычным commit, без лишнего
+SELECT. Хэш пароля не кэшируется — при обращении он догружается из базы.
+
+Записи свои у каждого воркера, а сброс общий: invalidate меняет версию
+пользователя в JikanCache (userver:<id>), и load перед тем, как отдать
+запись из памяти, сверяет её версию с общей — одно чтение общего кэша вместо
+SELECT. Поэтому правка настроек (nsfw_allowed, private_account) действует
+сразу во всех воркерах; ttl — лишь предел жизни записи.
+"""
+import threading
+import time
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User
+
+CACHED_FIELDS = ('id', 'username', 'tag', 'vip', 'vip_date', 'private_account', 'nsfw_allowed')
+
+
+class UserCache:
+    def __init__(self, cache, ttl=30, max_entries=10000, version_timeout=30 * 86400):
+        self.cache = cache  # JikanCache: версии пользователей общие для всех воркеров
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_timeout = version_timeout
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        """User для user_loader или None, если такого больше нет"""
+        entry = self._data.get(user_id)
+        version = self.cache.peek(f"userver:{user_id}") if self.ttl > 0 else None
+        if entry is None or entry[0] <= time.monotonic() or entry[1] != version:
+            # Версия прочитана до SELECT: правка между ними сменит её, и запись перечитается
+            user = db.session.get(User, user_id)
+            with self._lock:
+                self._data.pop(user_id, None)
+            if user is not None:
+                self._remember(user, version)
+            return user
+
+        user = User(**entry[2])
+        make_transient_to_detached(user)
+        # Объект считается загруженным из базы; незаданный password догрузится при обращении
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        """Вызывать после commit, изменившего поля пользователя (или удалившего его)"""
+        with self._lock:
+            self._data.pop(user_id, None)
+        # Микросекунды, как версии списков: другие воркеры увидят новую версию при следующем load
+        self.cache.set(f"userver:{user_id}", int(time.time() * 1e6), 'users', timeout=self.version_timeout)
+
+    def _remember(self, user, version):
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                for user_id, (expires_at, _, _) in list(self._data.items()):
+                    if expires_at <= now:
+                        del self._data[user_id]
+                if len(self._data) >= self.max_entries:
+                    self._data.clear()
+            self._data[user.id] = (now + self.ttl, version, {name: getattr(user, name) for name in CACHED_FIELDS})
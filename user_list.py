@@ -0,0 +1,434 @@
+"""Список пользователя: фильтры, сортировка и keyset-пагинация.
+
+Страница выбирается условием «после последней показанной записи»
+(ключ сортировки, id) вместо OFFSET, поэтому время ответа не зависит от
+длины списка и от номера страницы. Метаданные тайтла берутся join'ом из
+общего каталога Anime по первичному ключу. Тяжёлые Text-колонки synopsis и
+comment не читаются: карточке хватает начала описания, полные тексты
+отдаёт list_item_details по требованию.
+"""
+import base64
+import binascii
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, or_, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import load_only
+
+from models import db, Anime, UserAnime
+from image_proxy import proxy_url
+import catalog
+
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 100
+SYNOPSIS_PREVIEW = 300
+LIST_STATUSES = ('planned', 'watching', 'completed', 'dropped')
+MAX_BULK_OPERATIONS = 500
+
+# Название карточки — английское, если есть (так же показывают поиск и главная)
+DISPLAY_TITLE = func.coalesce(Anime.title_english, Anime.title)
+
+# Сортировка: ключ и направление по умолчанию; второй ключ всегда id.
+# Ключи без NULL: сравнение с NULL в условии курсора выкинуло бы строку со всех страниц.
+# Даты NOT NULL в схеме (иначе COALESCE помешал бы читать страницу в порядке индекса)
+SORTS = {
+    'updated': (UserAnime.updated_at, 'desc'),
+    'added': (UserAnime.created_at, 'desc'),
+    'score': (func.coalesce(UserAnime.score, 0), 'desc'),
+    'year': (func.coalesce(Anime.year, 0), 'desc'),
+    'title': (func.coalesce(DISPLAY_TITLE, ''), 'asc'),
+}
+DATETIME_SORTS = ('updated', 'added')
+
+CARD_COLUMNS = (
+    UserAnime.id, UserAnime.mal_id, UserAnime.status, UserAnime.score,
+    UserAnime.is_private, UserAnime.created_at, UserAnime.updated_at,
+)
+
+
+def parse_list_args(args):
+    """Фильтры и сортировка из параметров запроса; неизвестные значения игнорируются"""
+    def number(name, low, high):
+        try:
+            value = int(args.get(name) or 0)
+        except ValueError:
+            return None
+        return value if low <= value <= high else None
+
+    sort = args.get('sort') if args.get('sort') in SORTS else 'updated'
+    order = args.get('order') if args.get('order') in ('asc', 'desc') else SORTS[sort][1]
+    try:
+        limit = max(1, min(int(args.get('limit') or DEFAULT_LIMIT), MAX_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+
+    return {
+        'status': args.get('status') if args.get('status') in LIST_STATUSES else None,
+        'type': args.get('type') or None,
+        'year': number('year', 1900, 2100),
+        'min_score': number('min_score', 1, 10),
+        'sort': sort,
+        'order': order,
+        'limit': limit,
+    }
+
+
+def encode_cursor(sort, order, value, item_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, order, value, item_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort, order):
+    """(значение ключа, id) последней записи или None, если курсор чужой или битый"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_order, value, item_id = json.loads(raw)
+        if cursor_sort != sort or cursor_order != order or not isinstance(item_id, int):
+            return None
+        if sort in DATETIME_SORTS:
+            value = datetime.fromisoformat(value)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    return value, item_id
+
+
+def sort_value(row, sort):
+    """Значение ключа сортировки строки страницы — для следующего курсора"""
+    item = row.UserAnime
+    if sort == 'updated':
+        return item.updated_at
+    if sort == 'added':
+        return item.created_at
+    if sort == 'title':
+        return row.title or ''
+    if sort == 'year':
+        return row.year or 0
+    return item.score or 0
+
+
+def list_query(user_id, filters):
+    query = UserAnime.query.join(UserAnime.anime).filter(UserAnime.user_id == user_id)
+    if filters['status']:
+        query = query.filter(UserAnime.status == filters['status'])
+    if filters['type']:
+        query = query.filter(Anime.type == filters['type'])
+    if filters['year']:
+        query = query.filter(Anime.year == filters['year'])
+    if filters['min_score']:
+        query = query.filter(UserAnime.score >= filters['min_score'])
+    return query
+
+
+def page_query(user_id, filters, cursor=None):
+    """Запрос одной страницы списка (без LIMIT)"""
+    sort, order = filters['sort'], filters['order']
+    key = SORTS[sort][0]
+    query = list_query(user_id, filters).options(load_only(*CARD_COLUMNS)).add_columns(
+        DISPLAY_TITLE.label('title'), Anime.image, Anime.type, Anime.episodes, Anime.year,
+        func.substr(Anime.synopsis, 1, SYNOPSIS_PREVIEW).label('synopsis_preview'),
+        UserAnime.comment.isnot(None).label('has_comment'),
+    )
+
+    after = decode_cursor(cursor, sort, order)
+    if after is not None:
+        if order == 'desc':
+            query = query.filter(tuple_(key, UserAnime.id) < tuple_(*after))
+        else:
+            query = query.filter(tuple_(key, UserAnime.id) > tuple_(*after))
+
+    if order == 'desc':
+        return query.order_by(key.desc(), UserAnime.id.desc())
+    return query.order_by(key.asc(), UserAnime.id.asc())
+
+
+def list_page(user_id, filters, cursor=None):
+    """Одна страница списка: (записи, курсор следующей страницы или None)"""
+    sort, order = filters['sort'], filters['order']
+    query = page_query(user_id, filters, cursor)
+
+    # Одна лишняя строка показывает, есть ли следующая страница, без COUNT
+    rows = query.limit(filters['limit'] + 1).all()
+    next_cursor = None
+    if len(rows) > filters['limit']:
+        rows = rows[:filters['limit']]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, order, sort_value(last, sort), last.UserAnime.id)
+    return [list_item(row) for row in rows], next_cursor
+
+
+def list_item(row):
+    item = row.UserAnime
+    synopsis = row.synopsis_preview or ''
+    return {
+        'id': item.id,
+        'mal_id': item.mal_id,
+        'title': row.title,
+        'image': proxy_url(item.mal_id, 'card') if row.image else row.image,
+        'type': row.type,
+        'episodes': row.episodes,
+        'year': row.year,
+        'synopsis': synopsis + ('...' if len(synopsis) >= SYNOPSIS_PREVIEW else ''),
+        'status': item.status,
+        'score': item.score,
+        'has_comment': bool(row.has_comment),
+        'is_private': item.is_private,
+        'updated_at': item.updated_at.isoformat() if item.updated_at else None,
+    }
+
+
+# --- Пакетные правки списка ---
+
+def patch_values(op):
+    """Поля patch-операции с теми же правилами, что у одиночных /api/update_*"""
+    values = {}
+    if 'status' in op:
+        if op['status'] not in LIST_STATUSES:
+            raise ValueError('unknown status')
+        values['status'] = op['status']
+    if 'score' in op:
+        try:
+            score = int(op['score'])
+            values['score'] = score if 1 <= score <= 10 else None
+        except (TypeError, ValueError):
+            values['score'] = None
+    if 'is_private' in op:
+        values['is_private'] = op['is_private'] is True
+    if 'comment' in op:
+        values['comment'] = str(op['comment'] or '').strip()
+    if not values:
+        raise ValueError('nothing to update')
+    return values
+
+
+def _insert_ignoring_duplicates(rows):
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert_ = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        # Параллельный запрос мог уже добавить тот же тайтл — unique_user_anime, пропускаем
+        db.session.execute(insert_(UserAnime).on_conflict_do_nothing(
+            index_elements=[UserAnime.user_id, UserAnime.mal_id]), rows)
+    else:
+        db.session.execute(insert(UserAnime), rows)
+
+
+def apply_bulk(user_id, operations, fetch_items):
+    """Применить пачку операций одной транзакцией.
+
+    operations: [{'op': 'add', 'mal_id': ..., 'status': ...},
+                 {'op': 'patch', 'id' | 'mal_id': ..., 'status', 'score', 'is_private', 'comment'},
+                 {'op': 'delete', 'id' | 'mal_id': ...}]
+    Порядок применения: добавления, затем правки, затем удаления — так в одной
+    пачке можно добавить тайтл и сразу выставить ему оценку. Тайтлы, которых
+    нет в каталоге, подтягиваются через fetch_items(mal_ids).
+    Возвращает (результаты по порядку операций, добавленные mal_id, удалённые mal_id).
+    """
+    results = [None] * len(operations)
+    adds, patches, deletes = [], [], []
+    for i, op in enumerate(operations):
+        kind = op.get('op') if isinstance(op, dict) else None
+        try:
+            if kind == 'add':
+                adds.append((i, int(op['mal_id']), op.get('status') if op.get('status') in LIST_STATUSES else 'planned'))
+            elif kind == 'patch':
+                patches.append((i, _target(op), patch_values(op)))
+            elif kind == 'delete':
+                deletes.append((i, _target(op)))
+            else:
+                results[i] = {'status': 'invalid', 'error': 'unknown op'}
+        except (KeyError, TypeError, ValueError) as e:
+            results[i] = {'status': 'invalid', 'error': str(e) or 'bad operation'}
+
+    # Один SELECT на всю пачку: какие из упомянутых записей уже есть у пользователя
+    def existing():
+        ids = {t[1] for _, t, *_ in patches + deletes if t[0] == 'id'}
+        mal_ids = {t[1] for _, t, *_ in patches + deletes if t[0] == 'mal_id'} | {mal_id for _, mal_id, _ in adds}
+        if not ids and not mal_ids:
+            return {}
+        rows = db.session.query(UserAnime.id, UserAnime.mal_id).filter(
+            UserAnime.user_id == user_id,
+            or_(UserAnime.id.in_(ids), UserAnime.mal_id.in_(mal_ids))
+        )
+        found = {}
+        for row_id, mal_id in rows:
+            found[('id', row_id)] = (row_id, mal_id)
+            found[('mal_id', mal_id)] = (row_id, mal_id)
+        return found
+
+    found = existing()
+    added = []
+    if adds:
+        new = {}
+        for i, mal_id, status in adds:
+            if ('mal_id', mal_id) in found or mal_id in new:
+                results[i] = {'status': 'already_added', 'mal_id': mal_id}
+            else:
+                new[mal_id] = status
+                results[i] = {'status': 'added', 'mal_id': mal_id}
+        known = catalog.ensure_items(new, fetch_items) if new else set()
+        for i, mal_id, _ in adds:
+            if mal_id in new and mal_id not in known:
+                results[i] = {'status': 'not_found', 'mal_id': mal_id}
+        new = {mal_id: status for mal_id, status in new.items() if mal_id in known}
+        if new:
+            now = datetime.utcnow()
+            _insert_ignoring_duplicates([
+                {'user_id': user_id, 'mal_id': mal_id, 'status': status,
+                 'is_private': False, 'created_at': now, 'updated_at': now}
+                for mal_id, status in new.items()
+            ])
+            added = list(new)
+            found = existing()
+
+    # Одинаковые правки (например, «статус = completed» у 30 записей) — один UPDATE
+    groups = {}
+    for i, target, values in patches:
+        row = found.get(target)
+        if row is None:
+            results[i] = {'status': 'not_found'}
+            continue
+        groups.setdefault(tuple(sorted(values.items())), []).append(row[0])
+        results[i] = {'status': 'updated', 'id': row[0]}
+    now = datetime.utcnow()
+    for values, ids in groups.items():
+        db.session.execute(
+            update(UserAnime)
+            .where(UserAnime.user_id == user_id, UserAnime.id.in_(ids))
+            .values(**dict(values), updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+    removed = {}
+    for i, target in deletes:
+        row = found.get(target)
+        if row is None:
+            results[i] = {'status': 'not_found'}
+            continue
+        removed[row[0]] = row[1]
+        results[i] = {'status': 'deleted', 'id': row[0]}
+    if removed:
+        db.session.execute(
+            delete(UserAnime)
+            .where(UserAnime.user_id == user_id, UserAnime.id.in_(removed))
+            .execution_options(synchronize_session=False)
+        )
+
+    db.session.commit()
+    removed_ids = set(removed.values())
+    return results, sorted(set(added) - removed_ids), sorted(removed_ids - set(added))
+
+
+def _target(op):
+    """Ключ записи из операции: ('id', n) или ('mal_id', n)"""
+    if op.get('id') is not None:
+        return 'id', int(op['id'])
+    return 'mal_id', int(op['mal_id'])
+
+
+class ListVersions:
+    """Версия списка каждого пользователя для ETag: меняется при любой правке списка"""
+
+    def __init__(self, cache, timeout=30 * 86400):
+        self.cache = cache  # JikanCache: версия общая для всех воркеров
+        self.timeout = timeout
+
+    def get(self, user_id):
+        version = self.cache.peek(f"listver:{user_id}")
+        return version if version is not None else self.bump(user_id)
+
+    def bump(self, user_id):
+        # Микросекунды: растут монотонно и точно представимы в JSON-числах JavaScript
+        version = int(time.time() * 1e6)
+        self.cache.set(f"listver:{user_id}", version, 'lists', timeout=self.timeout)
+        return version
+
+
+class MembershipSets:
+    """Множество mal_id из списка пользователя для /api/my_anime_ids.
+
+    В кэше лежит отсортированный массив id, его версия и короткий журнал
+    изменений: клиент с версией X получает только добавленные и удалённые
+    с тех пор id. Журнал хранит prev — версию, от которой отсчитана запись,
+    так что по нему видно, покрывает ли он запрошенную версию.
+    Запись в кэш делается под арендой ключа (как в SingleFlight): иначе два
+    воркера прочитали бы один журнал и второй затёр бы изменение первого.
+    """
+
+    def __init__(self, cache, log_size=100, timeout=30 * 86400, lease_ttl=5, poll_interval=0.02):
+        self.cache = cache
+        self.log_size = log_size
+        self.timeout = timeout
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def _load_ids(user_id):
+        # Только колонка mal_id: покрывается индексом unique_user_anime и уже отсортирована
+        query = db.session.query(UserAnime.mal_id).filter(UserAnime.user_id == user_id).order_by(UserAnime.mal_id)
+        return [mal_id for mal_id, in query if mal_id is not None]
+
+    def _update(self, user_id, fn):
+        """fn(предыдущая запись или None, в аренде ли мы) -> новая запись; сохраняется под арендой ключа"""
+        key = f"listids:{user_id}"
+        backend = self.cache.backend
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        deadline = time.time() + self.lease_ttl
+        while not backend.add_lease(key, owner, self.lease_ttl):
+            if time.time() > deadline:
+                # Держатель аренды завис — пишем без неё, но без журнала (клиенты перечитают всё)
+                entry = fn(self.cache.peek(key), False)
+                self.cache.set(key, entry, 'lists', timeout=self.timeout)
+                return entry
+            time.sleep(self.poll_interval)
+        try:
+            entry = fn(self.cache.peek(key), True)
+            self.cache.set(key, entry, 'lists', timeout=self.timeout)
+            return entry
+        finally:
+            backend.release_lease(key, owner)
+
+    def get(self, user_id):
+        entry = self.cache.peek(f"listids:{user_id}")
+        if entry is None:
+            # Другой воркер мог собрать запись, пока мы ждали аренду, — тогда берём её
+            entry = self._update(user_id, lambda previous, locked: previous or {
+                'version': int(time.time() * 1e6), 'ids': self._load_ids(user_id), 'log': []})
+        return entry
+
+    def changed(self, user_id, added=(), removed=()):
+        """Вызывать после commit: пересобрать множество из БД и записать изменение в журнал"""
+        def build(previous, locked):
+            version = int(time.time() * 1e6)
+            if previous and version <= previous['version']:
+                version = previous['version'] + 1
+            log = previous['log'] if previous and locked else []
+            if previous and locked:
+                log.append({'prev': previous['version'], 'version': version,
+                            'added': list(added), 'removed': list(removed)})
+            return {'version': version, 'ids': self._load_ids(user_id), 'log': log[-self.log_size:]}
+        return self._update(user_id, build)
+
+    @staticmethod
+    def delta(entry, since):
+        """(added, removed) с версии since или None, если журнал её уже не покрывает"""
+        log = entry['log']
+        start = next((i for i, change in enumerate(log) if change['prev'] == since), None)
+        if start is None:
+            return None
+
+        added, removed = set(), set()
+        for change in log[start:]:
+            for mal_id in change['added']:
+                removed.discard(mal_id)
+                added.add(mal_id)
+            for mal_id in change['removed']:
+                added.discard(mal_id)
+                removed.add(mal_id)
+        return sorted(added), sorted(removed)